@@ -144,6 +144,9 @@ eps = mlc.FieldReference(1e-8, field_type=float)
 templates_enabled = mlc.FieldReference(True, field_type=bool)
 embed_template_torsion_angles = mlc.FieldReference(True, field_type=bool)
 tune_chunk_size = mlc.FieldReference(True, field_type=bool)
+plan_chunk_size = mlc.FieldReference(False, field_type=bool)
+chunk_size_memory_budget = mlc.FieldReference(None, field_type=float)
+chunk_size_cache_path = mlc.FieldReference(None, field_type=str)
 
 NUM_RES = "num residues placeholder"
 NUM_MSA_SEQ = "msa placeholder"
@@ -226,6 +229,10 @@ config = mlc.ConfigDict(
                     "uniform_prob": 0.1,
                 },
                 "max_recycling_iters": 3,
+                # Store features that are identical in every recycling
+                # iteration (i.e. all but the MSA features) once, with a
+                # recycling dimension of size 1, rather than replicating them
+                "compact_recycling_features": False,
                 "msa_cluster_features": True,
                 "reduce_msa_clusters_by_max_templates": False,
                 "resample_msa_in_recycling": True,
@@ -306,6 +313,18 @@ config = mlc.ConfigDict(
                 "data_loaders": {
                     "batch_size": 1,
                     "num_workers": 16,
+                    # Copies batches to the GPU asynchronously, through pinned
+                    # memory, while the previous step runs
+                    "prefetch_to_device": False,
+                    # Batches training samples of similar lengths together,
+                    # trimming the padding shared by each batch
+                    "length_bucketing": {
+                        "enabled": False,
+                        "bucket_size": 32,
+                        # Budget of padded residue pairs per batch. Defaults
+                        # to that of batch_size samples of crop_size residues
+                        "max_residue_pairs": None,
+                    },
                 },
             },
         },
@@ -338,6 +357,27 @@ config = mlc.ConfigDict(
                 "no_bins": 15,
                 "inf": 1e8,
             },
+            # Inference only. Recycling stops early once the RMS change in
+            # CA-CA distances (in Angstroms) between consecutive cycles and,
+            # if plddt_tolerance is set, the change in mean pLDDT fall below
+            # these tolerances
+            "recycle_early_stop": {
+                "enabled": False,
+                "tolerance": 0.5,
+                "plddt_tolerance": None,
+            },
+            # Inference only. Keeps the recycled pair embedding, and the MSA
+            # and pair embeddings while they're not in use, in host memory
+            # (optionally memory-mapped from files in mmap_dir), streaming 
+            # them back to the device chunk_size rows at a time. Templates
+            # are embedded as with template.offload_templates unless
+            # template.average_templates is set. Useful for inference on 
+            # very long sequences
+            "offload_inference": {
+                "enabled": False,
+                "mmap_dir": None,
+                "chunk_size": 256,
+            },
             "template": {
                 "distogram": {
                     "min_bin": 3.25,
@@ -364,6 +404,10 @@ config = mlc.ConfigDict(
                     "pair_transition_n": 2,
                     "dropout_rate": 0.25,
                     "blocks_per_ckpt": blocks_per_ckpt,
+                    "plan_chunk_size": plan_chunk_size,
+                    "chunk_size_memory_budget": chunk_size_memory_budget,
+                    "chunk_size_cache_path": chunk_size_cache_path,
+                    "chunk_sizes": {},
                     "inf": 1e9,
                 },
                 "template_pointwise_attention": {
@@ -411,11 +455,22 @@ config = mlc.ConfigDict(
                     "pair_dropout": 0.25,
                     "clear_cache_between_blocks": True,
                     "tune_chunk_size": tune_chunk_size,
+                    "plan_chunk_size": plan_chunk_size,
+                    "chunk_size_memory_budget": chunk_size_memory_budget,
+                    "chunk_size_cache_path": chunk_size_cache_path,
+                    "chunk_sizes": {},
                     "inf": 1e9,
                     "eps": eps,  # 1e-10,
                     "ckpt": blocks_per_ckpt is not None,
                 },
                 "enabled": True,
+                # Inference only. Embed and process the extra MSA in blocks
+                # of this many sequences, so that the memory consumption of
+                # the extra MSA stack scales with the block size rather than
+                # the depth of the extra MSA. None disables streaming.
+                "stream_block_size": None,
+                # Keep the streamed extra MSA embedding in CPU memory.
+                "offload_stream": False,
             },
             "evoformer_stack": {
                 "c_m": c_m,
@@ -434,6 +489,12 @@ config = mlc.ConfigDict(
                 "blocks_per_ckpt": blocks_per_ckpt,
                 "clear_cache_between_blocks": False,
                 "tune_chunk_size": tune_chunk_size,
+                "plan_chunk_size": plan_chunk_size,
+                "chunk_size_memory_budget": chunk_size_memory_budget,
+                "chunk_size_cache_path": chunk_size_cache_path,
+                "chunk_sizes": {},
+                "ckpt_modules": None,
+                "ckpt_offload": False,
                 "inf": 1e9,
                 "eps": eps,  # 1e-10,
             },
@@ -492,6 +553,9 @@ config = mlc.ConfigDict(
                 "max_bin": 21.6875,
                 "no_bins": 64,
                 "eps": eps,  # 1e-6,
+                # Rows of the pairwise distances computed at a time. Chosen
+                # automatically for large crops if None
+                "chunk_size": None,
                 "weight": 0.3,
             },
             "experimentally_resolved": {
@@ -520,6 +584,8 @@ config = mlc.ConfigDict(
                 "cutoff": 15.0,
                 "no_bins": 50,
                 "eps": eps,  # 1e-10,
+                # As in distogram
+                "chunk_size": None,
                 "weight": 0.01,
             },
             "masked_msa": {
@@ -535,6 +601,9 @@ config = mlc.ConfigDict(
             "violation": {
                 "violation_tolerance_factor": 12.0,
                 "clash_overlap_tolerance": 1.5,
+                # Only evaluate nearby atom pairs when computing clashes. 
+                # Same result, but linear rather than quadratic in memory
+                "sparse_clashes": False,
                 "eps": eps,  # 1e-6,
                 "weight": 0.0,
             },
@@ -0,0 +1,284 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    A binary, memory-mapped store of preprocessed alignments.
+
+    Each chain's MSAs are stored as deduplicated [N_seq, N_res] uint8 arrays of
+    the ASCII codes of their residues alongside their deletion matrices. Rows
+    are kept as characters rather than HHblits residue IDs because the latter
+    merge some residues (e.g. B and D) and would make distinct rows look like
+    duplicates. Each chain's
+    .hhr files are stored pre-parsed. All arrays live in a single flat data
+    file and are located via a JSON index, so that reading a chain's
+    alignments amounts to creating a handful of NumPy views into a memory map.
+    Stores are generated with scripts/generate_alignment_store.py.
+"""
+
+import dataclasses
+import json
+import os
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from openfold.data import parsers
+
+
+# Byte alignment of every array in the data file
+_ALIGNMENT = 8
+_STORE_VERSION = 2
+
+
+def _deletion_dtype(deletion_matrix: np.ndarray) -> np.dtype:
+    # Deletion counts are mostly tiny, but are occasionally too large for
+    # int8. Use the smallest type that represents the chain exactly.
+    max_deletion = int(deletion_matrix.max()) if deletion_matrix.size else 0
+    for dtype in [np.int8, np.int16]:
+        if(max_deletion <= np.iinfo(dtype).max):
+            return np.dtype(dtype)
+
+    return np.dtype(np.int32)
+
+
+def _deduplicate(
+    msa: np.ndarray,
+    deletion_matrix: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Removes duplicate rows of a character MSA, keeping the first
+        occurrence of each
+    """
+    seen = set()
+    keep = []
+    for i, row in enumerate(msa):
+        row_bytes = row.tobytes()
+        if(row_bytes in seen):
+            continue
+        seen.add(row_bytes)
+        keep.append(i)
+
+    return msa[keep], deletion_matrix[keep]
+
+
+class AlignmentStoreWriter:
+    def __init__(self, db_path: str, index_path: str):
+        """
+            Args:
+                db_path:
+                    Path of the data file to be written
+                index_path:
+                    Path of the JSON index to be written. The data file is
+                    located relative to the index, so the two should be kept
+                    in the same directory.
+        """
+        self.db_path = db_path
+        self.index_path = index_path
+        self._fp = open(db_path, "wb")
+        self._offset = 0
+        self._chains = {}
+
+    def _write(self, buf: bytes) -> int:
+        pad = (-self._offset) % _ALIGNMENT
+        if(pad):
+            self._fp.write(b"\0" * pad)
+            self._offset += pad
+
+        offset = self._offset
+        self._fp.write(buf)
+        self._offset += len(buf)
+        return offset
+
+    def add_chain(self,
+        chain_id: str,
+        msas: Mapping[str, Tuple[np.ndarray, np.ndarray]],
+        hits: Mapping[str, Sequence[parsers.TemplateHit]],
+    ):
+        """
+            Args:
+                chain_id:
+                    Name of the chain, e.g. {PDB_ID}_{CHAIN_ID}
+                msas:
+                    Maps alignment file names to tuples of [N_seq, N_res]
+                    uint8 MSAs of ASCII codes (see parsers.parse_a3m_np) and
+                    [N_seq, N_res] deletion matrices
+                hits:
+                    Maps .hhr file names to their parsed template hits
+        """
+        if(chain_id in self._chains):
+            raise ValueError(f"Duplicate chain {chain_id}")
+
+        msa_entries = []
+        for name, (msa, deletion_matrix) in msas.items():
+            msa = np.asarray(msa, dtype=np.uint8)
+            deletion_matrix = np.asarray(deletion_matrix)
+            if(msa.shape != deletion_matrix.shape):
+                raise ValueError(
+                    f"MSA {name} of {chain_id} and its deletion matrix have "
+                    f"different shapes"
+                )
+
+            msa, deletion_matrix = _deduplicate(msa, deletion_matrix)
+            deletion_dtype = _deletion_dtype(deletion_matrix)
+            deletion_matrix = deletion_matrix.astype(deletion_dtype)
+
+            n_seq, n_res = msa.shape
+            msa_entries.append({
+                "name": name,
+                "n_seq": n_seq,
+                "n_res": n_res,
+                "msa_offset": self._write(msa.tobytes()),
+                "deletion_offset": self._write(deletion_matrix.tobytes()),
+                "deletion_dtype": deletion_dtype.str,
+            })
+
+        hit_entries = []
+        for name, hit_list in hits.items():
+            buf = json.dumps(
+                [dataclasses.asdict(h) for h in hit_list]
+            ).encode("utf-8")
+            hit_entries.append({
+                "name": name,
+                "offset": self._write(buf),
+                "size": len(buf),
+            })
+
+        self._chains[chain_id] = {"msas": msa_entries, "hits": hit_entries}
+
+    def close(self):
+        self._fp.close()
+        index = {
+            "version": _STORE_VERSION,
+            "db": os.path.relpath(
+                self.db_path, os.path.dirname(os.path.abspath(self.index_path))
+            ),
+            "chains": self._chains,
+        }
+        with open(self.index_path, "w") as fp:
+            json.dump(index, fp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AlignmentStoreEntry:
+    """The alignments of a single chain in an AlignmentStore"""
+    def __init__(self, store: "AlignmentStore", entry: Mapping[str, Any]):
+        self.store = store
+        self.entry = entry
+
+    def get_msas(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+            Returns:
+                A dictionary mapping alignment file names to dictionaries
+                containing read-only "msa" and "deletion_matrix" arrays of
+                shape [N_seq, N_res]. MSAs are uint8 arrays of ASCII codes,
+                as returned by parsers.parse_a3m_np. The arrays are views
+                into the memory-mapped data file.
+        """
+        buf = self.store._get_buffer()
+        msa_data = {}
+        for e in self.entry["msas"]:
+            count = e["n_seq"] * e["n_res"]
+            shape = (e["n_seq"], e["n_res"])
+            msa = np.frombuffer(
+                buf, dtype=np.uint8, count=count, offset=e["msa_offset"],
+            ).reshape(shape)
+            deletion_matrix = np.frombuffer(
+                buf,
+                dtype=np.dtype(e["deletion_dtype"]),
+                count=count,
+                offset=e["deletion_offset"],
+            ).reshape(shape)
+            msa_data[e["name"]] = {
+                "msa": msa,
+                "deletion_matrix": deletion_matrix
+            }
+
+        return msa_data
+
+    def get_template_hits(self) -> Dict[str, Sequence[parsers.TemplateHit]]:
+        buf = self.store._get_buffer()
+        all_hits = {}
+        for e in self.entry["hits"]:
+            raw = buf[e["offset"]:e["offset"] + e["size"]].tobytes()
+            all_hits[e["name"]] = [
+                parsers.TemplateHit(**h) for h in json.loads(raw)
+            ]
+
+        return all_hits
+
+
+class AlignmentStore:
+    """
+        Read-only view of a store produced by
+        scripts/generate_alignment_store.py. Supports the subset of the dict
+        interface used for alignment indices, i.e. store[chain_id] returns an
+        AlignmentStoreEntry that can be passed to DataPipeline as an
+        _alignment_index.
+
+        The data file is only memory-mapped on first access, so stores can be
+        passed to DataLoader workers cheaply.
+    """
+    def __init__(self, index_path: str):
+        with open(index_path, "r") as fp:
+            index = json.load(fp)
+
+        if(index.get("version", None) != _STORE_VERSION):
+            raise ValueError(
+                f"Unsupported alignment store version in {index_path}"
+            )
+
+        self.index_path = index_path
+        self.db_path = os.path.join(
+            os.path.dirname(os.path.abspath(index_path)), index["db"]
+        )
+        self._chains = index["chains"]
+        self._buf = None
+
+    def _get_buffer(self) -> np.ndarray:
+        if(self._buf is None):
+            # Empty files can't be memory-mapped
+            if(os.path.getsize(self.db_path) == 0):
+                self._buf = np.zeros((0,), dtype=np.uint8)
+            else:
+                self._buf = np.memmap(self.db_path, dtype=np.uint8, mode="r")
+        return self._buf
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_buf"] = None
+        return state
+
+    def keys(self):
+        return self._chains.keys()
+
+    def __contains__(self, chain_id: str) -> bool:
+        return chain_id in self._chains
+
+    def __len__(self) -> int:
+        return len(self._chains)
+
+    def __getitem__(self, chain_id: str) -> AlignmentStoreEntry:
+        return AlignmentStoreEntry(self, self._chains[chain_id])
+
+    def get(
+        self, chain_id: str, default: Optional[Any] = None
+    ) -> Optional[AlignmentStoreEntry]:
+        if(chain_id not in self._chains):
+            return default
+        return self[chain_id]
@@ -0,0 +1,252 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Predict-time batching of targets of different sizes.
+
+    Targets are grouped into buckets of similar residue counts and MSA
+    depths, padded to a common size with data_transforms.make_fixed_size and
+    run through the model together. Padded residues and MSA rows are masked
+    out, so the outputs of each target can then be cropped back to its
+    original size.
+"""
+
+import math
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import torch
+
+from openfold.config import NUM_RES, NUM_MSA_SEQ, NUM_EXTRA_SEQ, NUM_TEMPLATES
+from openfold.data import data_transforms
+from openfold.utils.loss import compute_tm
+from openfold.utils.tensor_utils import dict_multimap
+
+
+# Shapes of the per-target model outputs, excluding batch dimensions. The
+# batch dimension immediately precedes them
+OUTPUT_SCHEMA = {
+    "msa": [NUM_MSA_SEQ, NUM_RES, None],
+    "pair": [NUM_RES, NUM_RES, None],
+    "single": [NUM_RES, None],
+    "sm": {
+        "frames": [NUM_RES, None],
+        "sidechain_frames": [NUM_RES, None, None, None],
+        "unnormalized_angles": [NUM_RES, None, None],
+        "angles": [NUM_RES, None, None],
+        "positions": [NUM_RES, None, None],
+        "single": [NUM_RES, None],
+    },
+    "final_atom_positions": [NUM_RES, None, None],
+    "final_atom_mask": [NUM_RES, None],
+    "final_affine_tensor": [NUM_RES, None],
+    "lddt_logits": [NUM_RES, None],
+    "plddt": [NUM_RES],
+    "distogram_logits": [NUM_RES, NUM_RES, None],
+    "masked_msa_logits": [NUM_MSA_SEQ, NUM_RES, None],
+    "experimentally_resolved_logits": [NUM_RES, None],
+    "tm_logits": [NUM_RES, NUM_RES, None],
+    "predicted_tm_score": [],
+    "aligned_confidence_probs": [NUM_RES, NUM_RES, None],
+    "predicted_aligned_error": [NUM_RES, NUM_RES],
+    "max_predicted_aligned_error": [],
+    "num_recycles": [],
+}
+
+
+def _round_up(x: int, multiple: int) -> int:
+    return int(math.ceil(x / multiple)) * multiple
+
+
+def get_target_size(feats: Mapping[str, torch.Tensor]) -> Dict[str, int]:
+    """
+        Computes the unpadded dimensions of a processed, predict-mode
+        feature dictionary (with a trailing recycling dimension).
+    """
+    def num_rows(row_mask):
+        # Rows are sampled independently in each recycling iteration
+        return int(torch.max(torch.sum(row_mask > 0, dim=0)))
+
+    size = {
+        NUM_RES: feats["aatype"].shape[-2],
+        NUM_MSA_SEQ: num_rows(feats["msa_row_mask"]),
+        NUM_EXTRA_SEQ: 0,
+        NUM_TEMPLATES: 0,
+    }
+
+    if("extra_msa_row_mask" in feats):
+        size[NUM_EXTRA_SEQ] = num_rows(feats["extra_msa_row_mask"])
+    if("template_mask" in feats):
+        size[NUM_TEMPLATES] = feats["template_mask"].shape[-2]
+
+    return size
+
+
+def plan_batches(
+    sizes: Sequence[Mapping[str, int]],
+    max_tokens: int,
+    res_bucket_size: int = 32,
+) -> List[List[int]]:
+    """
+        Groups targets into batches.
+
+        Targets are bucketed by their residue count, rounded up to a multiple
+        of res_bucket_size, and then sorted by MSA depth within each bucket,
+        so that targets in the same batch need as little padding as
+        possible.
+
+        Args:
+            sizes:
+                The output of get_target_size for each target
+            max_tokens:
+                Maximum number of (padded) residues in a batch. Targets
+                larger than this are run on their own.
+            res_bucket_size:
+                Granularity of the residue buckets
+        Returns:
+            A list of batches, each a list of indices into sizes
+    """
+    order = sorted(
+        range(len(sizes)),
+        key=lambda i: (
+            _round_up(sizes[i][NUM_RES], res_bucket_size),
+            sizes[i][NUM_MSA_SEQ],
+            sizes[i][NUM_EXTRA_SEQ],
+        ),
+    )
+
+    batches = []
+    cur_batch, cur_bucket = [], None
+    for i in order:
+        bucket = _round_up(sizes[i][NUM_RES], res_bucket_size)
+        if(bucket != cur_bucket or (len(cur_batch) + 1) * bucket > max_tokens):
+            if(len(cur_batch) > 0):
+                batches.append(cur_batch)
+            cur_batch, cur_bucket = [], bucket
+
+        cur_batch.append(i)
+
+    if(len(cur_batch) > 0):
+        batches.append(cur_batch)
+
+    return batches
+
+
+def pad_and_stack(
+    feats_list: Sequence[Dict[str, torch.Tensor]],
+    shape_schema: Mapping[str, Sequence[Optional[str]]],
+    res_bucket_size: int = 32,
+) -> Dict[str, torch.Tensor]:
+    """
+        Pads processed, predict-mode feature dictionaries to a common size
+        and stacks them along a new leading batch dimension.
+
+        The residue dimension is padded to the bucket size of the largest
+        target. MSA dimensions are cropped to the deepest MSA in the batch,
+        since the rows beyond it are already padding.
+
+        Args:
+            feats_list:
+                Feature dictionaries, as produced by
+                FeaturePipeline.process_features in predict mode
+            shape_schema:
+                The "feat" shape schema of the data config
+            res_bucket_size:
+                Granularity of the residue buckets. Should match the one
+                passed to plan_batches
+        Returns:
+            The batched feature dictionary
+    """
+    sizes = [get_target_size(f) for f in feats_list]
+    max_size = {
+        k: max(s[k] for s in sizes) for k in sizes[0]
+    }
+
+    # Processed features carry an extra, trailing recycling dimension
+    schema = {k: list(v) + [None] for k, v in shape_schema.items()}
+
+    pad_fn = data_transforms.make_fixed_size(
+        schema,
+        max(max_size[NUM_MSA_SEQ], 1),
+        max(max_size[NUM_EXTRA_SEQ], 1),
+        _round_up(max_size[NUM_RES], res_bucket_size),
+        max_size[NUM_TEMPLATES],
+    )
+
+    padded = [pad_fn(dict(f)) for f in feats_list]
+
+    return dict_multimap(lambda x: torch.stack(x, dim=0), padded)
+
+
+def _unpad(t: Any, schema: Sequence[Optional[str]], idx: int, num_res: int):
+    batch_dim = t.ndim - len(schema) - 1
+    if(batch_dim < 0):
+        # Some outputs, like the predicted TM score, are reduced over the
+        # batch
+        return t
+
+    t = t.select(batch_dim, idx)
+    for i, s in enumerate(schema):
+        if(s == NUM_RES):
+            dim = t.ndim - len(schema) + i
+            t = t.narrow(dim, 0, num_res)
+
+    return t
+
+
+def unbatch_outputs(
+    outputs: Dict[str, Any],
+    num_res: Sequence[int],
+    tm_config: Optional[Mapping[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+        Splits the outputs of a batched model run into per-target outputs
+        and crops them to their original residue counts.
+
+        Args:
+            outputs:
+                Model outputs for a batch produced by pad_and_stack
+            num_res:
+                Unpadded residue count of each target in the batch
+            tm_config:
+                The tm head config. If provided and the outputs contain TM
+                logits, the predicted TM score, which can't be computed for
+                padded batches, is recomputed for each target.
+        Returns:
+            A list of output dictionaries, one per target
+    """
+    def split(tree, schema, idx, n):
+        out = {}
+        for k, v in tree.items():
+            s = schema.get(k, None)
+            if(isinstance(v, dict)):
+                out[k] = split(v, s if s is not None else {}, idx, n)
+            elif(s is None):
+                # Unknown outputs are assumed to have a leading batch dim
+                out[k] = v[idx]
+            else:
+                out[k] = _unpad(v, s, idx, n)
+        return out
+
+    unbatched = []
+    for i, n in enumerate(num_res):
+        out = split(outputs, OUTPUT_SCHEMA, i, n)
+
+        if(tm_config is not None and "tm_logits" in out):
+            out["predicted_tm_score"] = compute_tm(
+                torch.as_tensor(out["tm_logits"]), **tm_config
+            )
+
+        unbatched.append(out)
+
+    return unbatched
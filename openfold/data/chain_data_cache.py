@@ -0,0 +1,243 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    A columnar, memory-mapped version of the chain data cache.
+
+    Instead of one JSON object per chain, the cache is stored as a handful of
+    flat NumPy columns (sorted chain IDs, sequence lengths, resolutions, etc.)
+    in a single data file described by a small JSON index. Loading it costs
+    next to nothing, DataLoader workers share its pages rather than holding
+    copies of millions of Python dicts, and training filters can be computed
+    for all chains at once. Caches are generated with
+    scripts/generate_chain_data_cache.py. The original JSON caches are still
+    accepted by ChainDataCache, which converts them on load.
+"""
+
+import json
+import os
+from typing import Any, Dict, Mapping, Sequence
+
+import numpy as np
+
+
+_ALIGNMENT = 8
+_STORE_VERSION = 1
+
+# Numeric columns and the values representing missing entries
+_COLUMNS = {
+    "seq_length": (np.int32, 0),
+    "max_single_aa_count": (np.int32, 0),
+    "resolution": (np.float64, np.nan),
+    "cluster_size": (np.int32, -1),
+}
+
+
+def chain_data_to_columns(
+    chain_data: Mapping[str, Mapping[str, Any]]
+) -> Dict[str, np.ndarray]:
+    """
+        Converts chain data cache entries, as found in the JSON chain data
+        cache, to columns.
+
+        Args:
+            chain_data:
+                Maps chain IDs to dictionaries containing "seq" and,
+                optionally, "resolution", "cluster_size" and "release_date"
+        Returns:
+            A dictionary of 1D arrays, sorted by the "chain_id" column.
+            Sequences themselves aren't kept, only their lengths and the
+            counts of their most common residues.
+    """
+    chain_ids = sorted(chain_data.keys())
+    columns = {
+        name: np.full(len(chain_ids), missing, dtype=dtype)
+        for name, (dtype, missing) in _COLUMNS.items()
+    }
+    release_dates = []
+    for i, chain_id in enumerate(chain_ids):
+        entry = chain_data[chain_id]
+        seq = entry["seq"]
+        columns["seq_length"][i] = len(seq)
+        if(len(seq) > 0):
+            columns["max_single_aa_count"][i] = max(
+                seq.count(aa) for aa in set(seq)
+            )
+
+        for name in ["resolution", "cluster_size"]:
+            value = entry.get(name, None)
+            if(value is not None):
+                columns[name][i] = value
+
+        release_dates.append(entry.get("release_date", None) or "")
+
+    columns["chain_id"] = np.array(
+        [c.encode("utf-8") for c in chain_ids], dtype=np.bytes_
+    )
+    columns["release_date"] = np.array(
+        [d.encode("utf-8") for d in release_dates], dtype=np.bytes_
+    )
+
+    return columns
+
+
+def write_chain_data_cache(
+    columns: Mapping[str, np.ndarray],
+    db_path: str,
+    index_path: str,
+):
+    """
+        Args:
+            columns:
+                Columns as returned by chain_data_to_columns
+            db_path:
+                Path of the data file to be written
+            index_path:
+                Path of the JSON index to be written. The data file is
+                located relative to the index, so the two should be kept
+                in the same directory.
+    """
+    entries = {}
+    offset = 0
+    with open(db_path, "wb") as fp:
+        for name, col in columns.items():
+            col = np.ascontiguousarray(col)
+            pad = (-offset) % _ALIGNMENT
+            fp.write(b"\0" * pad)
+            offset += pad
+
+            entries[name] = {
+                "dtype": col.dtype.str,
+                "offset": offset,
+                "count": len(col),
+            }
+            buf = col.tobytes()
+            fp.write(buf)
+            offset += len(buf)
+
+    index = {
+        "version": _STORE_VERSION,
+        "db": os.path.relpath(
+            db_path, os.path.dirname(os.path.abspath(index_path))
+        ),
+        "num_chains": len(columns["chain_id"]),
+        "columns": entries,
+    }
+    with open(index_path, "w") as fp:
+        json.dump(index, fp)
+
+
+class ChainDataCache:
+    """
+        Read-only view of a chain data cache, either in the columnar format
+        or the original JSON one.
+
+        Columnar data files are only memory-mapped on first access, so caches
+        can be passed to DataLoader workers cheaply.
+    """
+    def __init__(self, path: str):
+        """
+            Args:
+                path:
+                    Path of the JSON index of a columnar cache or of a JSON
+                    chain data cache
+        """
+        with open(path, "r") as fp:
+            index = json.load(fp)
+
+        self.path = path
+        self._buf = None
+        if("version" in index and "columns" in index):
+            if(index["version"] != _STORE_VERSION):
+                raise ValueError(
+                    f"Unsupported chain data cache version in {path}"
+                )
+            self.db_path = os.path.join(
+                os.path.dirname(os.path.abspath(path)), index["db"]
+            )
+            self._entries = index["columns"]
+            self._num_chains = index["num_chains"]
+            self._columns = None
+        else:
+            self.db_path = None
+            self._columns = chain_data_to_columns(index)
+            self._num_chains = len(self._columns["chain_id"])
+
+    def _get_buffer(self) -> np.ndarray:
+        if(self._buf is None):
+            # Empty files can't be memory-mapped
+            if(os.path.getsize(self.db_path) == 0):
+                self._buf = np.zeros((0,), dtype=np.uint8)
+            else:
+                self._buf = np.memmap(self.db_path, dtype=np.uint8, mode="r")
+        return self._buf
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_buf"] = None
+        return state
+
+    def __len__(self) -> int:
+        return self._num_chains
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+            Returns:
+                A dictionary mapping column names to read-only arrays
+        """
+        if(self._columns is not None):
+            return self._columns
+
+        buf = self._get_buffer()
+        return {
+            name: np.frombuffer(
+                buf,
+                dtype=np.dtype(e["dtype"]),
+                count=e["count"],
+                offset=e["offset"],
+            )
+            for name, e in self._entries.items()
+        }
+
+    def get_rows(self, chain_ids: Sequence[str]) -> np.ndarray:
+        """
+            Locates chains in the cache.
+
+            Args:
+                chain_ids:
+                    Chain IDs
+            Returns:
+                The [len(chain_ids)] row indices of the chains in the columns
+        """
+        keys = np.array(
+            [c.encode("utf-8") for c in chain_ids], dtype=np.bytes_
+        )
+        cache_ids = self.columns()["chain_id"]
+        rows = np.searchsorted(cache_ids, keys)
+        rows = np.minimum(rows, len(cache_ids) - 1)
+        missing = (
+            cache_ids[rows] != keys if len(cache_ids) > 0
+            else np.ones(len(keys), dtype=bool)
+        )
+        if(np.any(missing)):
+            missing_ids = [
+                chain_ids[i] for i in np.nonzero(missing)[0][:5]
+            ]
+            raise KeyError(
+                f"Chains missing from the chain data cache {self.path}: "
+                f"{', '.join(missing_ids)}"
+                f"{', ...' if np.sum(missing) > 5 else ''}"
+            )
+
+        return rows
@@ -2,9 +2,10 @@ import copy
 from functools import partial
 import json
 import logging
+import math
 import os
 import pickle
-from typing import Optional, Sequence, List, Any
+from typing import Optional, Sequence, List, Any, Mapping, Dict
 
 import ml_collections as mlc
 import numpy as np
@@ -12,10 +13,15 @@ import pytorch_lightning as pl
 import torch
 from torch.utils.data import RandomSampler
 
+from openfold.config import NUM_RES
 from openfold.data import (
+    alignment_store,
+    chain_data_cache,
     data_pipeline,
+    feature_cache,
     feature_pipeline,
     mmcif_parsing,
+    prefetch,
     templates,
 )
 from openfold.utils.tensor_utils import tensor_tree_map, dict_multimap
@@ -33,12 +39,16 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
         obsolete_pdbs_file_path: Optional[str] = None,
         template_release_dates_cache_path: Optional[str] = None,
         shuffle_top_k_prefiltered: Optional[int] = None,
+        template_num_workers: int = 1,
+        template_store_path: Optional[str] = None,
         treat_pdb_as_distillation: bool = True,
         mapping_path: Optional[str] = None,
         mode: str = "train", 
+        use_fast_mmcif_parser: bool = False,
         _output_raw: bool = False,
         _structure_index: Optional[Any] = None,
         _alignment_index: Optional[Any] = None,
+        _feature_cache: Optional[feature_cache.FeatureCache] = None,
     ):
         """
             Args:
@@ -71,12 +81,25 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
                     parsing max_template_hits of them. Can be used to
                     approximate DeepMind's training-time template subsampling
                     scheme much more performantly.
+                template_num_workers:
+                    Number of template hits to featurize concurrently.
+                template_store_path:
+                    Path to the index of a template store generated by
+                    scripts/generate_template_store.py.
                 treat_pdb_as_distillation:
                     Whether to assume that .pdb files in the data_dir are from
                     the self-distillation set (and should be subjected to
                     special distillation set preprocessing steps).
                 mode:
                     "train", "val", or "predict"
+                use_fast_mmcif_parser:
+                    Whether to parse mmCIF files with the NumPy-based fast
+                    path in openfold.data.mmcif_parsing instead of Biopython
+                _feature_cache:
+                    Optional FeatureCache in which the output of the
+                    deterministic part of the feature pipeline is stored.
+                    Entries are keyed on the signatures of the input files,
+                    but not on the contents of template_mmcif_dir.
         """
         super(OpenFoldSingleDataset, self).__init__()
         self.data_dir = data_dir
@@ -84,9 +107,11 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
         self.config = config
         self.treat_pdb_as_distillation = treat_pdb_as_distillation
         self.mode = mode
+        self.use_fast_mmcif_parser = use_fast_mmcif_parser
         self._output_raw = _output_raw
         self._structure_index = _structure_index
         self._alignment_index = _alignment_index
+        self._feature_cache = _feature_cache
 
         self.supported_exts = [".cif", ".core", ".pdb"]
 
@@ -120,12 +145,43 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
             release_dates_path=template_release_dates_cache_path,
             obsolete_pdbs_path=obsolete_pdbs_file_path,
             _shuffle_top_k_prefiltered=shuffle_top_k_prefiltered,
+            num_workers=template_num_workers,
+            template_store_path=template_store_path,
         )
 
         self.data_pipeline = data_pipeline.DataPipeline(
             template_featurizer=template_featurizer,
         )
 
+        # Everything other than the chain itself that determines the
+        # contents of a feature cache entry
+        self._cache_params = {
+            "template_mmcif_dir": template_mmcif_dir,
+            "max_template_date": max_template_date,
+            "max_template_hits": max_template_hits,
+            "obsolete_pdbs": (
+                feature_cache.file_signature(obsolete_pdbs_file_path)
+                if obsolete_pdbs_file_path is not None else None
+            ),
+            "release_dates": (
+                feature_cache.file_signature(
+                    template_release_dates_cache_path
+                )
+                if template_release_dates_cache_path is not None else None
+            ),
+            "treat_pdb_as_distillation": treat_pdb_as_distillation,
+            "mode": mode,
+            "common": config.common,
+            "supervised": config.supervised,
+            "mode_cfg": config[mode],
+        }
+
+        if(_feature_cache is not None and shuffle_top_k_prefiltered):
+            logging.warning(
+                "Cached features are computed once per chain, so template "
+                "hits are only shuffled the first time a chain is processed"
+            )
+
         if(not self._output_raw):
             self.feature_pipeline = feature_pipeline.FeaturePipeline(config) 
 
@@ -134,7 +190,9 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
             mmcif_string = f.read()
 
         mmcif_object = mmcif_parsing.parse(
-            file_id=file_id, mmcif_string=mmcif_string
+            file_id=file_id, 
+            mmcif_string=mmcif_string,
+            use_fast_parser=self.use_fast_mmcif_parser,
         )
 
         # Crash if an error is encountered. Any parsing errors should have
@@ -159,8 +217,7 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
     def idx_to_chain_id(self, idx):
         return self._chain_ids[idx]
 
-    def __getitem__(self, idx):
-        name = self.idx_to_chain_id(idx)
+    def _get_paths(self, name):
         alignment_dir = os.path.join(self.alignment_dir, name)
 
         _alignment_index = None
@@ -177,7 +234,6 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
                 chain_id = None
 
             path = os.path.join(self.data_dir, file_id)
-            structure_index_entry = None
             if(self._structure_index is not None):
                 structure_index_entry = self._structure_index[name]
                 assert(len(structure_index_entry["files"]) == 1)
@@ -194,6 +250,19 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
                     raise ValueError("Invalid file type")
 
             path += ext
+        else:
+            file_id, chain_id = None, None
+            path = os.path.join(name, name + ".fasta")
+
+        return path, file_id, chain_id, alignment_dir, _alignment_index
+
+    def _get_raw_data(self, name):
+        (
+            path, file_id, chain_id, alignment_dir, _alignment_index
+        ) = self._get_paths(name)
+
+        if(self.mode == 'train' or self.mode == 'eval'):
+            ext = os.path.splitext(path)[1]
             if(ext == ".cif"):
                 data = self._parse_mmcif(
                     path, file_id, chain_id, alignment_dir, _alignment_index,
@@ -214,20 +283,74 @@ class OpenFoldSingleDataset(torch.utils.data.Dataset):
             else:
                raise ValueError("Extension branch missing") 
         else:
-            path = os.path.join(name, name + ".fasta")
             data = self.data_pipeline.process_fasta(
                 fasta_path=path,
                 alignment_dir=alignment_dir,
                 _alignment_index=_alignment_index,
             )
 
-        if(self._output_raw):
-            return data
+        return data
+
+    def _get_cache_key(self, name):
+        (
+            path, _, _, alignment_dir, _alignment_index
+        ) = self._get_paths(name)
+
+        if(self._structure_index is not None):
+            structure_index_entry = self._structure_index[name]
+            db_path = os.path.join(
+                os.path.dirname(path), structure_index_entry["db"]
+            )
+            structure_sig = [
+                structure_index_entry,
+                feature_cache.file_signature(db_path),
+            ]
+        else:
+            structure_sig = feature_cache.file_signature(path)
+
+        if(isinstance(_alignment_index, alignment_store.AlignmentStoreEntry)):
+            alignment_sig = [
+                _alignment_index.entry,
+                feature_cache.file_signature(_alignment_index.store.db_path),
+            ]
+        elif(_alignment_index is not None):
+            db_path = os.path.join(alignment_dir, _alignment_index["db"])
+            alignment_sig = [
+                _alignment_index,
+                feature_cache.file_signature(db_path),
+            ]
+        else:
+            alignment_sig = feature_cache.file_signature(alignment_dir)
 
-        feats = self.feature_pipeline.process_features(
-            data, self.mode 
+        return feature_cache.make_cache_key(
+            name, structure_sig, alignment_sig, self._cache_params,
         )
 
+    def __getitem__(self, idx):
+        name = self.idx_to_chain_id(idx)
+
+        if(self._output_raw):
+            return self._get_raw_data(name)
+
+        if(self._feature_cache is not None):
+            key = self._get_cache_key(name)
+            feats = self._feature_cache.get(key)
+            if(feats is not None):
+                feats = {k: torch.from_numpy(v) for k, v in feats.items()}
+            else:
+                feats = self.feature_pipeline.process_nonensembled_features(
+                    self._get_raw_data(name), self.mode
+                )
+                self._feature_cache.put(key, feats)
+
+            feats = self.feature_pipeline.process_ensembled_features(
+                feats, self.mode
+            )
+        else:
+            feats = self.feature_pipeline.process_features(
+                self._get_raw_data(name), self.mode 
+            )
+
         feats["batch_idx"] = torch.tensor([idx for _ in range(feats["aatype"].shape[-1])], dtype=torch.int64, device=feats["aatype"].device)
 
         return feats
@@ -280,12 +403,63 @@ def get_stochastic_train_filter_prob(
     return out
 
 
+def deterministic_train_filter_mask(
+    chain_data: Mapping[str, np.ndarray],
+    max_resolution: float = 9.,
+    max_single_aa_prop: float = 0.8,
+) -> np.ndarray:
+    """
+        Vectorized deterministic_train_filter.
+
+        Args:
+            chain_data:
+                Chain data cache columns (see ChainDataCache.columns)
+        Returns:
+            A boolean mask of the chains passing the filter
+    """
+    # NaN resolutions (i.e. missing ones) compare False
+    mask = ~(chain_data["resolution"] > max_resolution)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        largest_single_aa_prop = (
+            chain_data["max_single_aa_count"].astype(np.float64) / 
+            chain_data["seq_length"]
+        )
+    mask &= ~(largest_single_aa_prop > max_single_aa_prop)
+
+    return mask
+
+
+def get_stochastic_train_filter_probs(
+    chain_data: Mapping[str, np.ndarray],
+) -> np.ndarray:
+    """
+        Vectorized get_stochastic_train_filter_prob.
+
+        Args:
+            chain_data:
+                Chain data cache columns (see ChainDataCache.columns)
+        Returns:
+            The float64 sampling probabilities of the chains
+    """
+    cluster_size = chain_data["cluster_size"]
+    probs = np.where(
+        cluster_size > 0, 1 / np.maximum(cluster_size, 1), 1.
+    )
+
+    chain_length = chain_data["seq_length"]
+    probs *= (1 / 512) * np.clip(chain_length, 256, 512)
+
+    return probs
+
+
 class OpenFoldDataset(torch.utils.data.Dataset):
     """
         Implements the stochastic filters applied during AlphaFold's training.
         Because samples are selected from constituent datasets randomly, the
         length of an OpenFoldFilteredDataset is arbitrary. Samples are selected
-        and filtered once at initialization.
+        and filtered in batches, once per epoch, by reroll. The sampler state
+        can be saved and restored with state_dict and load_state_dict.
     """
     def __init__(self,
         datasets: Sequence[OpenFoldSingleDataset],
@@ -298,72 +472,172 @@ class OpenFoldDataset(torch.utils.data.Dataset):
         self.datasets = datasets
         self.probabilities = probabilities
         self.epoch_len = epoch_len
+
+        # The sampler keeps its own generator so that its state can be saved
+        if(generator is None):
+            generator = torch.Generator()
+            generator.manual_seed(
+                int(torch.randint(np.iinfo(np.int64).max, (1,)))
+            )
         self.generator = generator
         
-        self.chain_data_caches = []
-        for path in chain_data_cache_paths:
-            with open(path, "r") as fp:
-                self.chain_data_caches.append(json.load(fp))
-
-        def looped_shuffled_dataset_idx(dataset_len):
-            while True:
-                # Uniformly shuffle each dataset's indices
-                weights = [1. for _ in range(dataset_len)]
-                shuf = torch.multinomial(
-                    torch.tensor(weights),
-                    num_samples=dataset_len,
-                    replacement=False,
-                    generator=self.generator,
-                )
-                for idx in shuf:
-                    yield idx
-
-        def looped_samples(dataset_idx):
-            max_cache_len = int(epoch_len * probabilities[dataset_idx])
-            dataset = self.datasets[dataset_idx]
-            idx_iter = looped_shuffled_dataset_idx(len(dataset))
-            chain_data_cache = self.chain_data_caches[dataset_idx]
-            while True:
-                weights = []
-                idx = []
-                for _ in range(max_cache_len):
-                    candidate_idx = next(idx_iter)
-                    chain_id = dataset.idx_to_chain_id(candidate_idx)
-                    chain_data_cache_entry = chain_data_cache[chain_id]
-                    if(not deterministic_train_filter(chain_data_cache_entry)):
-                        continue
-
-                    p = get_stochastic_train_filter_prob(
-                        chain_data_cache_entry,
-                    )
-                    weights.append([1. - p, p])
-                    idx.append(candidate_idx)
-
-                samples = torch.multinomial(
-                    torch.tensor(weights),
-                    num_samples=1,
-                    generator=self.generator,
-                )
-                samples = samples.squeeze()
-
-                cache = [i for i, s in zip(idx, samples) if s]
-
-                for datapoint_idx in cache:
-                    yield datapoint_idx
-
-        self._samples = [looped_samples(i) for i in range(len(self.datasets))]
+        self.chain_data_caches = [
+            chain_data_cache.ChainDataCache(path)
+            for path in chain_data_cache_paths
+        ]
+
+        # The training filters are evaluated for every chain up front. The
+        # probability of chains that fail the deterministic filter is 0
+        self._sample_probs = []
+        self._seq_lengths = []
+        for dataset, cache in zip(self.datasets, self.chain_data_caches):
+            chain_data = cache.columns()
+            probs = np.where(
+                deterministic_train_filter_mask(chain_data),
+                get_stochastic_train_filter_probs(chain_data),
+                0.,
+            )
+            chain_ids = [
+                dataset.idx_to_chain_id(i) for i in range(len(dataset))
+            ]
+            rows = cache.get_rows(chain_ids)
+            self._sample_probs.append(probs[rows])
+            self._seq_lengths.append(np.array(chain_data["seq_length"][rows]))
+
+        # Sampler state. For each dataset, the rest of the current shuffle of
+        # its indices and accepted samples left over from the last epoch
+        self._shuffled = [
+            torch.zeros((0,), dtype=torch.long) for _ in self.datasets
+        ]
+        self._accepted = [
+            torch.zeros((0,), dtype=torch.long) for _ in self.datasets
+        ]
+        self._epoch_start_state = None
+        self._start = 0
+        self._resume_start = 0
 
         if(_roll_at_init):
             self.reroll()
 
     def __getitem__(self, idx):
-        dataset_idx, datapoint_idx = self.datapoints[idx]
+        dataset_idx, datapoint_idx = self.datapoints[self._start + idx]
         return self.datasets[dataset_idx][datapoint_idx]
 
     def __len__(self):
-        return self.epoch_len
+        return self.epoch_len - self._start
+
+    def get_datapoint_lengths(self) -> np.ndarray:
+        """
+            Returns:
+                The [len(self)] uncropped sequence lengths of the datapoints 
+                of the current epoch, according to the chain data caches
+        """
+        datapoints = np.array(
+            self.datapoints[self._start:], dtype=np.int64
+        ).reshape(-1, 2)
+        lengths = np.zeros(len(datapoints), dtype=np.int64)
+        for i, seq_lengths in enumerate(self._seq_lengths):
+            mask = datapoints[:, 0] == i
+            lengths[mask] = seq_lengths[datapoints[mask, 1]]
+
+        return lengths
+
+    def _next_candidates(self, dataset_idx: int, n: int) -> torch.Tensor:
+        """Returns the next n indices of repeated shuffles of a dataset"""
+        dataset_len = len(self.datasets[dataset_idx])
+        pool = [self._shuffled[dataset_idx]]
+        pool_len = len(pool[0])
+        while(pool_len < n):
+            pool.append(torch.randperm(dataset_len, generator=self.generator))
+            pool_len += dataset_len
+
+        pool = torch.cat(pool)
+        self._shuffled[dataset_idx] = pool[n:]
+
+        return pool[:n]
+
+    def _draw_samples(self, dataset_idx: int, n: int) -> torch.Tensor:
+        """Draws n datapoints from a dataset that pass the training filters"""
+        sample_probs = self._sample_probs[dataset_idx]
+        mean_prob = float(np.mean(sample_probs)) if len(sample_probs) else 0.
+        if(n > 0 and mean_prob == 0.):
+            raise ValueError(
+                f"No chains of dataset {dataset_idx} pass the training filters"
+            )
+
+        accepted = [self._accepted[dataset_idx]]
+        no_accepted = len(accepted[0])
+        while(no_accepted < n):
+            # Enough candidates to (most likely) finish in one go
+            no_candidates = math.ceil(1.1 * (n - no_accepted) / mean_prob) + 16
+            candidates = self._next_candidates(dataset_idx, no_candidates)
+            p = torch.from_numpy(sample_probs[candidates.numpy()])
+            keep = torch.rand(
+                len(p), dtype=p.dtype, generator=self.generator
+            ) < p
+            accepted.append(candidates[keep])
+            no_accepted += len(accepted[-1])
+
+        accepted = torch.cat(accepted)
+        self._accepted[dataset_idx] = accepted[n:]
+
+        return accepted[:n]
+
+    def _get_sampler_state(self) -> Dict[str, Any]:
+        return {
+            "rng_state": self.generator.get_state(),
+            "shuffled": list(self._shuffled),
+            "accepted": list(self._accepted),
+        }
+
+    def _set_sampler_state(self, state: Dict[str, Any]):
+        self.generator.set_state(state["rng_state"])
+        self._shuffled = list(state["shuffled"])
+        self._accepted = list(state["accepted"])
+
+    def state_dict(self) -> Dict[str, Any]:
+        """
+            Returns:
+                The current sampler state, from which subsequent epochs are
+                drawn, along with the state at the start of the current 
+                epoch (under "epoch_start"), from which it can be regenerated
+        """
+        state = self._get_sampler_state()
+        state["epoch_start"] = self._epoch_start_state
+        return state
+
+    def load_state_dict(
+        self, 
+        state_dict: Dict[str, Any], 
+        start: Optional[int] = None
+    ):
+        """
+            Restores a sampler state returned by state_dict.
+
+            Args:
+                state_dict:
+                    The saved sampler state
+                start:
+                    If None, the next call to reroll draws the epoch after the
+                    one during which the state was saved. Otherwise, it
+                    regenerates that epoch, skipping its first start 
+                    datapoints (e.g. those consumed before a checkpoint was
+                    saved), so that training can resume mid-epoch
+        """
+        if(start is None):
+            self._set_sampler_state(state_dict)
+            self._epoch_start_state = state_dict["epoch_start"]
+            self._resume_start = 0
+        else:
+            if(state_dict["epoch_start"] is None):
+                raise ValueError("The state was saved before the first epoch")
+            self._set_sampler_state(state_dict["epoch_start"])
+            self._epoch_start_state = None
+            self._resume_start = start
 
     def reroll(self):
+        self._epoch_start_state = self._get_sampler_state()
+
         dataset_choices = torch.multinomial(
             torch.tensor(self.probabilities),
             num_samples=self.epoch_len,
@@ -371,11 +645,19 @@ class OpenFoldDataset(torch.utils.data.Dataset):
             generator=self.generator,
         )
 
-        self.datapoints = []
-        for dataset_idx in dataset_choices:
-            samples = self._samples[dataset_idx]
-            datapoint_idx = next(samples)
-            self.datapoints.append((dataset_idx, datapoint_idx))
+        datapoint_idx = torch.zeros_like(dataset_choices)
+        counts = torch.bincount(dataset_choices, minlength=len(self.datasets))
+        for dataset_idx, count in enumerate(counts.tolist()):
+            datapoint_idx[dataset_choices == dataset_idx] = self._draw_samples(
+                dataset_idx, count
+            )
+
+        self.datapoints = list(
+            zip(dataset_choices.tolist(), datapoint_idx.tolist())
+        )
+
+        self._start = self._resume_start
+        self._resume_start = 0
 
 
 class OpenFoldBatchCollator:
@@ -384,11 +666,167 @@ class OpenFoldBatchCollator:
         return dict_multimap(stack_fn, prots) 
 
 
+class OpenFoldBucketBatchSampler(torch.utils.data.Sampler):
+    """
+        Groups the datapoints of an OpenFoldDataset epoch into batches of
+        similar (cropped) length.
+
+        Datapoints are bucketed by their cropped sequence length, rounded up
+        to a multiple of bucket_size. Each batch is drawn from a single bucket
+        and holds as many datapoints as fit in a budget of padded residue
+        pairs, so that batches of short chains contain more samples than
+        batches of long ones. The order of the batches is shuffled.
+
+        In distributed settings, each rank receives an equal share of the
+        batches. Lightning can't replace the sampler in that case, so
+        replace_sampler_ddp must be False (see
+        OpenFoldDataModule.replace_sampler_ddp).
+    """
+    def __init__(self,
+        dataset: OpenFoldDataset,
+        crop_size: int,
+        bucket_size: int,
+        max_residue_pairs: int,
+        generator: Optional[torch.Generator] = None,
+        num_replicas: Optional[int] = None,
+        rank: Optional[int] = None,
+    ):
+        """
+            Args:
+                dataset:
+                    The (rerolled) dataset
+                crop_size:
+                    The training crop size
+                bucket_size:
+                    Granularity of the length buckets
+                max_residue_pairs:
+                    Maximum number of padded residue pairs (i.e. the sum of
+                    the squared padded lengths) per batch. Datapoints larger
+                    than this are batched on their own.
+                generator:
+                    Generator used to shuffle the batches
+                num_replicas:
+                    Number of distributed ranks. Inferred if the default 
+                    process group is initialized
+                rank:
+                    Rank of this process. Inferred like num_replicas
+        """
+        self.dataset = dataset
+        self.crop_size = crop_size
+        self.bucket_size = bucket_size
+        self.max_residue_pairs = max_residue_pairs
+        self.generator = generator
+
+        if(num_replicas is None or rank is None):
+            distributed = (
+                torch.distributed.is_available() and 
+                torch.distributed.is_initialized()
+            )
+            if(num_replicas is None):
+                num_replicas = (
+                    torch.distributed.get_world_size() if distributed else 1
+                )
+            if(rank is None):
+                rank = torch.distributed.get_rank() if distributed else 0
+
+        self.num_replicas = num_replicas
+        self.rank = rank
+
+    def _get_buckets(self) -> Dict[int, np.ndarray]:
+        lengths = np.minimum(
+            self.dataset.get_datapoint_lengths(), self.crop_size
+        )
+        padded = np.minimum(
+            -(-lengths // self.bucket_size) * self.bucket_size, self.crop_size
+        )
+        return {
+            int(b): np.nonzero(padded == b)[0] for b in np.unique(padded)
+        }
+
+    def _get_bucket_batch_size(self, bucket: int) -> int:
+        return max(self.max_residue_pairs // bucket ** 2, 1)
+
+    def __iter__(self):
+        batches = []
+        for bucket, idx in self._get_buckets().items():
+            batch_size = self._get_bucket_batch_size(bucket)
+            batches.extend(
+                idx[i: i + batch_size].tolist()
+                for i in range(0, len(idx), batch_size)
+            )
+
+        order = torch.randperm(len(batches), generator=self.generator)
+        batches = [batches[i] for i in order.tolist()]
+
+        # Every rank gets the same number of batches
+        no_batches = len(self)
+        for batch in batches[self.rank::self.num_replicas][:no_batches]:
+            yield batch
+
+    def __len__(self) -> int:
+        no_batches = sum(
+            math.ceil(len(idx) / self._get_bucket_batch_size(bucket))
+            for bucket, idx in self._get_buckets().items()
+        )
+        return no_batches // self.num_replicas
+
+
+class OpenFoldBucketCollator:
+    """
+        Stacks training samples, padded to the crop size, after trimming the
+        padding shared by the whole batch. The residue dimensions of the
+        batch are cut to the longest (cropped) sample, rounded up to a 
+        multiple of bucket_size.
+    """
+    def __init__(self, 
+        shape_schema: Mapping[str, Sequence[Optional[str]]], 
+        bucket_size: int,
+    ):
+        """
+            Args:
+                shape_schema:
+                    The "feat" shape schema of the data config
+                bucket_size:
+                    Granularity of the padded lengths
+        """
+        self.shape_schema = shape_schema
+        self.bucket_size = bucket_size
+
+    def __call__(self, prots):
+        num_res = max(int(torch.max(p["seq_length"])) for p in prots)
+        num_res = -(-num_res // self.bucket_size) * self.bucket_size
+
+        def trim(k, v):
+            schema = self.shape_schema.get(k, None)
+            if(schema is None):
+                return v
+
+            # Processed features carry an extra, trailing recycling dimension
+            for i, dim in enumerate(schema):
+                if(dim == NUM_RES):
+                    v = v.narrow(i, 0, min(num_res, v.shape[i]))
+
+            return v
+
+        prots = [{k: trim(k, v) for k, v in p.items()} for p in prots]
+
+        stack_fn = partial(torch.stack, dim=0)
+        return dict_multimap(stack_fn, prots) 
+
+
 class OpenFoldDataLoader(torch.utils.data.DataLoader):
-    def __init__(self, *args, config, stage="train", generator=None, **kwargs):
+    def __init__(self, 
+        *args, 
+        config, 
+        stage="train", 
+        generator=None, 
+        prefetch_to_device=False,
+        **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self.config = config
         self.stage = stage    
+        self.prefetch_to_device = prefetch_to_device
 
         if(generator is None):
             generator = torch.Generator()
@@ -474,7 +912,14 @@ class OpenFoldDataLoader(torch.utils.data.DataLoader):
             for batch in iterator:
                 yield self._add_batch_properties(batch)
 
-        return _batch_prop_gen(it)
+        batches = _batch_prop_gen(it)
+        if(self.prefetch_to_device and torch.cuda.is_available()):
+            # Batches are moved to the GPU ahead of time. Unused recycling
+            # iterations have already been cut by _add_batch_properties, so 
+            # they aren't copied
+            batches = iter(prefetch.DevicePrefetcher(batches))
+
+        return batches
 
 
 class OpenFoldDataModule(pl.LightningDataModule):
@@ -499,9 +944,16 @@ class OpenFoldDataModule(pl.LightningDataModule):
         template_release_dates_cache_path: Optional[str] = None,
         batch_seed: Optional[int] = None,
         train_epoch_len: int = 50000, 
+        template_num_workers: int = 1,
+        template_store_path: Optional[str] = None,
+        use_fast_mmcif_parser: bool = False,
+        feature_cache_dir: Optional[str] = None,
+        feature_cache_max_size_gb: Optional[float] = None,
         _distillation_structure_index_path: Optional[str] = None,
         _alignment_index_path: Optional[str] = None,
         _distillation_alignment_index_path: Optional[str] = None,
+        _alignment_store_path: Optional[str] = None,
+        _distillation_alignment_store_path: Optional[str] = None,
         **kwargs
     ):
         super(OpenFoldDataModule, self).__init__()
@@ -530,6 +982,9 @@ class OpenFoldDataModule(pl.LightningDataModule):
         self.obsolete_pdbs_file_path = obsolete_pdbs_file_path
         self.batch_seed = batch_seed
         self.train_epoch_len = train_epoch_len
+        self.template_num_workers = template_num_workers
+        self.template_store_path = template_store_path
+        self.use_fast_mmcif_parser = use_fast_mmcif_parser
 
         if(self.train_data_dir is None and self.predict_data_dir is None):
             raise ValueError(
@@ -569,6 +1024,33 @@ class OpenFoldDataModule(pl.LightningDataModule):
             with open(_distillation_alignment_index_path, "r") as fp:
                 self._distillation_alignment_index = json.load(fp)
 
+        # Alignment stores (see scripts/generate_alignment_store.py) are 
+        # drop-in replacements for alignment indices
+        index_store_pairs = [
+            ("_alignment_index", _alignment_store_path),
+            ("_distillation_alignment_index", 
+                _distillation_alignment_store_path),
+        ]
+        for attr, store_path in index_store_pairs:
+            if(store_path is None):
+                continue
+            elif(getattr(self, attr) is not None):
+                raise ValueError(
+                    f"Only one of {attr}_path and the corresponding "
+                    f"alignment store path may be specified"
+                )
+
+            setattr(self, attr, alignment_store.AlignmentStore(store_path))
+
+        self._feature_cache = None
+        if(feature_cache_dir is not None):
+            max_size = None
+            if(feature_cache_max_size_gb is not None):
+                max_size = int(feature_cache_max_size_gb * 1024 ** 3)
+            self._feature_cache = feature_cache.FeatureCache(
+                feature_cache_dir, max_size=max_size,
+            )
+
     def setup(self):
         # Most of the arguments are the same for the three datasets 
         dataset_gen = partial(OpenFoldSingleDataset,
@@ -580,6 +1062,10 @@ class OpenFoldDataModule(pl.LightningDataModule):
                 self.template_release_dates_cache_path,
             obsolete_pdbs_file_path=
                 self.obsolete_pdbs_file_path,
+            template_num_workers=self.template_num_workers,
+            template_store_path=self.template_store_path,
+            use_fast_mmcif_parser=self.use_fast_mmcif_parser,
+            _feature_cache=self._feature_cache,
         )
 
         if(self.training_mode):
@@ -639,6 +1125,12 @@ class OpenFoldDataModule(pl.LightningDataModule):
                 _roll_at_init=False,
             )
 
+            # Shuffles length-bucketed batches. Must be seeded identically on
+            # all ranks
+            self._bucket_generator = torch.Generator()
+            if(self.batch_seed is not None):
+                self._bucket_generator.manual_seed(self.batch_seed + 2)
+
     
             if(self.val_data_dir is not None):
                 self.eval_dataset = dataset_gen(
@@ -659,6 +1151,17 @@ class OpenFoldDataModule(pl.LightningDataModule):
                 mode="predict",
             )
 
+    @property
+    def replace_sampler_ddp(self) -> bool:
+        """
+            Whether Lightning should shard the data loaders between ranks by
+            replacing their samplers (see the Trainer flag of the same name).
+            Length-bucketed training batches are instead sharded by
+            OpenFoldBucketBatchSampler, which Lightning can't re-instantiate,
+            and the remaining loaders are then sharded here.
+        """
+        return not self.config.data_module.data_loaders.length_bucketing.enabled
+
     def _gen_dataloader(self, stage):
         generator = torch.Generator()
         if(self.batch_seed is not None):
@@ -676,16 +1179,50 @@ class OpenFoldDataModule(pl.LightningDataModule):
         else:
             raise ValueError("Invalid stage")
 
-        batch_collator = OpenFoldBatchCollator()
+        loader_config = self.config.data_module.data_loaders
+        bucketing_config = loader_config.length_bucketing
+        if(stage == "train" and bucketing_config.enabled):
+            crop_size = self.config.train.crop_size
+            max_residue_pairs = bucketing_config.max_residue_pairs
+            if(max_residue_pairs is None):
+                # Never more than a regular batch of full crops
+                max_residue_pairs = loader_config.batch_size * crop_size ** 2
+
+            batch_kwargs = {
+                "batch_sampler": OpenFoldBucketBatchSampler(
+                    dataset,
+                    crop_size=crop_size,
+                    bucket_size=bucketing_config.bucket_size,
+                    max_residue_pairs=max_residue_pairs,
+                    generator=self._bucket_generator,
+                ),
+            }
+            batch_collator = OpenFoldBucketCollator(
+                self.config.common.feat, bucketing_config.bucket_size,
+            )
+        else:
+            batch_kwargs = {"batch_size": loader_config.batch_size}
+            distributed = (
+                torch.distributed.is_available() and
+                torch.distributed.is_initialized()
+            )
+            if(not self.replace_sampler_ddp and distributed):
+                batch_kwargs["sampler"] = (
+                    torch.utils.data.distributed.DistributedSampler(
+                        dataset, shuffle=False
+                    )
+                )
+            batch_collator = OpenFoldBatchCollator()
 
         dl = OpenFoldDataLoader(
             dataset,
             config=self.config,
             stage=stage,
             generator=generator,
-            batch_size=self.config.data_module.data_loaders.batch_size,
-            num_workers=self.config.data_module.data_loaders.num_workers,
+            prefetch_to_device=loader_config.prefetch_to_device,
+            num_workers=loader_config.num_workers,
             collate_fn=batch_collator,
+            **batch_kwargs,
         )
 
         return dl
@@ -701,6 +1238,18 @@ class OpenFoldDataModule(pl.LightningDataModule):
     def predict_dataloader(self):
         return self._gen_dataloader("predict") 
 
+    def on_save_checkpoint(self, checkpoint):
+        # Lets resumed runs continue the same sequence of training epochs
+        train_dataset = getattr(self, "train_dataset", None)
+        if(train_dataset is not None):
+            checkpoint["train_sampler_state"] = train_dataset.state_dict()
+
+    def on_load_checkpoint(self, checkpoint):
+        train_dataset = getattr(self, "train_dataset", None)
+        state = checkpoint.get("train_sampler_state", None)
+        if(train_dataset is not None and state is not None):
+            train_dataset.load_state_dict(state)
+
 
 class DummyDataset(torch.utils.data.Dataset):
     def __init__(self, batch_path):
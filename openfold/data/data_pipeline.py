@@ -16,11 +16,11 @@
 import os
 import datetime
 from multiprocessing import cpu_count
-from typing import Mapping, Optional, Sequence, Any
+from typing import Mapping, Optional, Sequence, Any, Union
 
 import numpy as np
 
-from openfold.data import templates, parsers, mmcif_parsing
+from openfold.data import templates, parsers, mmcif_parsing, alignment_store
 from openfold.data.tools import jackhmmer, hhblits, hhsearch
 from openfold.data.tools.utils import to_date 
 from openfold.np import residue_constants, protein
@@ -228,7 +228,7 @@ def make_msa_features(
     if not msas:
         raise ValueError("At least one MSA must be provided.")
 
-    int_msa = []
+    unique_msa = []
     deletion_matrix = []
     seen_sequences = set()
     for msa_index, msa in enumerate(msas):
@@ -240,22 +240,100 @@ def make_msa_features(
             if sequence in seen_sequences:
                 continue
             seen_sequences.add(sequence)
-            int_msa.append(
-                [residue_constants.HHBLITS_AA_TO_ID[res] for res in sequence]
-            )
+            unique_msa.append(sequence)
             deletion_matrix.append(deletion_matrices[msa_index][sequence_index])
 
     num_res = len(msas[0][0])
-    num_alignments = len(int_msa)
+    num_alignments = len(unique_msa)
     features = {}
     features["deletion_matrix_int"] = np.array(deletion_matrix, dtype=np.int32)
-    features["msa"] = np.array(int_msa, dtype=np.int32)
+    features["msa"] = encode_msa(unique_msa).astype(np.int32)
     features["num_alignments"] = np.array(
         [num_alignments] * num_res, dtype=np.int32
     )
     return features
 
 
+def encode_msa(msa: Union[Sequence[str], np.ndarray]) -> np.ndarray:
+    """Converts aligned sequences to an [N_seq, N_res] int8 array of HHblits 
+    residue IDs. The sequences can be given as strings or as an
+    [N_seq, N_res] uint8 array of ASCII codes (see parsers.parse_a3m_np)."""
+    if(isinstance(msa, np.ndarray)):
+        num_seq, num_res = msa.shape
+        chars = msa.reshape(-1)
+    else:
+        num_seq = len(msa)
+        num_res = len(msa[0]) if num_seq > 0 else 0
+        chars = np.frombuffer("".join(msa).encode("ascii"), dtype=np.uint8)
+        if(len(chars) != num_seq * num_res):
+            raise ValueError(
+                "All sequences in an MSA must have the same length"
+            )
+
+    int_msa = residue_constants.HHBLITS_AA_TO_ID_TABLE[chars]
+    if(np.any(int_msa < 0)):
+        bad_chars = set(chars[int_msa < 0].tobytes().decode("ascii"))
+        raise ValueError(f"Invalid residues in MSA: {sorted(bad_chars)}")
+
+    return int_msa.reshape(num_seq, num_res)
+
+
+def make_msa_features_from_arrays(
+    msas: Sequence[np.ndarray],
+    deletion_matrices: Sequence[np.ndarray],
+) -> FeatureDict:
+    """Equivalent to make_msa_features, but takes MSAs that have already been
+    parsed into [N_seq, N_res] uint8 arrays of ASCII codes (see
+    parsers.parse_a3m_np)."""
+    if not msas:
+        raise ValueError("At least one MSA must be provided.")
+
+    for msa_index, msa in enumerate(msas):
+        if msa.shape[0] == 0:
+            raise ValueError(
+                f"MSA {msa_index} must contain at least one sequence."
+            )
+
+    msa = np.concatenate(msas, axis=0)
+    deletion_matrix = np.concatenate(
+        [d.astype(np.int32, copy=False) for d in deletion_matrices], axis=0
+    )
+
+    # Only the first occurrence of each sequence is kept. Rows are hashed as
+    # raw bytes, which is much cheaper than comparing lists of characters.
+    # This has to happen before the rows are encoded, since the encoding maps
+    # several residues to the same ID.
+    seen_sequences = set()
+    keep = []
+    for i, row in enumerate(msa):
+        row_bytes = row.tobytes()
+        if row_bytes in seen_sequences:
+            continue
+        seen_sequences.add(row_bytes)
+        keep.append(i)
+
+    num_res = msa.shape[1]
+    num_alignments = len(keep)
+    features = {}
+    features["deletion_matrix_int"] = deletion_matrix[keep]
+    features["msa"] = encode_msa(msa[keep]).astype(np.int32)
+    features["num_alignments"] = np.array(
+        [num_alignments] * num_res, dtype=np.int32
+    )
+    return features
+
+
+def _parse_msa_string(msa_string: str, ext: str) -> Mapping[str, np.ndarray]:
+    if(ext == ".a3m"):
+        msa, deletion_matrix = parsers.parse_a3m_np(msa_string)
+    elif(ext == ".sto"):
+        msa, deletion_matrix, _ = parsers.parse_stockholm_np(msa_string)
+    else:
+        raise ValueError(f"Unsupported MSA format: {ext}")
+
+    return {"msa": msa, "deletion_matrix": deletion_matrix}
+
+
 class AlignmentRunner:
     """Runs alignment tools and saves the results"""
     def __init__(
@@ -464,6 +542,9 @@ class DataPipeline:
         alignment_dir: str,
         _alignment_index: Optional[Any] = None,
     ) -> Mapping[str, Any]:
+        if(isinstance(_alignment_index, alignment_store.AlignmentStoreEntry)):
+            return _alignment_index.get_msas()
+
         msa_data = {} 
         if(_alignment_index is not None):
             fp = open(os.path.join(alignment_dir, _alignment_index["db"]), "rb")
@@ -476,20 +557,12 @@ class DataPipeline:
             for (name, start, size) in _alignment_index["files"]:
                 ext = os.path.splitext(name)[-1]
 
-                if(ext == ".a3m"):
-                    msa, deletion_matrix = parsers.parse_a3m(
-                        read_msa(start, size)
-                    )
-                    data = {"msa": msa, "deletion_matrix": deletion_matrix}
-                elif(ext == ".sto"):
-                    msa, deletion_matrix, _ = parsers.parse_stockholm(
-                        read_msa(start, size)
-                    )
-                    data = {"msa": msa, "deletion_matrix": deletion_matrix}
-                else:
+                if(ext not in [".a3m", ".sto"]):
                     continue
-               
-                msa_data[name] = data
+
+                msa_data[name] = _parse_msa_string(
+                    read_msa(start, size), ext
+                )
             
             fp.close()
         else: 
@@ -497,20 +570,11 @@ class DataPipeline:
                 path = os.path.join(alignment_dir, f)
                 ext = os.path.splitext(f)[-1]
 
-                if(ext == ".a3m"):
-                    with open(path, "r") as fp:
-                        msa, deletion_matrix = parsers.parse_a3m(fp.read())
-                    data = {"msa": msa, "deletion_matrix": deletion_matrix}
-                elif(ext == ".sto"):
-                    with open(path, "r") as fp:
-                        msa, deletion_matrix, _ = parsers.parse_stockholm(
-                            fp.read()
-                        )
-                    data = {"msa": msa, "deletion_matrix": deletion_matrix}
-                else:
+                if(ext not in [".a3m", ".sto"]):
                     continue
-                
-                msa_data[f] = data
+
+                with open(path, "r") as fp:
+                    msa_data[f] = _parse_msa_string(fp.read(), ext)
 
         return msa_data
 
@@ -519,6 +583,9 @@ class DataPipeline:
         alignment_dir: str,
         _alignment_index: Optional[Any] = None
     ) -> Mapping[str, Any]:
+        if(isinstance(_alignment_index, alignment_store.AlignmentStoreEntry)):
+            return _alignment_index.get_template_hits()
+
         all_hits = {}
         if(_alignment_index is not None):
             fp = open(os.path.join(alignment_dir, _alignment_index["db"]), 'rb')
@@ -562,8 +629,11 @@ class DataPipeline:
                     """
                 )
             msa_data["dummy"] = {
-                "msa": [input_sequence],
-                "deletion_matrix": [[0 for _ in input_sequence]],
+                "msa": np.frombuffer(
+                    input_sequence.encode("ascii"), dtype=np.uint8
+                )[None],
+                "deletion_matrix": 
+                    np.zeros((1, len(input_sequence)), dtype=np.int32),
             }
 
         msas, deletion_matrices = zip(*[
@@ -581,7 +651,7 @@ class DataPipeline:
         msas, deletion_matrices = self._get_msas(
             alignment_dir, input_sequence, _alignment_index
         )
-        msa_features = make_msa_features(
+        msa_features = make_msa_features_from_arrays(
             msas=msas,
             deletion_matrices=deletion_matrices,
         )
@@ -731,7 +801,9 @@ class DataPipeline:
             self.template_featurizer,
         )
 
-        msa_features = self._process_msa_feats(alignment_dir, input_sequence)
+        msa_features = self._process_msa_feats(
+            alignment_dir, input_sequence, _alignment_index
+        )
 
         return {**core_feats, **template_features, **msa_features}
 
@@ -783,23 +855,25 @@ class DataPipeline:
 
         final_msa = []
         final_deletion_mat = []
+        gap_id = ord("-")
         msa_it = enumerate(zip(msa_list, deletion_mat_list))
         for i, (msas, deletion_mats) in msa_it:
             prec, post = sum(seq_lens[:i]), sum(seq_lens[i + 1:])
             msas = [
-                [prec * '-' + seq + post * '-' for seq in msa] for msa in msas
+                np.pad(msa, ((0, 0), (prec, post)), constant_values=gap_id) 
+                for msa in msas
             ]
             deletion_mats = [
-                [prec * [0] + dml + post * [0] for dml in deletion_mat] 
+                np.pad(deletion_mat, ((0, 0), (prec, post)))
                 for deletion_mat in deletion_mats
             ]
 
-            assert(len(msas[0][-1]) == len(input_sequence))
+            assert(msas[0].shape[-1] == len(input_sequence))
 
             final_msa.extend(msas)
             final_deletion_mat.extend(deletion_mats)
 
-        msa_features = make_msa_features(
+        msa_features = make_msa_features_from_arrays(
             msas=final_msa,
             deletion_matrices=final_deletion_mat,
         )
@@ -0,0 +1,201 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    A persistent, content-addressed cache of processed features.
+
+    Entries are keyed by a hash of everything that determines them (see
+    make_cache_key), so stale entries are never read; they simply stop being
+    used and are eventually evicted. Writes are atomic, so a single cache
+    directory can be shared by all DataLoader workers and across runs.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+import torch
+
+
+_EXT = ".npz"
+
+
+def file_signature(path: str) -> Any:
+    """
+        Cheap stand-in for the contents of a file or directory: its path,
+        size and modification time. Directories are described by the
+        signatures of everything inside them. Missing paths return None.
+    """
+    if(os.path.isdir(path)):
+        return [
+            file_signature(os.path.join(path, f))
+            for f in sorted(os.listdir(path))
+        ]
+    elif(os.path.exists(path)):
+        stat = os.stat(path)
+        return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+    return None
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+        Hashes an arbitrary collection of JSON-serializable (or
+        str()-able, e.g. ConfigDict) objects into a cache key.
+    """
+    def _default(o):
+        if(hasattr(o, "to_dict")):
+            return o.to_dict()
+        return str(o)
+
+    serialized = json.dumps(parts, sort_keys=True, default=_default)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _to_numpy(v: Any) -> np.ndarray:
+    if(torch.is_tensor(v)):
+        return v.detach().cpu().numpy()
+
+    v = np.asarray(v)
+    # Object arrays would have to be pickled. In practice, they only ever
+    # contain byte strings, which have a native NumPy type.
+    if(v.dtype == np.object_):
+        v = v.astype(np.bytes_)
+
+    return v
+
+
+class FeatureCache:
+    def __init__(self,
+        cache_dir: str,
+        max_size: Optional[int] = None,
+    ):
+        """
+            Args:
+                cache_dir:
+                    Directory in which entries are stored. Created if it
+                    doesn't exist
+                max_size:
+                    Maximum total size of the cache in bytes. When it is
+                    exceeded, the least recently used entries are evicted.
+                    If None, the cache grows without bound
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Running estimate of the size of the cache. The cache directory is
+        # only rescanned when the estimate exceeds max_size, since other
+        # processes may be writing to the same directory.
+        self._size = None
+
+    def _path(self, key: str) -> str:
+        # Shard entries to keep directories small
+        return os.path.join(self.cache_dir, key[:2], key + _EXT)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                entry = {k: npz[k] for k in npz.files}
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # e.g. a truncated file left behind by a crash
+            logging.warning(f"Ignoring corrupted feature cache entry {path}")
+            self._remove(path)
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return entry
+
+    def put(self, key: str, features: Mapping[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        arrays = {k: _to_numpy(v) for k, v in features.items()}
+
+        # Write to a temporary file first so that readers never see partial
+        # entries
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                np.savez_compressed(fp, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        if(self.max_size is not None):
+            if(self._size is None):
+                self._size = self._scan_size()
+            else:
+                self._size += os.path.getsize(path)
+
+            if(self._size > self.max_size):
+                self.evict()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        for shard in os.scandir(self.cache_dir):
+            if(not shard.is_dir()):
+                continue
+            for f in os.scandir(shard.path):
+                if(f.name.endswith(_EXT)):
+                    try:
+                        yield f.path, f.stat()
+                    except FileNotFoundError:
+                        pass
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def evict(self, target_size: Optional[int] = None):
+        """
+            Removes least recently used entries until the cache is smaller
+            than target_size (by default, 90% of max_size).
+        """
+        if(target_size is None):
+            if(self.max_size is None):
+                return
+            target_size = int(0.9 * self.max_size)
+
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime_ns)
+        size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if(size <= target_size):
+                break
+            self._remove(path)
+            size -= stat.st_size
+
+        self._size = size
@@ -70,11 +70,11 @@ def make_data_config(
     return cfg, feature_names
 
 
-def np_example_to_features(
+def np_example_to_nonensembled_features(
     np_example: FeatureDict,
     config: ml_collections.ConfigDict,
     mode: str,
-):
+) -> TensorDict:
     np_example = dict(np_example)
     num_res = int(np_example["seq_length"][0])
     cfg, feature_names = make_data_config(config, mode=mode, num_res=num_res)
@@ -88,15 +88,47 @@ def np_example_to_features(
         np_example=np_example, features=feature_names
     )
     with torch.no_grad():
-        features = input_pipeline.process_tensors_from_config(
+        features = input_pipeline.process_nonensembled_tensors(
             tensor_dict,
             cfg.common,
             cfg[mode],
         )
 
+    return features
+
+
+def nonensembled_features_to_features(
+    features: TensorDict,
+    config: ml_collections.ConfigDict,
+    mode: str,
+) -> TensorDict:
+    # seq_length has already been squeezed to a scalar at this point
+    num_res = int(features["seq_length"])
+    cfg, _ = make_data_config(config, mode=mode, num_res=num_res)
+
+    with torch.no_grad():
+        features = input_pipeline.process_ensembled_tensors(
+            dict(features),
+            cfg.common,
+            cfg[mode],
+        )
+
     return {k: v for k, v in features.items()}
 
 
+def np_example_to_features(
+    np_example: FeatureDict,
+    config: ml_collections.ConfigDict,
+    mode: str,
+):
+    features = np_example_to_nonensembled_features(
+        np_example=np_example, config=config, mode=mode,
+    )
+    return nonensembled_features_to_features(
+        features=features, config=config, mode=mode,
+    )
+
+
 class FeaturePipeline:
     def __init__(
         self,
@@ -114,3 +146,29 @@ class FeaturePipeline:
             config=self.config,
             mode=mode,
         )
+
+    def process_nonensembled_features(
+        self,
+        raw_features: FeatureDict,
+        mode: str = "train",
+    ) -> TensorDict:
+        """
+            Runs only the deterministic part of the pipeline. Combined with
+            process_ensembled_features, equivalent to process_features.
+        """
+        return np_example_to_nonensembled_features(
+            np_example=raw_features,
+            config=self.config,
+            mode=mode,
+        )
+
+    def process_ensembled_features(
+        self,
+        features: TensorDict,
+        mode: str = "train",
+    ) -> TensorDict:
+        return nonensembled_features_to_features(
+            features=features,
+            config=self.config,
+            mode=mode,
+        )
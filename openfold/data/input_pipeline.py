@@ -17,6 +17,7 @@ from functools import partial
 
 import torch
 
+from openfold.config import NUM_MSA_SEQ, NUM_EXTRA_SEQ
 from openfold.data import data_transforms
 
 
@@ -150,8 +151,25 @@ def ensembled_transform_fns(common_cfg, mode_cfg, ensemble_seed):
     return transforms
 
 
-def process_tensors_from_config(tensors, common_cfg, mode_cfg):
-    """Based on the config, apply filters and transformations to the data."""
+def process_nonensembled_tensors(tensors, common_cfg, mode_cfg):
+    """
+        Applies the deterministic, non-ensembled transformations. The output
+        of this function depends only on the input and the config, and can
+        therefore be cached.
+    """
+    nonensembled = nonensembled_transform_fns(
+        common_cfg,
+        mode_cfg,
+    )
+
+    return compose(nonensembled)(tensors)
+
+
+def process_ensembled_tensors(tensors, common_cfg, mode_cfg):
+    """
+        Applies the stochastic, ensembled transformations to the output of
+        process_nonensembled_tensors, once per recycling iteration.
+    """
 
     ensemble_seed = torch.Generator().seed()
 
@@ -167,29 +185,36 @@ def process_tensors_from_config(tensors, common_cfg, mode_cfg):
         d["ensemble_index"] = i
         return fn(d)
 
-    no_templates = True
-    if("template_aatype" in tensors):
-        no_templates = tensors["template_aatype"].shape[0] == 0
-
-    nonensembled = nonensembled_transform_fns(
-        common_cfg,
-        mode_cfg,
-    )
-
-    tensors = compose(nonensembled)(tensors)
-
     if("no_recycling_iters" in tensors):
         num_recycling = int(tensors["no_recycling_iters"])
     else:
         num_recycling = common_cfg.max_recycling_iters
 
+    constant_features = None
+    if(common_cfg.get("compact_recycling_features", False)):
+        # Only the sampled and masked MSAs, and features derived from them,
+        # differ between recycling iterations. Crops and templates are drawn
+        # with the same seed in every iteration
+        constant_features = set(
+            k for k, v in common_cfg.feat.items() 
+            if NUM_MSA_SEQ not in v and NUM_EXTRA_SEQ not in v
+        )
+
     tensors = map_fn(
-        lambda x: wrap_ensemble_fn(tensors, x), torch.arange(num_recycling + 1)
+        lambda x: wrap_ensemble_fn(tensors, x), 
+        torch.arange(num_recycling + 1),
+        constant_features=constant_features,
     )
 
     return tensors
 
 
+def process_tensors_from_config(tensors, common_cfg, mode_cfg):
+    """Based on the config, apply filters and transformations to the data."""
+    tensors = process_nonensembled_tensors(tensors, common_cfg, mode_cfg)
+    return process_ensembled_tensors(tensors, common_cfg, mode_cfg)
+
+
 @data_transforms.curry1
 def compose(x, fs):
     for f in fs:
@@ -197,11 +222,16 @@ def compose(x, fs):
     return x
 
 
-def map_fn(fun, x):
+def map_fn(fun, x, constant_features=None):
     ensembles = [fun(elem) for elem in x]
     features = ensembles[0].keys()
     ensembled_dict = {}
     for feat in features:
+        if(constant_features is not None and feat in constant_features):
+            # Consumers broadcast the size-1 ensemble dimension
+            ensembled_dict[feat] = ensembles[0][feat].unsqueeze(-1)
+            continue
+
         ensembled_dict[feat] = torch.stack(
             [dict_i[feat] for dict_i in ensembles], dim=-1
         )
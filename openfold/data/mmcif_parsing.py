@@ -20,7 +20,8 @@ import io
 import json
 import logging
 import os
-from typing import Any, Mapping, Optional, Sequence, Tuple
+import re
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
 from Bio import PDB
 from Bio.Data import SCOPData
@@ -174,7 +175,11 @@ def mmcif_loop_to_dict(
 
 
 def parse(
-    *, file_id: str, mmcif_string: str, catch_all_errors: bool = True
+    *,
+    file_id: str,
+    mmcif_string: str,
+    catch_all_errors: bool = True,
+    use_fast_parser: bool = False,
 ) -> ParsingResult:
     """Entry point, parses an mmcif_string.
 
@@ -185,10 +190,24 @@ def parse(
       catch_all_errors: If True, all exceptions are caught and error messages are
         returned as part of the ParsingResult. If False exceptions will be allowed
         to propagate.
+      use_fast_parser: If True, the file is parsed by a NumPy-based parser that
+        only tokenizes the categories used here, rather than by Biopython. The
+        structure of the resulting MmcifObject is then a lightweight stand-in
+        for the Biopython structure. Files the fast parser can't handle
+        identically (e.g. those containing point mutations) and files that
+        fail to parse are transparently passed on to Biopython.
 
     Returns:
       A ParsingResult.
     """
+    if use_fast_parser:
+        try:
+            return _parse_fast(file_id=file_id, mmcif_string=mmcif_string)
+        except Exception as e:  # pylint:disable=broad-except
+            logging.debug(
+                "Falling back to Biopython for %s: %s", file_id, str(e)
+            )
+
     errors = {}
     try:
         parser = PDB.MMCIFParser(QUIET=True)
@@ -232,59 +251,13 @@ def parse(
             mmcif_to_author_chain_id[atom.mmcif_chain_id] = atom.author_chain_id
 
             if atom.mmcif_chain_id in valid_chains:
-                hetflag = " "
-                if atom.hetatm_atom == "HETATM":
-                    # Water atoms are assigned a special hetflag of W in Biopython. We
-                    # need to do the same, so that this hetflag can be used to fetch
-                    # a residue from the Biopython structure by id.
-                    if atom.residue_name in ("HOH", "WAT"):
-                        hetflag = "W"
-                    else:
-                        hetflag = "H_" + atom.residue_name
-                insertion_code = atom.insertion_code
-                if not _is_set(atom.insertion_code):
-                    insertion_code = " "
-                position = ResiduePosition(
-                    chain_id=atom.author_chain_id,
-                    residue_number=int(atom.author_seq_num),
-                    insertion_code=insertion_code,
-                )
-                seq_idx = (
-                    int(atom.mmcif_seq_num) - seq_start_num[atom.mmcif_chain_id]
-                )
-                current = seq_to_structure_mappings.get(
-                    atom.author_chain_id, {}
+                _add_atom_to_mapping(
+                    atom, seq_start_num, seq_to_structure_mappings
                 )
-                current[seq_idx] = ResidueAtPosition(
-                    position=position,
-                    name=atom.residue_name,
-                    is_missing=False,
-                    hetflag=hetflag,
-                )
-                seq_to_structure_mappings[atom.author_chain_id] = current
-
-        # Add missing residue information to seq_to_structure_mappings.
-        for chain_id, seq_info in valid_chains.items():
-            author_chain = mmcif_to_author_chain_id[chain_id]
-            current_mapping = seq_to_structure_mappings[author_chain]
-            for idx, monomer in enumerate(seq_info):
-                if idx not in current_mapping:
-                    current_mapping[idx] = ResidueAtPosition(
-                        position=None,
-                        name=monomer.id,
-                        is_missing=True,
-                        hetflag=" ",
-                    )
 
-        author_chain_to_sequence = {}
-        for chain_id, seq_info in valid_chains.items():
-            author_chain = mmcif_to_author_chain_id[chain_id]
-            seq = []
-            for monomer in seq_info:
-                code = SCOPData.protein_letters_3to1.get(monomer.id, "X")
-                seq.append(code if len(code) == 1 else "X")
-            seq = "".join(seq)
-            author_chain_to_sequence[author_chain] = seq
+        author_chain_to_sequence = _complete_mappings(
+            valid_chains, mmcif_to_author_chain_id, seq_to_structure_mappings
+        )
 
         mmcif_object = MmcifObject(
             file_id=file_id,
@@ -303,6 +276,77 @@ def parse(
         return ParsingResult(mmcif_object=None, errors=errors)
 
 
+def _add_atom_to_mapping(
+    atom: AtomSite,
+    seq_start_num: Mapping[ChainId, int],
+    seq_to_structure_mappings: Dict[ChainId, Dict[int, ResidueAtPosition]],
+):
+    """Records the residue of an atom in seq_to_structure_mappings."""
+    hetflag = " "
+    if atom.hetatm_atom == "HETATM":
+        # Water atoms are assigned a special hetflag of W in Biopython. We
+        # need to do the same, so that this hetflag can be used to fetch
+        # a residue from the Biopython structure by id.
+        if atom.residue_name in ("HOH", "WAT"):
+            hetflag = "W"
+        else:
+            hetflag = "H_" + atom.residue_name
+    insertion_code = atom.insertion_code
+    if not _is_set(atom.insertion_code):
+        insertion_code = " "
+    position = ResiduePosition(
+        chain_id=atom.author_chain_id,
+        residue_number=int(atom.author_seq_num),
+        insertion_code=insertion_code,
+    )
+    seq_idx = (
+        int(atom.mmcif_seq_num) - seq_start_num[atom.mmcif_chain_id]
+    )
+    current = seq_to_structure_mappings.get(
+        atom.author_chain_id, {}
+    )
+    current[seq_idx] = ResidueAtPosition(
+        position=position,
+        name=atom.residue_name,
+        is_missing=False,
+        hetflag=hetflag,
+    )
+    seq_to_structure_mappings[atom.author_chain_id] = current
+
+
+def _complete_mappings(
+    valid_chains: Mapping[ChainId, Sequence[Monomer]],
+    mmcif_to_author_chain_id: Mapping[ChainId, ChainId],
+    seq_to_structure_mappings: Dict[ChainId, Dict[int, ResidueAtPosition]],
+) -> Dict[ChainId, SeqRes]:
+    """Adds missing residues to seq_to_structure_mappings and returns the 
+    SEQRES sequence of each author chain."""
+    # Add missing residue information to seq_to_structure_mappings.
+    for chain_id, seq_info in valid_chains.items():
+        author_chain = mmcif_to_author_chain_id[chain_id]
+        current_mapping = seq_to_structure_mappings[author_chain]
+        for idx, monomer in enumerate(seq_info):
+            if idx not in current_mapping:
+                current_mapping[idx] = ResidueAtPosition(
+                    position=None,
+                    name=monomer.id,
+                    is_missing=True,
+                    hetflag=" ",
+                )
+
+    author_chain_to_sequence = {}
+    for chain_id, seq_info in valid_chains.items():
+        author_chain = mmcif_to_author_chain_id[chain_id]
+        seq = []
+        for monomer in seq_info:
+            code = SCOPData.protein_letters_3to1.get(monomer.id, "X")
+            seq.append(code if len(code) == 1 else "X")
+        seq = "".join(seq)
+        author_chain_to_sequence[author_chain] = seq
+
+    return author_chain_to_sequence
+
+
 def _get_first_model(structure: PdbStructure) -> PdbStructure:
     """Returns the first model in a Biopython structure."""
     return next(structure.get_models())
@@ -433,6 +477,27 @@ def get_atom_coords(
     mmcif_object: MmcifObject, 
     chain_id: str, 
     _zero_center_positions: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(mmcif_object.structure, FastStructure):
+        all_atom_positions, all_atom_mask = _get_atom_coords_fast(
+            mmcif_object, chain_id
+        )
+    else:
+        all_atom_positions, all_atom_mask = _get_atom_coords_biopython(
+            mmcif_object, chain_id
+        )
+
+    if _zero_center_positions:
+        binary_mask = all_atom_mask.astype(bool)
+        translation_vec = all_atom_positions[binary_mask].mean(axis=0)
+        all_atom_positions[binary_mask] -= translation_vec
+
+    return all_atom_positions, all_atom_mask
+
+
+def _get_atom_coords_biopython(
+    mmcif_object: MmcifObject, 
+    chain_id: str, 
 ) -> Tuple[np.ndarray, np.ndarray]:
     # Locate the right chain
     chains = list(mmcif_object.structure.get_chains())
@@ -477,9 +542,398 @@ def get_atom_coords(
         all_atom_positions[res_index] = pos
         all_atom_mask[res_index] = mask
 
-    if _zero_center_positions:
-        binary_mask = all_atom_mask.astype(bool)
-        translation_vec = all_atom_positions[binary_mask].mean(axis=0)
-        all_atom_positions[binary_mask] -= translation_vec
+    return all_atom_positions, all_atom_mask
+
+
+def _get_atom_coords_fast(
+    mmcif_object: MmcifObject, 
+    chain_id: str, 
+) -> Tuple[np.ndarray, np.ndarray]:
+    residues = mmcif_object.structure.get_residues(chain_id)
+
+    num_res = len(mmcif_object.chain_to_seqres[chain_id])
+    all_atom_positions = np.zeros(
+        [num_res, residue_constants.atom_type_num, 3], dtype=np.float32
+    )
+    all_atom_mask = np.zeros(
+        [num_res, residue_constants.atom_type_num], dtype=np.float32
+    )
+    for res_index in range(num_res):
+        res_at_position = mmcif_object.seqres_to_structure[chain_id][res_index]
+        if not res_at_position.is_missing:
+            atom_idx, coords = residues[
+                (
+                    res_at_position.hetflag,
+                    res_at_position.position.residue_number,
+                    res_at_position.position.insertion_code,
+                )
+            ]
+            all_atom_positions[res_index, atom_idx] = coords
+            all_atom_mask[res_index, atom_idx] = 1.0
 
     return all_atom_positions, all_atom_mask
+
+
+# Fast-path parser. Instead of building a Biopython structure from a complete
+# MMCIF2Dict, only the categories below are tokenized, and the first model is 
+# stored as NumPy arrays.
+_FAST_PARSER_CATEGORIES = frozenset([
+    "_atom_site",
+    "_chem_comp",
+    "_em_3d_reconstruction",
+    "_entity_poly_seq",
+    "_entry",
+    "_exptl",
+    "_pdbx_audit_revision_history",
+    "_pdbx_struct_mod_residue",
+    "_refine",
+    "_reflns",
+    "_struct_asym",
+])
+
+# Quoted strings only end at a quote followed by whitespace. "#" starts a 
+# comment unless it occurs inside a token.
+_CIF_TOKEN_RE = re.compile(
+    r"""'(.*?)'(?=[ \t]|$)|"(.*?)"(?=[ \t]|$)|(#.*)|([^ \t]+)"""
+)
+
+
+class FastStructure:
+    """
+    Stand-in for the first model of a Biopython structure, as produced by
+    the fast-path parser. Maps each author chain ID to a dictionary from
+    Biopython residue IDs to pairs of atom37 indices and the corresponding
+    float32 coordinates.
+    """
+    def __init__(
+        self, 
+        chains: Mapping[ChainId, Mapping[Tuple[str, int, str], Any]],
+    ):
+        self._chains = chains
+
+    def get_chains(self):
+        for chain_id in self._chains:
+            yield FastChain(id=chain_id)
+
+    def get_residues(
+        self, chain_id: ChainId
+    ) -> Mapping[Tuple[str, int, str], Tuple[np.ndarray, np.ndarray]]:
+        if chain_id not in self._chains:
+            raise MultipleChainsError(
+                f"Expected exactly one chain in structure with id {chain_id}."
+            )
+        return self._chains[chain_id]
+
+
+@dataclasses.dataclass(frozen=True)
+class FastChain:
+    id: str
+
+
+class _UnsupportedByFastParser(Exception):
+    """Raised for files the fast parser can't parse exactly like Biopython."""
+
+
+def _split_cif_line(line: str) -> List[str]:
+    if "'" not in line and '"' not in line and "#" not in line:
+        return line.split()
+
+    tokens = []
+    for match in _CIF_TOKEN_RE.finditer(line):
+        if match.group(3) is not None:
+            break
+        token = match.group(match.lastindex)
+        if match.lastindex == 4 and token[0] in "'\"":
+            raise ParseError("Line ended with quote open: " + line)
+        tokens.append(token)
+
+    return tokens
+
+
+def _run_boundaries(cols: Sequence[np.ndarray], start: bool) -> np.ndarray:
+    """Marks the first (or last) element of each run of rows in which all of 
+    the given columns are constant."""
+    num_rows = len(cols[0])
+    boundaries = np.ones(num_rows, dtype=bool)
+    if num_rows > 1:
+        changed = np.any([col[1:] != col[:-1] for col in cols], axis=0)
+        if start:
+            boundaries[1:] = changed
+        else:
+            boundaries[:-1] = changed
+
+    return boundaries
+
+
+def _tokenize_mmcif(
+    mmcif_string: str,
+    categories: Sequence[str],
+) -> Dict[str, List[str]]:
+    """Tokenizes the given categories of an mmCIF string.
+
+    Equivalent to restricting the output of Biopython's MMCIF2Dict to the 
+    given categories, but items in other categories are skipped without 
+    being tokenized.
+    """
+    lines = mmcif_string.splitlines()
+    num_lines = len(lines)
+
+    def _read_text_field(i):
+        token_buffer = [lines[i][1:].rstrip()]
+        i += 1
+        while i < num_lines:
+            line = lines[i].rstrip()
+            if line.startswith(";"):
+                if line[1:].strip():
+                    raise _UnsupportedByFastParser(
+                        "Tokens after closing semicolon"
+                    )
+                return "\n".join(token_buffer), i + 1
+            token_buffer.append(line)
+            i += 1
+        raise ParseError("Missing closing semicolon")
+
+    parsed_info = {}
+    i = 0
+    while i < num_lines:
+        line = lines[i]
+        if line.startswith(("#", "data_")) or not line.strip():
+            i += 1
+        elif line.startswith("loop_"):
+            i += 1
+            keys = []
+            while i < num_lines and lines[i].startswith("_"):
+                keys.append(lines[i].strip())
+                i += 1
+
+            if not keys:
+                raise ParseError("Empty loop")
+
+            wanted = keys[0].split(".")[0] in categories
+            tokens = []
+            while i < num_lines:
+                line = lines[i]
+                if line.startswith(";"):
+                    token, i = _read_text_field(i)
+                    tokens.append(token)
+                    continue
+                elif line.startswith(("_", "loop_", "data_")):
+                    break
+                elif wanted:
+                    tokens.extend(_split_cif_line(line))
+                i += 1
+
+            if wanted:
+                if len(tokens) % len(keys) != 0:
+                    raise ParseError(f"Loop {keys[0]} is incomplete")
+                for j, key in enumerate(keys):
+                    parsed_info[key] = tokens[j::len(keys)]
+        elif line.startswith("_"):
+            tokens = _split_cif_line(line)
+            i += 1
+            if len(tokens) == 1:
+                if i < num_lines and lines[i].startswith(";"):
+                    value, i = _read_text_field(i)
+                    tokens.append(value)
+                elif i < num_lines:
+                    tokens.extend(_split_cif_line(lines[i]))
+                    i += 1
+
+            if len(tokens) != 2:
+                raise _UnsupportedByFastParser(f"Malformed item {tokens[0]}")
+
+            key, value = tokens
+            if key.split(".")[0] in categories:
+                parsed_info[key] = [value]
+        else:
+            raise _UnsupportedByFastParser(f"Unexpected line: {line}")
+
+    return parsed_info
+
+
+def _build_fast_structure(parsed_info: MmCIFDict) -> FastStructure:
+    """Builds the first model of the structure like Biopython's MMCIFParser."""
+    def _atom_site(key):
+        return np.array(parsed_info["_atom_site." + key])
+
+    # Biopython validates these for all models
+    models = _atom_site("pdbx_PDB_model_num").astype(np.int64)
+    if "_atom_site.auth_seq_id" in parsed_info:
+        resseqs = _atom_site("auth_seq_id").astype(np.int64)
+    else:
+        resseqs = _atom_site("label_seq_id").astype(np.int64)
+    _atom_site("B_iso_or_equiv").astype(np.float64)
+    occupancies = _atom_site("occupancy").astype(np.float64)
+    coords = np.stack(
+        [
+            _atom_site("Cartn_" + c).astype(np.float64) 
+            for c in ["x", "y", "z"]
+        ],
+        axis=-1,
+    ).astype(np.float32)
+
+    # Biopython starts a new model whenever the model number changes
+    num_atoms = len(models)
+    model_end = np.flatnonzero(models != models[0]) if num_atoms else []
+    num_atoms = model_end[0] if len(model_end) else num_atoms
+
+    resseqs = resseqs[:num_atoms]
+    occupancies = occupancies[:num_atoms]
+    coords = coords[:num_atoms]
+    chain_ids = _atom_site("auth_asym_id")[:num_atoms]
+    resnames = _atom_site("label_comp_id")[:num_atoms]
+    names = _atom_site("label_atom_id")[:num_atoms]
+    fieldnames = _atom_site("group_PDB")[:num_atoms]
+    icodes = _atom_site("pdbx_PDB_ins_code")[:num_atoms]
+    icodes = np.where(np.isin(icodes, [".", "?"]), " ", icodes)
+    altlocs = _atom_site("label_alt_id")[:num_atoms]
+    altlocs = np.where(np.isin(altlocs, [".", "?"]), " ", altlocs)
+    hetflags = np.where(
+        fieldnames == "HETATM",
+        np.where(np.isin(resnames, ["HOH", "WAT"]), "W", "H"),
+        " ",
+    )
+
+    # Biopython starts a new residue whenever the chain, residue ID or 
+    # residue name changes
+    new_residue = _run_boundaries(
+        [chain_ids, hetflags, resseqs, icodes, resnames], start=True
+    )
+    residue_starts = np.flatnonzero(new_residue)
+    residue_ends = np.append(residue_starts[1:], num_atoms)
+
+    residue_keys = []
+    for start in residue_starts.tolist():
+        hetflag = hetflags[start]
+        if hetflag == "H":
+            hetflag = "H_" + resnames[start]
+        residue_keys.append(
+            (chain_ids[start], (hetflag, int(resseqs[start]), icodes[start]))
+        )
+
+    # Residues that occur more than once are point mutations or are
+    # discontinuous, which Biopython handles in special ways
+    if len(set(residue_keys)) != len(residue_keys):
+        raise _UnsupportedByFastParser("Duplicate residues")
+
+    # Resolve alternative locations. Like Biopython, keep the first 
+    # instance of each atom with the highest occupancy, in the position of 
+    # the atom's first appearance within the residue.
+    residue_idx = np.cumsum(new_residue) - 1
+    order = np.lexsort((names, residue_idx))
+    sorted_keys_equal = (
+        (residue_idx[order][1:] == residue_idx[order][:-1]) &
+        (names[order][1:] == names[order][:-1])
+    )
+    keep = np.ones(num_atoms, dtype=bool)
+    if sorted_keys_equal.any():
+        group_starts = np.flatnonzero(
+            np.concatenate([[True], ~sorted_keys_equal])
+        )
+        group_ends = np.append(group_starts[1:], num_atoms)
+        coords = coords.copy()
+        for start, end in zip(group_starts.tolist(), group_ends.tolist()):
+            if end - start == 1:
+                continue
+            idx = np.sort(order[start:end])
+            group_altlocs = altlocs[idx]
+            if (
+                (group_altlocs == " ").any() or 
+                len(set(group_altlocs.tolist())) != len(idx)
+            ):
+                raise _UnsupportedByFastParser("Duplicate atoms")
+            selected = idx[np.argmax(occupancies[idx])]
+            coords[idx[0]] = coords[selected]
+            keep[idx[1:]] = False
+
+    # Precompute atom37 indices, with selenium in place of the sulfur atom of
+    # selenomethionine
+    unique_names, name_inverse = np.unique(names, return_inverse=True)
+    atom_idx = np.array(
+        [residue_constants.atom_order.get(n, -1) for n in unique_names],
+        dtype=np.int64,
+    )[name_inverse] if num_atoms else np.zeros(0, dtype=np.int64)
+    is_mse_se = (np.char.upper(names) == "SE") & (resnames == "MSE")
+    atom_idx[is_mse_se] = residue_constants.atom_order["SD"]
+    keep &= atom_idx >= 0
+
+    chains = {}
+    for (chain_id, residue_id), start, end in zip(
+        residue_keys, residue_starts.tolist(), residue_ends.tolist()
+    ):
+        residue_keep = keep[start:end]
+        chains.setdefault(chain_id, {})[residue_id] = (
+            atom_idx[start:end][residue_keep],
+            coords[start:end][residue_keep],
+        )
+
+    return FastStructure(chains)
+
+
+def _parse_fast(*, file_id: str, mmcif_string: str) -> ParsingResult:
+    """Fast equivalent of parse. Raises an exception for any file that is 
+    either invalid or can't be parsed exactly like Biopython."""
+    parsed_info = _tokenize_mmcif(mmcif_string, _FAST_PARSER_CATEGORIES)
+    structure = _build_fast_structure(parsed_info)
+
+    header = _get_header(parsed_info)
+
+    valid_chains = _get_protein_chains(parsed_info=parsed_info)
+    if not valid_chains:
+        return ParsingResult(
+            None, {(file_id, ""): "No protein chains found in this file."}
+        )
+    seq_start_num = {
+        chain_id: min([monomer.num for monomer in seq])
+        for chain_id, seq in valid_chains.items()
+    }
+
+    def _atom_site(key):
+        return np.array(parsed_info["_atom_site." + key])
+
+    # We only process the first model at the moment.
+    in_model = _atom_site("pdbx_PDB_model_num") == "1"
+    mmcif_chain_ids = _atom_site("label_asym_id")[in_model]
+    author_chain_ids = _atom_site("auth_asym_id")[in_model]
+    mmcif_to_author_chain_id = dict(
+        zip(mmcif_chain_ids.tolist(), author_chain_ids.tolist())
+    )
+
+    # Consecutive atoms of the same residue have identical entries in the
+    # mapping, so only the last atom of each such run needs to be processed
+    in_valid_chain = np.isin(mmcif_chain_ids, list(valid_chains))
+    cols = [
+        _atom_site(k)[in_model][in_valid_chain] for k in [
+            "label_comp_id",
+            "auth_asym_id",
+            "label_asym_id",
+            "auth_seq_id",
+            "label_seq_id",
+            "pdbx_PDB_ins_code",
+            "group_PDB",
+        ]
+    ]
+    last_of_run = _run_boundaries(cols, start=False)
+
+    seq_to_structure_mappings = {}
+    for site in zip(*[col[last_of_run].tolist() for col in cols]):
+        _add_atom_to_mapping(
+            AtomSite(*site, model_num="1"),
+            seq_start_num,
+            seq_to_structure_mappings,
+        )
+
+    author_chain_to_sequence = _complete_mappings(
+        valid_chains, mmcif_to_author_chain_id, seq_to_structure_mappings
+    )
+
+    mmcif_object = MmcifObject(
+        file_id=file_id,
+        header=header,
+        structure=structure,
+        chain_to_seqres=author_chain_to_sequence,
+        seqres_to_structure=seq_to_structure_mappings,
+        raw_string=parsed_info,
+    )
+
+    return ParsingResult(mmcif_object=mmcif_object, errors={})
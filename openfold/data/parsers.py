@@ -20,6 +20,8 @@ import re
 import string
 from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
+import numpy as np
+
 
 DeletionMatrix = Sequence[Sequence[int]]
 
@@ -161,6 +163,131 @@ def parse_a3m(a3m_string: str) -> Tuple[Sequence[str], DeletionMatrix]:
     return aligned_sequences, deletion_matrix
 
 
+def _deletions_before_columns(
+    is_insertion: np.ndarray,
+    column_mask: np.ndarray,
+    num_seqs: int,
+) -> np.ndarray:
+    """Counts insertions preceding each aligned column of each sequence.
+
+    Args:
+        is_insertion: A flat boolean array marking inserted residues in the
+            concatenation of all sequences.
+        column_mask: A flat boolean array of the same shape marking the
+            aligned columns.
+        num_seqs: The number of concatenated sequences. Each must contain the
+            same number of aligned columns.
+
+    Returns:
+        A [num_seqs, num_aligned_columns] int32 deletion matrix.
+    """
+    insertion_count = np.cumsum(is_insertion, dtype=np.int64)
+    counts_at_columns = insertion_count[column_mask].reshape(num_seqs, -1)
+    num_cols = counts_at_columns.shape[-1]
+
+    # Number of insertions before the start of each sequence
+    seq_len = len(is_insertion) // num_seqs if num_seqs > 0 else 0
+    seq_starts = np.arange(num_seqs) * seq_len
+    counts_before_seqs = np.where(
+        seq_starts > 0, insertion_count[seq_starts - 1], 0
+    )
+
+    prev_counts = np.concatenate(
+        [counts_before_seqs[:, None], counts_at_columns[:, :num_cols - 1]],
+        axis=-1,
+    )
+    return (counts_at_columns - prev_counts).astype(np.int32)
+
+
+def parse_stockholm_np(
+    stockholm_string: str,
+) -> Tuple[np.ndarray, np.ndarray, Sequence[str]]:
+    """NumPy equivalent of parse_stockholm.
+
+    Returns:
+        A tuple of:
+            * A [num_seqs, num_res] uint8 array of the ASCII codes of the
+                aligned sequences. These might contain duplicates.
+            * The [num_seqs, num_res] int32 deletion matrix.
+            * The names of the targets matched, including the jackhmmer 
+                subsequence suffix.
+    """
+    name_to_sequence = collections.OrderedDict()
+    for line in stockholm_string.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", "//")):
+            continue
+        name, sequence = line.split()
+        if name not in name_to_sequence:
+            name_to_sequence[name] = ""
+        name_to_sequence[name] += sequence
+
+    names = list(name_to_sequence.keys())
+    sequences = list(name_to_sequence.values())
+    num_seqs = len(sequences)
+    if num_seqs == 0:
+        empty = np.zeros((0, 0), dtype=np.uint8)
+        return empty, empty.astype(np.int32), names
+
+    seq_len = len(sequences[0])
+    chars = np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)
+    if len(chars) != num_seqs * seq_len:
+        raise ValueError("Stockholm sequences must all have the same length")
+    chars = chars.reshape(num_seqs, seq_len)
+
+    # Columns with gaps in the query are removed from all sequences, and
+    # residues in those columns count as deletions
+    keep_columns = chars[0] != ord("-")
+    column_mask = np.broadcast_to(keep_columns, chars.shape)
+    is_insertion = np.logical_and(~column_mask, chars != ord("-"))
+
+    msa = chars[:, keep_columns]
+    deletion_matrix = _deletions_before_columns(
+        is_insertion.reshape(-1), column_mask.reshape(-1), num_seqs
+    )
+
+    return msa, deletion_matrix, names
+
+
+def parse_a3m_np(a3m_string: str) -> Tuple[np.ndarray, np.ndarray]:
+    """NumPy equivalent of parse_a3m.
+
+    Returns:
+        A tuple of:
+            * A [num_seqs, num_res] uint8 array of the ASCII codes of the
+                aligned (deletion-free) sequences. These might contain 
+                duplicates.
+            * The [num_seqs, num_res] int32 deletion matrix.
+    """
+    sequences, _ = parse_fasta(a3m_string)
+    num_seqs = len(sequences)
+    if num_seqs == 0:
+        empty = np.zeros((0, 0), dtype=np.uint8)
+        return empty, empty.astype(np.int32)
+
+    # Because of insertions, A3M sequences have different lengths. Pad them 
+    # at the end with lowercase characters, which are dropped as insertions.
+    seq_lens = np.array([len(s) for s in sequences], dtype=np.int64)
+    max_len = int(seq_lens.max())
+    chars = np.full((num_seqs, max_len), ord("a"), dtype=np.uint8)
+    chars[np.arange(max_len)[None] < seq_lens[:, None]] = np.frombuffer(
+        "".join(sequences).encode("ascii"), dtype=np.uint8
+    )
+
+    is_insertion = np.logical_and(chars >= ord("a"), chars <= ord("z"))
+    column_mask = ~is_insertion
+    num_cols = np.sum(column_mask, axis=-1)
+    if np.any(num_cols != num_cols[0]):
+        raise ValueError("A3M sequences must all have the same aligned length")
+
+    msa = chars[column_mask].reshape(num_seqs, -1)
+    deletion_matrix = _deletions_before_columns(
+        is_insertion.reshape(-1), column_mask.reshape(-1), num_seqs
+    )
+
+    return msa, deletion_matrix
+
+
 def _convert_sto_seq_to_a3m(
     query_non_gaps: Sequence[bool], sto_seq: str
 ) -> Iterable[str]:
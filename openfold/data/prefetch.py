@@ -0,0 +1,148 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Asynchronous host-to-device transfer of batches.
+
+    A background thread copies each batch into reusable pinned staging
+    buffers and launches non-blocking copies to the GPU on a side stream,
+    while the model works on the previous batch. Batches are yielded once
+    they are safe to use on the current stream.
+"""
+
+import queue
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import torch
+
+
+class _Done:
+    pass
+
+
+class DevicePrefetcher:
+    def __init__(self,
+        batches: Iterable[Dict[str, Any]],
+        device: Optional[torch.device] = None,
+        num_buffers: int = 2,
+    ):
+        """
+            Args:
+                batches:
+                    Iterable of (flat) dictionaries of CPU tensors. Values
+                    that aren't tensors are passed through as is
+                device:
+                    The target CUDA device. Defaults to the current device
+                num_buffers:
+                    Number of sets of pinned staging buffers, i.e. the
+                    maximum number of copies in flight
+        """
+        if(device is None):
+            device = torch.device("cuda", torch.cuda.current_device())
+
+        self.batches = batches
+        self.device = torch.device(device)
+        self.num_buffers = num_buffers
+
+        # Each set maps feature names to flat, pinned byte buffers, grown as
+        # needed
+        self._buffers = [{} for _ in range(num_buffers)]
+        self._events = [None for _ in range(num_buffers)]
+
+    def _stage(self, key: str, t: torch.Tensor, buffers: Dict) -> torch.Tensor:
+        nbytes = t.numel() * t.element_size()
+        buf = buffers.get(key, None)
+        if(buf is None or buf.numel() < nbytes):
+            buf = torch.empty(nbytes, dtype=torch.uint8, pin_memory=True)
+            buffers[key] = buf
+
+        # Also makes t contiguous, e.g. after truncation of the recycling
+        # dimension
+        staged = buf[:nbytes].view(t.dtype).view(t.shape)
+        staged.copy_(t)
+
+        return staged.to(self.device, non_blocking=True)
+
+    def _load(self, batch, i, stream):
+        slot = i % self.num_buffers
+        buffers = self._buffers[slot]
+
+        # Wait for the last copy out of these buffers to finish
+        if(self._events[slot] is not None):
+            self._events[slot].synchronize()
+
+        with torch.cuda.stream(stream):
+            out = {
+                k: self._stage(k, v, buffers)
+                if isinstance(v, torch.Tensor) else v
+                for k, v in batch.items()
+            }
+            event = torch.cuda.Event()
+            event.record(stream)
+
+        self._events[slot] = event
+
+        return out, event
+
+    def _worker(self, q, stop):
+        def put(item):
+            while(not stop.is_set()):
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            with torch.cuda.device(self.device):
+                stream = torch.cuda.Stream(self.device)
+                for i, batch in enumerate(self.batches):
+                    if(not put(self._load(batch, i, stream))):
+                        return
+        except Exception as e:
+            put(e)
+            return
+
+        put(_Done())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        q = queue.Queue(maxsize=max(self.num_buffers - 1, 1))
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._worker, args=(q, stop), daemon=True
+        )
+        thread.start()
+
+        try:
+            while True:
+                item = q.get()
+                if(isinstance(item, _Done)):
+                    break
+                elif(isinstance(item, Exception)):
+                    raise item
+
+                batch, event = item
+                current_stream = torch.cuda.current_stream(self.device)
+                current_stream.wait_event(event)
+                for v in batch.values():
+                    if(isinstance(v, torch.Tensor)):
+                        # The tensors were allocated on the side stream
+                        v.record_stream(current_stream)
+
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
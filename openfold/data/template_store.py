@@ -0,0 +1,325 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    A binary, memory-mapped store of pre-parsed template structures.
+
+    For each mmCIF file in the template directory, the store holds the
+    release date and, for each chain, the SEQRES sequence and the uncentered
+    atom37 positions and mask that mmcif_parsing.get_atom_coords would
+    compute. TemplateHitFeaturizer can read templates from the store instead
+    of parsing the same mmCIF files over and over again. Stores are generated
+    with scripts/generate_template_store.py.
+"""
+
+import collections
+import json
+import os
+import threading
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from openfold.data import mmcif_parsing
+from openfold.data.errors import MultipleChainsError
+from openfold.np import residue_constants
+
+
+_ALIGNMENT = 8
+_STORE_VERSION = 1
+
+# Errors raised by get_atom_coords at build time are stored and re-raised
+# when the chain is read, so that the store behaves exactly like the mmCIF
+# files it was built from
+_STORED_ERRORS = {
+    "MultipleChainsError": MultipleChainsError,
+    "KeyError": KeyError,
+}
+
+
+def extract_template_chains(
+    mmcif_object: mmcif_parsing.MmcifObject,
+) -> Dict[str, Dict[str, Any]]:
+    """
+        Computes the per-chain data stored for a parsed mmCIF file.
+
+        Args:
+            mmcif_object:
+                A parsed mmCIF file
+        Returns:
+            A dictionary mapping chain IDs to dictionaries with keys "seqres",
+            "positions" ([N_res, 37, 3] float32), "mask" ([N_res, 37]) and
+            "error", which is None unless atom coordinates couldn't be
+            extracted, in which case positions and mask are None.
+    """
+    chains = {}
+    for chain_id, seqres in mmcif_object.chain_to_seqres.items():
+        positions, mask, error = None, None, None
+        try:
+            positions, mask = mmcif_parsing.get_atom_coords(
+                mmcif_object=mmcif_object,
+                chain_id=chain_id,
+                _zero_center_positions=False,
+            )
+        except tuple(_STORED_ERRORS.values()) as e:
+            error = (type(e).__name__, str(e))
+
+        chains[chain_id] = {
+            "seqres": seqres,
+            "positions": positions,
+            "mask": mask,
+            "error": error,
+        }
+
+    return chains
+
+
+class TemplateStoreWriter:
+    def __init__(self, db_path: str, index_path: str):
+        """
+            Args:
+                db_path:
+                    Path of the data file to be written
+                index_path:
+                    Path of the JSON index to be written. The data file is
+                    located relative to the index, so the two should be kept
+                    in the same directory.
+        """
+        self.db_path = db_path
+        self.index_path = index_path
+        self._fp = open(db_path, "wb")
+        self._offset = 0
+        self._entries = {}
+
+    def _write(self, buf: bytes) -> int:
+        pad = (-self._offset) % _ALIGNMENT
+        if(pad):
+            self._fp.write(b"\0" * pad)
+            self._offset += pad
+
+        offset = self._offset
+        self._fp.write(buf)
+        self._offset += len(buf)
+        return offset
+
+    def add_entry(self,
+        file_id: str,
+        release_date: str,
+        chains: Mapping[str, Mapping[str, Any]],
+    ):
+        """
+            Args:
+                file_id:
+                    Name of the mmCIF file, without its extension
+                release_date:
+                    Release date of the structure, as in the mmCIF header
+                chains:
+                    The output of extract_template_chains
+        """
+        if(file_id in self._entries):
+            raise ValueError(f"Duplicate entry {file_id}")
+
+        chain_entries = {}
+        for chain_id, chain in chains.items():
+            chain_entry = {
+                "seqres": chain["seqres"],
+                "error": chain["error"],
+            }
+            if(chain["error"] is None):
+                positions = np.asarray(chain["positions"], dtype=np.float32)
+                mask = np.asarray(chain["mask"]).astype(np.bool_)
+                chain_entry["positions_offset"] = self._write(
+                    positions.tobytes()
+                )
+                chain_entry["mask_offset"] = self._write(mask.tobytes())
+
+            chain_entries[chain_id] = chain_entry
+
+        self._entries[file_id] = {
+            "release_date": release_date,
+            "chains": chain_entries,
+        }
+
+    def close(self):
+        self._fp.close()
+        index = {
+            "version": _STORE_VERSION,
+            "db": os.path.relpath(
+                self.db_path, os.path.dirname(os.path.abspath(self.index_path))
+            ),
+            "entries": self._entries,
+        }
+        with open(self.index_path, "w") as fp:
+            json.dump(index, fp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TemplateStoreEntry:
+    """
+        A pre-parsed template structure. Implements the subset of the
+        MmcifObject interface used by the template featurizer.
+    """
+    def __init__(self,
+        store: "TemplateStore",
+        file_id: str,
+        entry: Mapping[str, Any],
+    ):
+        self.store = store
+        self.file_id = file_id
+        self.header = {"release_date": entry["release_date"]}
+        self.chain_to_seqres = {
+            k: v["seqres"] for k, v in entry["chains"].items()
+        }
+        self._chains = entry["chains"]
+
+    def get_atom_coords(self,
+        chain_id: str,
+        _zero_center_positions: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Equivalent to mmcif_parsing.get_atom_coords"""
+        chain = self._chains[chain_id]
+        if(chain["error"] is not None):
+            error_type, msg = chain["error"]
+            raise _STORED_ERRORS[error_type](msg)
+
+        all_atom_positions, all_atom_mask = self.store._get_chain(
+            self.file_id, chain_id, chain
+        )
+
+        # Cached arrays must not be modified
+        all_atom_positions = all_atom_positions.copy()
+        all_atom_mask = all_atom_mask.astype(np.float32)
+
+        if _zero_center_positions:
+            binary_mask = all_atom_mask.astype(bool)
+            translation_vec = all_atom_positions[binary_mask].mean(axis=0)
+            all_atom_positions[binary_mask] -= translation_vec
+
+        return all_atom_positions, all_atom_mask
+
+
+class TemplateStore:
+    """
+        Read-only view of a store produced by
+        scripts/generate_template_store.py. store[file_id] returns a
+        TemplateStoreEntry that can stand in for a parsed mmCIF file.
+
+        Decoded chains are kept in a small, thread-safe LRU cache. The data
+        file is only memory-mapped on first access, so stores can be passed
+        to DataLoader workers cheaply.
+    """
+    def __init__(self, index_path: str, cache_size: int = 256):
+        """
+            Args:
+                index_path:
+                    Path to the .json index of the store
+                cache_size:
+                    Number of decoded chains to keep in memory
+        """
+        with open(index_path, "r") as fp:
+            index = json.load(fp)
+
+        if(index.get("version", None) != _STORE_VERSION):
+            raise ValueError(
+                f"Unsupported template store version in {index_path}"
+            )
+
+        self.index_path = index_path
+        self.db_path = os.path.join(
+            os.path.dirname(os.path.abspath(index_path)), index["db"]
+        )
+        self.cache_size = cache_size
+        self._entries = index["entries"]
+        self._buf = None
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_buffer(self) -> np.ndarray:
+        if(self._buf is None):
+            # Empty files can't be memory-mapped
+            if(os.path.getsize(self.db_path) == 0):
+                self._buf = np.zeros((0,), dtype=np.uint8)
+            else:
+                self._buf = np.memmap(self.db_path, dtype=np.uint8, mode="r")
+        return self._buf
+
+    def _get_chain(self,
+        file_id: str,
+        chain_id: str,
+        chain: Mapping[str, Any],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        key = (file_id, chain_id)
+        with self._lock:
+            if(key in self._cache):
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+            buf = self._get_buffer()
+
+        num_res = len(chain["seqres"])
+        atom_type_num = residue_constants.atom_type_num
+        positions = np.frombuffer(
+            buf,
+            dtype=np.float32,
+            count=num_res * atom_type_num * 3,
+            offset=chain["positions_offset"],
+        ).reshape(num_res, atom_type_num, 3).copy()
+        mask = np.frombuffer(
+            buf,
+            dtype=np.bool_,
+            count=num_res * atom_type_num,
+            offset=chain["mask_offset"],
+        ).reshape(num_res, atom_type_num).copy()
+
+        with self._lock:
+            self._cache[key] = (positions, mask)
+            while(len(self._cache) > self.cache_size):
+                self._cache.popitem(last=False)
+
+        return positions, mask
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_buf"] = None
+        state["_cache"] = collections.OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def keys(self):
+        return self._entries.keys()
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, file_id: str) -> TemplateStoreEntry:
+        return TemplateStoreEntry(self, file_id, self._entries[file_id])
+
+    def get(
+        self, file_id: str, default: Optional[Any] = None
+    ) -> Optional[TemplateStoreEntry]:
+        if(file_id not in self._entries):
+            return default
+        return self[file_id]
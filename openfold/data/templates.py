@@ -14,8 +14,11 @@
 # limitations under the License.
 
 """Functions for getting templates and calculating template features."""
+from concurrent.futures import ThreadPoolExecutor
+import collections
 import dataclasses
 import datetime
+import functools
 import glob
 import json
 import logging
@@ -25,7 +28,7 @@ from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
 
 import numpy as np
 
-from openfold.data import parsers, mmcif_parsing
+from openfold.data import parsers, mmcif_parsing, template_store
 from openfold.data.errors import Error
 from openfold.data.tools import kalign
 from openfold.data.tools.utils import to_date
@@ -506,11 +509,17 @@ def _get_atom_positions(
     _zero_center_positions: bool = True,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """Gets atom positions and mask from a list of Biopython Residues."""
-    coords_with_mask = mmcif_parsing.get_atom_coords(
-        mmcif_object=mmcif_object, 
-        chain_id=auth_chain_id,
-        _zero_center_positions=_zero_center_positions,
-    )
+    if isinstance(mmcif_object, template_store.TemplateStoreEntry):
+        coords_with_mask = mmcif_object.get_atom_coords(
+            chain_id=auth_chain_id,
+            _zero_center_positions=_zero_center_positions,
+        )
+    else:
+        coords_with_mask = mmcif_parsing.get_atom_coords(
+            mmcif_object=mmcif_object, 
+            chain_id=auth_chain_id,
+            _zero_center_positions=_zero_center_positions,
+        )
     all_atom_positions, all_atom_mask = coords_with_mask
     _check_residue_distances(
         all_atom_positions, all_atom_mask, max_ca_ca_distance
@@ -803,6 +812,7 @@ def _process_single_hit(
     kalign_binary_path: str,
     strict_error_check: bool = False,
     _zero_center_positions: bool = True,
+    _template_store: Optional[template_store.TemplateStore] = None,
 ) -> SingleHitResult:
     """Tries to extract template features from a single HHSearch hit."""
     # Fail hard if we can't get the PDB ID and chain name from the hit.
@@ -824,24 +834,31 @@ def _process_single_hit(
     # remove gaps (which regardless have a missing confidence score).
     template_sequence = hit.hit_sequence.replace("-", "")
 
-    cif_path = os.path.join(mmcif_dir, hit_pdb_code + ".cif")
-    logging.info(
-        "Reading PDB entry from %s. Query: %s, template: %s",
-        cif_path,
-        query_sequence,
-        template_sequence,
-    )
-    # Fail if we can't find the mmCIF file.
-    with open(cif_path, "r") as cif_file:
-        cif_string = cif_file.read()
+    if _template_store is not None and hit_pdb_code in _template_store:
+        # Pre-parsed structures only exist for successfully parsed files
+        mmcif_object = _template_store[hit_pdb_code]
+        parsing_errors = {}
+    else:
+        cif_path = os.path.join(mmcif_dir, hit_pdb_code + ".cif")
+        logging.info(
+            "Reading PDB entry from %s. Query: %s, template: %s",
+            cif_path,
+            query_sequence,
+            template_sequence,
+        )
+        # Fail if we can't find the mmCIF file.
+        with open(cif_path, "r") as cif_file:
+            cif_string = cif_file.read()
 
-    parsing_result = mmcif_parsing.parse(
-        file_id=hit_pdb_code, mmcif_string=cif_string
-    )
+        parsing_result = mmcif_parsing.parse(
+            file_id=hit_pdb_code, mmcif_string=cif_string
+        )
+        mmcif_object = parsing_result.mmcif_object
+        parsing_errors = parsing_result.errors
 
-    if parsing_result.mmcif_object is not None:
+    if mmcif_object is not None:
         hit_release_date = datetime.datetime.strptime(
-            parsing_result.mmcif_object.header["release_date"], "%Y-%m-%d"
+            mmcif_object.header["release_date"], "%Y-%m-%d"
         )
         if hit_release_date > max_template_date:
             error = "Template %s date (%s) > max template date (%s)." % (
@@ -857,7 +874,7 @@ def _process_single_hit(
 
     try:
         features, realign_warning = _extract_template_features(
-            mmcif_object=parsing_result.mmcif_object,
+            mmcif_object=mmcif_object,
             pdb_id=hit_pdb_code,
             mapping=mapping,
             template_sequence=template_sequence,
@@ -890,7 +907,7 @@ def _process_single_hit(
                 hit.sum_probs,
                 hit.index,
                 str(e),
-                parsing_result.errors,
+                parsing_errors,
             )
         )
         if strict_error_check:
@@ -907,7 +924,7 @@ def _process_single_hit(
                 hit.sum_probs,
                 hit.index,
                 str(e),
-                parsing_result.errors,
+                parsing_errors,
             )
         )
         return SingleHitResult(features=None, error=error, warning=None)
@@ -933,6 +950,8 @@ class TemplateHitFeaturizer:
         strict_error_check: bool = False,
         _shuffle_top_k_prefiltered: Optional[int] = None,
         _zero_center_positions: bool = True,
+        num_workers: int = 1,
+        template_store_path: Optional[str] = None,
     ):
         """Initializes the Template Search.
 
@@ -956,6 +975,14 @@ class TemplateHitFeaturizer:
                 * If any template has identical PDB ID to the query.
                 * If any template is a duplicate of the query.
                 * Any feature computation errors.
+            num_workers: The number of hits that are processed concurrently.
+                Hits are processed speculatively, in order, by a pool of
+                threads, which mostly overlaps file I/O and kalign calls.
+                The result is identical to that of serial processing.
+            template_store_path: An optional path to the index of a template
+                store generated by scripts/generate_template_store.py. Templates
+                in the store are read from it instead of being parsed from
+                mmcif_dir.
         """
         self._mmcif_dir = mmcif_dir
         if not glob.glob(os.path.join(self._mmcif_dir, "*.cif")):
@@ -993,6 +1020,49 @@ class TemplateHitFeaturizer:
         self._shuffle_top_k_prefiltered = _shuffle_top_k_prefiltered
         self._zero_center_positions = _zero_center_positions
 
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        self._num_workers = num_workers
+
+        if template_store_path:
+            logging.info("Using template store %s.", template_store_path)
+            self._template_store = template_store.TemplateStore(
+                template_store_path
+            )
+        else:
+            self._template_store = None
+
+    def _process_hits_in_order(self, hits, process_fn):
+        """
+        Yields (hit, result) for each hit in order, processing up to
+        self._num_workers hits ahead of the consumer. Stopping the generator
+        cancels any hits that haven't been started yet.
+        """
+        if self._num_workers == 1:
+            for hit in hits:
+                yield hit, process_fn(hit)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self._num_workers)
+        pending = collections.deque()
+        try:
+            for hit in hits:
+                pending.append((hit, executor.submit(process_fn, hit)))
+                if len(pending) < self._num_workers:
+                    continue
+                hit, future = pending.popleft()
+                yield hit, future.result()
+
+            while pending:
+                hit, future = pending.popleft()
+                yield hit, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            # Hits that are already being processed are allowed to finish in
+            # the background
+            executor.shutdown(wait=False)
+
     def get_templates(
         self,
         query_sequence: str,
@@ -1050,26 +1120,28 @@ class TemplateHitFeaturizer:
             stk = self._shuffle_top_k_prefiltered
             idx[:stk] = np.random.permutation(idx[:stk])
 
-        for i in idx:
-            # We got all the templates we wanted, stop processing hits.
-            if num_hits >= self.max_hits:
-                break
+        process_fn = functools.partial(
+            _process_single_hit,
+            query_sequence=query_sequence,
+            query_pdb_code=query_pdb_code,
+            mmcif_dir=self._mmcif_dir,
+            max_template_date=template_cutoff_date,
+            release_dates=self._release_dates,
+            obsolete_pdbs=self._obsolete_pdbs,
+            strict_error_check=self._strict_error_check,
+            kalign_binary_path=self._kalign_binary_path,
+            _zero_center_positions=self._zero_center_positions,
+            _template_store=self._template_store,
+        )
 
-            hit = filtered[i]
-
-            result = _process_single_hit(
-                query_sequence=query_sequence,
-                query_pdb_code=query_pdb_code,
-                hit=hit,
-                mmcif_dir=self._mmcif_dir,
-                max_template_date=template_cutoff_date,
-                release_dates=self._release_dates,
-                obsolete_pdbs=self._obsolete_pdbs,
-                strict_error_check=self._strict_error_check,
-                kalign_binary_path=self._kalign_binary_path,
-                _zero_center_positions=self._zero_center_positions,
-            )
+        ordered_hits = [filtered[i] for i in idx]
+        if self.max_hits <= 0:
+            ordered_hits = []
 
+        results = self._process_hits_in_order(
+            ordered_hits, lambda hit: process_fn(hit=hit)
+        )
+        for hit, result in results:
             if result.error:
                 errors.append(result.error)
 
@@ -1091,6 +1163,13 @@ class TemplateHitFeaturizer:
                 for k in template_features:
                     template_features[k].append(result.features[k])
 
+            # We got all the templates we wanted, stop processing hits.
+            if num_hits >= self.max_hits:
+                break
+
+        # Cancels any hits still queued
+        results.close()
+
         for name in template_features:
             if num_hits > 0:
                 template_features[name] = np.stack(
@@ -201,13 +201,77 @@ class RecyclingEmbedder(nn.Module):
             z.copy_(z_update)
             z_update = z
 
+        # [*, N, N, C_z]
+        d = self._embed_distances(x, x)
+        z_update = add(z_update, d, _inplace)
+
+        return m_update, z_update
+
+    def forward_chunked(
+        self,
+        m: torch.Tensor,
+        z: torch.Tensor,
+        z_prev: torch.Tensor,
+        x: torch.Tensor,
+        chunk_size: int,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Inference-time variant of forward for a previous pair embedding 
+        that doesn't fit on the device (e.g. one offloaded to host memory). 
+        z_prev is streamed to the device and embedded chunk_size rows at a 
+        time, and the embedding is added to z in place.
+
+        Args:
+            m:
+                First row of the MSA embedding. [*, N_res, C_m]
+            z:
+                [*, N_res, N_res, C_z] pair embedding to update
+            z_prev:
+                [*, N_res, N_res, C_z] previous pair embedding
+            x:
+                [*, N_res, 3] predicted C_beta coordinates
+            chunk_size:
+                Number of rows of z_prev embedded at a time
+        Returns:
+            m:
+                [*, N_res, C_m] MSA embedding update
+            z:
+                [*, N_res, N_res, C_z] updated pair embedding
+        """
+        # [*, N, C_m]
+        m_update = self.layer_norm_m(m)
+
+        for i in range(0, z.shape[-3], chunk_size):
+            z_prev_chunk = z_prev[..., i: i + chunk_size, :, :].to(
+                device=z.device, dtype=z.dtype, non_blocking=True,
+            )
+            z_update = self.layer_norm_z(z_prev_chunk)
+            del z_prev_chunk
+
+            d = self._embed_distances(x[..., i: i + chunk_size, :], x)
+            z_update = add(z_update, d, True)
+            del d
+
+            z[..., i: i + chunk_size, :, :] += z_update
+
+        return m_update, z
+
+    def _embed_distances(
+        self, 
+        x_i: torch.Tensor, 
+        x_j: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Embeds the binned distances between two sets of C_beta coordinates 
+        ([*, I, 3] and [*, J, 3]) as a [*, I, J, C_z] pair embedding update.
+        """
         # This squared method might become problematic in FP16 mode.
         bins = torch.linspace(
             self.min_bin,
             self.max_bin,
             self.no_bins,
-            dtype=x.dtype,
-            device=x.device,
+            dtype=x_i.dtype,
+            device=x_i.device,
             requires_grad=False,
         )
         squared_bins = bins ** 2
@@ -215,17 +279,16 @@ class RecyclingEmbedder(nn.Module):
             [squared_bins[1:], squared_bins.new_tensor([self.inf])], dim=-1
         )
         d = torch.sum(
-            (x[..., None, :] - x[..., None, :, :]) ** 2, dim=-1, keepdims=True
+            (x_i[..., None, :] - x_j[..., None, :, :]) ** 2, 
+            dim=-1, 
+            keepdims=True
         )
 
-        # [*, N, N, no_bins]
-        d = ((d > squared_bins) * (d < upper)).type(x.dtype)
+        # [*, I, J, no_bins]
+        d = ((d > squared_bins) * (d < upper)).type(x_i.dtype)
 
-        # [*, N, N, C_z]
-        d = self.linear(d)
-        z_update = add(z_update, d, _inplace)
-
-        return m_update, z_update
+        # [*, I, J, C_z]
+        return self.linear(d)
 
 
 class TemplateAngleEmbedder(nn.Module):
@@ -16,7 +16,7 @@
 import math
 import torch
 import torch.nn as nn
-from typing import Tuple, Optional
+from typing import Callable, Dict, List, Mapping, Sequence, Tuple, Optional
 from functools import partial
 
 from openfold.model.primitives import Linear, LayerNorm
@@ -36,7 +36,18 @@ from openfold.model.triangular_multiplicative_update import (
     TriangleMultiplicationOutgoing,
     TriangleMultiplicationIncoming,
 )
-from openfold.utils.checkpointing import checkpoint_blocks, get_checkpoint_fn
+from openfold.utils.checkpointing import (
+    checkpoint_blocks,
+    checkpoint_sub_blocks,
+    get_checkpoint_fn,
+    offload_saved_tensors,
+)
+from openfold.utils.chunk_planner import (
+    ChunkSizePlanner,
+    CHUNKED_MODULES,
+    get_module_chunk_size,
+    resolve_chunk_sizes,
+)
 from openfold.utils.tensor_utils import add, chunk_layer, ChunkSizeTuner
 
 
@@ -186,15 +197,12 @@ class EvoformerBlockCore(nn.Module):
         use_lma: bool = False,
         _mask_trans: bool = True,
         _attn_chunk_size: Optional[int] = None,
+        chunk_sizes: Optional[Dict[str, int]] = None,
     ) -> Tuple[torch.Tensor, torch.Tensor]: 
         # DeepMind doesn't mask these transitions in the source, so _mask_trans
         # should be disabled to better approximate the exact activations of
         # the original.
         msa_trans_mask = msa_mask if _mask_trans else None
-        pair_trans_mask = pair_mask if _mask_trans else None
-        
-        if(_attn_chunk_size is None):
-            _attn_chunk_size = chunk_size
 
         # Need to dodge activation checkpoints
         inplace_safe = not (self.training or torch.is_grad_enabled())
@@ -202,22 +210,71 @@ class EvoformerBlockCore(nn.Module):
         m = add(
             m,
             self.msa_transition(
-                m, mask=msa_trans_mask, chunk_size=chunk_size,
+                m, 
+                mask=msa_trans_mask, 
+                chunk_size=get_module_chunk_size(
+                    chunk_sizes, "msa_transition", chunk_size
+                ),
             ),
             inplace=inplace_safe,
         )
         z = add(z, 
             self.outer_product_mean(
-                m, mask=msa_mask, chunk_size=chunk_size, _inplace=inplace_safe
+                m, 
+                mask=msa_mask, 
+                chunk_size=get_module_chunk_size(
+                    chunk_sizes, "outer_product_mean", chunk_size
+                ),
+                _inplace=inplace_safe,
             ),
             inplace=inplace_safe,
         )
 
+        z = self._pair_updates(
+            z,
+            pair_mask=pair_mask,
+            chunk_size=chunk_size,
+            use_lma=use_lma,
+            _mask_trans=_mask_trans,
+            _attn_chunk_size=_attn_chunk_size,
+            chunk_sizes=chunk_sizes,
+        )
+
+        return m, z
+
+    def _pair_updates(
+        self,
+        z: torch.Tensor,
+        pair_mask: torch.Tensor,
+        chunk_size: Optional[int] = None,
+        use_lma: bool = False,
+        _mask_trans: bool = True,
+        _attn_chunk_size: Optional[int] = None,
+        chunk_sizes: Optional[Dict[str, int]] = None,
+    ) -> torch.Tensor:
+        """
+            Applies the triangular updates and the pair transition to z
+        """
+        pair_trans_mask = pair_mask if _mask_trans else None
+
+        if(_attn_chunk_size is None):
+            _attn_chunk_size = chunk_size
+
+        tri_mul_chunk_size = get_module_chunk_size(
+            chunk_sizes, "tri_mul", 256
+        )
+        tri_att_chunk_size = get_module_chunk_size(
+            chunk_sizes, "tri_att", _attn_chunk_size
+        )
+
+        inplace_safe = not (self.training or torch.is_grad_enabled())
+
         tmu_update = self.tri_mul_out(
             z,
             mask=pair_mask,
             _inplace=inplace_safe,
             _add_with_inplace=True,
+            _inplace_chunk_size=tri_mul_chunk_size,
         )
         if(not inplace_safe):
             z = z + self.ps_dropout_row_layer(tmu_update)
@@ -231,6 +288,7 @@ class EvoformerBlockCore(nn.Module):
             mask=pair_mask,
             _inplace=inplace_safe,
             _add_with_inplace=True,
+            _inplace_chunk_size=tri_mul_chunk_size,
         )
         if(not inplace_safe):
             z = z + self.ps_dropout_row_layer(tmu_update)
@@ -244,7 +302,7 @@ class EvoformerBlockCore(nn.Module):
                 self.tri_att_start(
                     z, 
                     mask=pair_mask, 
-                    chunk_size=_attn_chunk_size, 
+                    chunk_size=tri_att_chunk_size, 
                     use_lma=use_lma
                 )
             ),
@@ -255,7 +313,7 @@ class EvoformerBlockCore(nn.Module):
                 self.tri_att_end(
                     z, 
                     mask=pair_mask, 
-                    chunk_size=_attn_chunk_size,
+                    chunk_size=tri_att_chunk_size,
                     use_lma=use_lma,
                 )
             ),
@@ -263,12 +321,16 @@ class EvoformerBlockCore(nn.Module):
         )
         z = add(z,
             self.pair_transition(
-                z, mask=pair_trans_mask, chunk_size=chunk_size,
+                z, 
+                mask=pair_trans_mask, 
+                chunk_size=get_module_chunk_size(
+                    chunk_sizes, "pair_transition", chunk_size
+                ),
             ),
             inplace=inplace_safe,
         )
 
-        return m, z
+        return z
 
 
 class EvoformerBlock(nn.Module):
@@ -329,6 +391,7 @@ class EvoformerBlock(nn.Module):
         use_lma: bool = False,
         _mask_trans: bool = True,
         _attn_chunk_size: Optional[int] = None,
+        chunk_sizes: Optional[Dict[str, int]] = None,
     ) -> Tuple[torch.Tensor, torch.Tensor]:
         inplace_safe = not (self.training or torch.is_grad_enabled())
         
@@ -341,7 +404,9 @@ class EvoformerBlock(nn.Module):
                     m, 
                     z=z, 
                     mask=msa_mask, 
-                    chunk_size=_attn_chunk_size,
+                    chunk_size=get_module_chunk_size(
+                        chunk_sizes, "msa_att_row", _attn_chunk_size
+                    ),
                     use_lma=use_lma,
                 )
             ),
@@ -351,7 +416,9 @@ class EvoformerBlock(nn.Module):
             self.msa_att_col(
                 m, 
                 mask=msa_mask, 
-                chunk_size=chunk_size,
+                chunk_size=get_module_chunk_size(
+                    chunk_sizes, "msa_att_col", chunk_size
+                ),
                 use_lma=use_lma,
             ),
             inplace=inplace_safe,
@@ -365,6 +432,7 @@ class EvoformerBlock(nn.Module):
             use_lma=use_lma,
             _mask_trans=_mask_trans,
             _attn_chunk_size=_attn_chunk_size,
+            chunk_sizes=chunk_sizes,
         )
 
         return m, z
@@ -439,6 +507,7 @@ class ExtraMSABlock(nn.Module):
         _chunk_logits: Optional[int] = 1024,
         _mask_trans: bool = True,
         _attn_chunk_size: Optional[int] = None,
+        chunk_sizes: Optional[Dict[str, int]] = None,
     ) -> Tuple[torch.Tensor, torch.Tensor]: 
         if(_attn_chunk_size is None):
             _attn_chunk_size = chunk_size
@@ -450,7 +519,9 @@ class ExtraMSABlock(nn.Module):
                     m.clone() if torch.is_grad_enabled() else m, 
                     z=z.clone() if torch.is_grad_enabled() else z, 
                     mask=msa_mask, 
-                    chunk_size=_attn_chunk_size,
+                    chunk_size=get_module_chunk_size(
+                        chunk_sizes, "msa_att_row", _attn_chunk_size
+                    ),
                     use_lma=use_lma,
                     use_memory_efficient_kernel=not _chunk_logits and not use_lma,
                     _chunk_logits=
@@ -467,7 +538,9 @@ class ExtraMSABlock(nn.Module):
                 self.msa_att_col(
                     m, 
                     mask=msa_mask, 
-                    chunk_size=chunk_size,
+                    chunk_size=get_module_chunk_size(
+                        chunk_sizes, "msa_att_col", chunk_size
+                    ),
                     use_lma=use_lma,
                 ),
                 inplace=not (self.training or torch.is_grad_enabled()),
@@ -480,7 +553,8 @@ class ExtraMSABlock(nn.Module):
                 chunk_size=chunk_size,
                 use_lma=use_lma,
                 _mask_trans=_mask_trans,
-                _attn_chunk_size=_attn_chunk_size
+                _attn_chunk_size=_attn_chunk_size,
+                chunk_sizes=chunk_sizes,
             )
             
             return m, z
@@ -494,6 +568,145 @@ class ExtraMSABlock(nn.Module):
         return m, z
 
 
+def _get_representative_fns(
+    block: nn.Module,
+    m: torch.Tensor,
+    z: torch.Tensor,
+    msa_mask: torch.Tensor,
+    pair_mask: torch.Tensor,
+    use_lma: bool,
+    _mask_trans: bool,
+) -> Dict[str, Tuple[Callable, Tuple[torch.Tensor, ...]]]:
+    """
+        Returns functions running the individual chunked modules of an
+        Evoformer or extra MSA block, used to tune their chunk sizes
+        independently. The triangular multiplicative updates operate in
+        place and aren't tuned.
+    """
+    core = block.core
+    msa_trans_mask = msa_mask if _mask_trans else None
+    pair_trans_mask = pair_mask if _mask_trans else None
+
+    msa_att_row_kwargs = {}
+    if(isinstance(block, ExtraMSABlock)):
+        msa_att_row_kwargs["use_memory_efficient_kernel"] = not use_lma
+
+    return {
+        "msa_att_row": (
+            partial(
+                block.msa_att_row, 
+                mask=msa_mask, 
+                use_lma=use_lma, 
+                **msa_att_row_kwargs,
+            ),
+            (m, z),
+        ),
+        "msa_att_col": (
+            partial(block.msa_att_col, mask=msa_mask, use_lma=use_lma),
+            (m,),
+        ),
+        "msa_transition": (
+            partial(core.msa_transition, mask=msa_trans_mask),
+            (m,),
+        ),
+        "outer_product_mean": (
+            partial(core.outer_product_mean, mask=msa_mask),
+            (m,),
+        ),
+        "tri_att": (
+            partial(core.tri_att_start, mask=pair_mask, use_lma=use_lma),
+            (z,),
+        ),
+        "pair_transition": (
+            partial(core.pair_transition, mask=pair_trans_mask),
+            (z,),
+        ),
+    }
+
+
+def _get_block_steps(
+    block: EvoformerBlock,
+    msa_mask: torch.Tensor,
+    pair_mask: torch.Tensor,
+    chunk_size: Optional[int],
+    use_lma: bool,
+    _mask_trans: bool,
+) -> List[Tuple[str, Callable]]:
+    """
+        Splits an Evoformer block into a sequence of named residual updates,
+        each mapping (m, z) to (m, z), so that they can be checkpointed
+        individually. Equivalent to the block's forward pass outside of
+        inference, where no updates are applied in place. Both triangular
+        updates (and both triangular attention modules) share a name, as in
+        CHUNKED_MODULES.
+    """
+    core = block.core
+    msa_trans_mask = msa_mask if _mask_trans else None
+    pair_trans_mask = pair_mask if _mask_trans else None
+
+    def msa_att_row(m, z):
+        m = m + block.msa_dropout_layer(
+            block.msa_att_row(
+                m, z=z, mask=msa_mask, chunk_size=chunk_size, use_lma=use_lma
+            )
+        )
+        return m, z
+
+    def msa_att_col(m, z):
+        m = m + block.msa_att_col(
+            m, mask=msa_mask, chunk_size=chunk_size, use_lma=use_lma
+        )
+        return m, z
+
+    def msa_transition(m, z):
+        m = m + core.msa_transition(
+            m, mask=msa_trans_mask, chunk_size=chunk_size
+        )
+        return m, z
+
+    def outer_product_mean(m, z):
+        z = z + core.outer_product_mean(
+            m, mask=msa_mask, chunk_size=chunk_size
+        )
+        return m, z
+
+    def tri_mul(module):
+        def fn(m, z):
+            z = z + core.ps_dropout_row_layer(module(z, mask=pair_mask))
+            return m, z
+
+        return fn
+
+    def tri_att(module, dropout):
+        def fn(m, z):
+            z = z + dropout(
+                module(
+                    z, mask=pair_mask, chunk_size=chunk_size, use_lma=use_lma
+                )
+            )
+            return m, z
+
+        return fn
+
+    def pair_transition(m, z):
+        z = z + core.pair_transition(
+            z, mask=pair_trans_mask, chunk_size=chunk_size
+        )
+        return m, z
+
+    return [
+        ("msa_att_row", msa_att_row),
+        ("msa_att_col", msa_att_col),
+        ("msa_transition", msa_transition),
+        ("outer_product_mean", outer_product_mean),
+        ("tri_mul", tri_mul(core.tri_mul_out)),
+        ("tri_mul", tri_mul(core.tri_mul_in)),
+        ("tri_att", tri_att(core.tri_att_start, core.ps_dropout_row_layer)),
+        ("tri_att", tri_att(core.tri_att_end, core.ps_dropout_col_layer)),
+        ("pair_transition", pair_transition),
+    ]
+
+
 class EvoformerStack(nn.Module):
     """
     Main Evoformer trunk.
@@ -521,6 +734,12 @@ class EvoformerStack(nn.Module):
         eps: float,
         clear_cache_between_blocks: bool = False, 
         tune_chunk_size: bool = False,
+        plan_chunk_size: bool = False,
+        chunk_size_memory_budget: Optional[float] = None,
+        chunk_size_cache_path: Optional[str] = None,
+        chunk_sizes: Optional[Mapping[str, int]] = None,
+        ckpt_modules: Optional[Sequence[str]] = None,
+        ckpt_offload: bool = False,
         **kwargs,
     ):
         """
@@ -559,10 +778,40 @@ class EvoformerStack(nn.Module):
                 stack. Slows down each block but can reduce fragmentation
             tune_chunk_size:
                 Whether to dynamically tune the module's chunk size
+            plan_chunk_size:
+                Whether to pick chunk sizes with ChunkSizePlanner's memory
+                model instead of tuning them by trial and error. Takes
+                precedence over tune_chunk_size
+            chunk_size_memory_budget:
+                Memory budget (in GiB) of the chunk size planner. Defaults to
+                the available device memory
+            chunk_size_cache_path:
+                Optional JSON file in which planned chunk sizes are persisted
+            chunk_sizes:
+                Optional inference-time chunk sizes of individual modules,
+                keyed by the module names in CHUNKED_MODULES. Override the
+                chunk size passed to forward for those modules
+            ckpt_modules:
+                Optional names of the modules (from CHUNKED_MODULES) to
+                checkpoint individually within each block during training.
+                Takes precedence over blocks_per_ckpt. An empty list
+                disables checkpointing altogether
+            ckpt_offload:
+                Whether to keep the activations saved for the backward pass
+                in (pinned) CPU memory during training
         """
         super(EvoformerStack, self).__init__()
 
         self.blocks_per_ckpt = blocks_per_ckpt
+        self.ckpt_modules = ckpt_modules
+        if(ckpt_modules is not None):
+            self.ckpt_modules = set(ckpt_modules)
+            unknown_modules = self.ckpt_modules - set(CHUNKED_MODULES)
+            if(len(unknown_modules) > 0):
+                raise ValueError(
+                    f"Unknown checkpointed modules: {unknown_modules}"
+                )
+        self.ckpt_offload = ckpt_offload
         self.clear_cache_between_blocks = clear_cache_between_blocks
 
         self.blocks = nn.ModuleList()
@@ -587,10 +836,32 @@ class EvoformerStack(nn.Module):
 
         self.linear = Linear(c_m, c_s)
 
+        self.chunk_sizes = dict(chunk_sizes) if chunk_sizes is not None else {}
+        unknown_modules = set(self.chunk_sizes) - set(CHUNKED_MODULES)
+        if(len(unknown_modules) > 0):
+            raise ValueError(f"Unknown chunked modules: {unknown_modules}")
+
         self.tune_chunk_size = tune_chunk_size
-        self.chunk_size_tuner = None
-        if(tune_chunk_size):
-            self.chunk_size_tuner = ChunkSizeTuner()
+        self.chunk_size_tuners = None
+        self.chunk_size_planner = None
+        if(plan_chunk_size):
+            self.chunk_size_planner = ChunkSizePlanner(
+                c_z=c_z,
+                c_hidden_mul=c_hidden_mul,
+                c_hidden_pair_att=c_hidden_pair_att,
+                no_heads_pair=no_heads_pair,
+                transition_n=transition_n,
+                c_m=c_m,
+                c_hidden_msa_att=c_hidden_msa_att,
+                no_heads_msa=no_heads_msa,
+                c_hidden_opm=c_hidden_opm,
+                memory_budget=chunk_size_memory_budget,
+                cache_path=chunk_size_cache_path,
+            )
+        elif(tune_chunk_size):
+            self.chunk_size_tuners = {
+                k: ChunkSizeTuner() for k in CHUNKED_MODULES
+            }
 
     def forward(self,
         m: torch.Tensor,
@@ -642,30 +913,48 @@ class EvoformerStack(nn.Module):
 
             blocks = [partial(block_with_cache_clear, b) for b in blocks]
 
-        if(chunk_size is not None and self.chunk_size_tuner is not None):
-            tuned_chunk_size = self.chunk_size_tuner.tune_chunk_size(
-                representative_fn=blocks[0],
-                args=(m,z),
-                min_chunk_size=chunk_size,
+        representative_fns = None
+        if(chunk_size is not None and self.chunk_size_tuners is not None):
+            representative_fns = _get_representative_fns(
+                self.blocks[0], m, z, msa_mask, pair_mask, use_lma, _mask_trans
             )
-            blocks = [
-                partial(b, 
-                    chunk_size=tuned_chunk_size,
-                    # A temporary measure to address torch's occasional
-                    # inability to allocate large tensors
-                    _attn_chunk_size=max(chunk_size, tuned_chunk_size // 2),
-                ) for b in blocks
-            ]
+
+        chunk_sizes = resolve_chunk_sizes(
+            chunk_size,
+            self.chunk_sizes,
+            planner=self.chunk_size_planner,
+            planner_args=(m, z),
+            tuners=self.chunk_size_tuners,
+            representative_fns=representative_fns,
+        )
+        if(chunk_sizes is not None):
+            blocks = [partial(b, chunk_sizes=chunk_sizes) for b in blocks]
 
         blocks_per_ckpt = self.blocks_per_ckpt
         if(not torch.is_grad_enabled()):
             blocks_per_ckpt = None
 
-        m, z = checkpoint_blocks(
-            blocks,
-            args=(m, z),
-            blocks_per_ckpt=blocks_per_ckpt,
-        )
+        with offload_saved_tensors(self.ckpt_offload):
+            if(self.ckpt_modules is not None and torch.is_grad_enabled()):
+                sub_blocks = [
+                    _get_block_steps(
+                        b, msa_mask, pair_mask, chunk_size, use_lma, 
+                        _mask_trans,
+                    )
+                    for b in self.blocks
+                ]
+
+                m, z = checkpoint_sub_blocks(
+                    sub_blocks,
+                    args=(m, z),
+                    ckpt_modules=self.ckpt_modules,
+                )
+            else:
+                m, z = checkpoint_blocks(
+                    blocks,
+                    args=(m, z),
+                    blocks_per_ckpt=blocks_per_ckpt,
+                )
 
         s = self.linear(m[..., 0, :, :])
         
@@ -695,6 +984,10 @@ class ExtraMSAStack(nn.Module):
         clear_cache_between_blocks: bool = False,
         chunk_msa_attn: bool = False,
         tune_chunk_size: bool = False,
+        plan_chunk_size: bool = False,
+        chunk_size_memory_budget: Optional[float] = None,
+        chunk_size_cache_path: Optional[str] = None,
+        chunk_sizes: Optional[Mapping[str, int]] = None,
         **kwargs,
     ):
         super(ExtraMSAStack, self).__init__()
@@ -722,10 +1015,33 @@ class ExtraMSAStack(nn.Module):
             )
             self.blocks.append(block)
             
+        self.chunk_sizes = dict(chunk_sizes) if chunk_sizes is not None else {}
+        unknown_modules = set(self.chunk_sizes) - set(CHUNKED_MODULES)
+        if(len(unknown_modules) > 0):
+            raise ValueError(f"Unknown chunked modules: {unknown_modules}")
+
         self.tune_chunk_size = tune_chunk_size
-        self.chunk_size_tuner = None
-        if(tune_chunk_size):
-            self.chunk_size_tuner = ChunkSizeTuner()
+        self.chunk_size_tuners = None
+        self.chunk_size_planner = None
+        if(plan_chunk_size):
+            self.chunk_size_planner = ChunkSizePlanner(
+                c_z=c_z,
+                c_hidden_mul=c_hidden_mul,
+                c_hidden_pair_att=c_hidden_pair_att,
+                no_heads_pair=no_heads_pair,
+                transition_n=transition_n,
+                c_m=c_m,
+                c_hidden_msa_att=c_hidden_msa_att,
+                no_heads_msa=no_heads_msa,
+                c_hidden_opm=c_hidden_opm,
+                global_msa_col_att=True,
+                memory_budget=chunk_size_memory_budget,
+                cache_path=chunk_size_cache_path,
+            )
+        elif(tune_chunk_size):
+            self.chunk_size_tuners = {
+                k: ChunkSizeTuner() for k in CHUNKED_MODULES
+            }
 
     def forward(self,
         m: torch.Tensor,
@@ -772,20 +1088,28 @@ class ExtraMSAStack(nn.Module):
             if(self.clear_cache_between_blocks):
                 blocks = [partial(clear_cache, b) for b in blocks]
 
-            if(chunk_size is not None and self.chunk_size_tuner is not None):
-                tuned_chunk_size = self.chunk_size_tuner.tune_chunk_size(
-                    representative_fn=blocks[0],
-                    args=(m,z),
-                    min_chunk_size=chunk_size,
+            representative_fns = None
+            if(chunk_size is not None and self.chunk_size_tuners is not None):
+                representative_fns = _get_representative_fns(
+                    self.blocks[0], 
+                    m, 
+                    z, 
+                    msa_mask, 
+                    pair_mask, 
+                    use_lma, 
+                    _mask_trans,
                 )
-                blocks = [
-                    partial(b, 
-                        chunk_size=tuned_chunk_size,
-                        # A temporary measure to address torch's occasional
-                        # inability to allocate large tensors
-                        _attn_chunk_size=max(chunk_size, tuned_chunk_size // 2),
-                    ) for b in blocks
-                ]
+
+            chunk_sizes = resolve_chunk_sizes(
+                chunk_size,
+                self.chunk_sizes,
+                planner=self.chunk_size_planner,
+                planner_args=(m, z),
+                tuners=self.chunk_size_tuners,
+                representative_fns=representative_fns,
+            )
+            if(chunk_sizes is not None):
+                blocks = [partial(b, chunk_sizes=chunk_sizes) for b in blocks]
 
             for b in blocks:
                 if(self.ckpt and torch.is_grad_enabled()):
@@ -808,3 +1132,220 @@ class ExtraMSAStack(nn.Module):
                     torch.cuda.empty_cache()
 
         return z
+
+    @torch.jit.ignore
+    def forward_streaming(self,
+        m: torch.Tensor,
+        z: torch.Tensor,
+        msa_mask: torch.Tensor,
+        pair_mask: torch.Tensor,
+        block_size: int,
+        chunk_size: Optional[int] = None,
+        use_lma: bool = False,
+        _mask_trans: bool = True,
+    ) -> torch.Tensor:
+        """
+            Inference-only version of forward that processes the extra MSA 
+            in blocks of sequences, so that the size of the intermediate
+            activations of the MSA modules scales with block_size rather
+            than N_extra. The sequence reductions in the column global
+            attention (query averaging and the softmax over sequences) and
+            in the outer product mean are accumulated across blocks. Each
+            block is therefore visited three times per ExtraMSABlock.
+
+            m may reside on a different device than z (e.g. in pinned CPU
+            memory), in which case each block is moved to z's device for
+            processing and written back afterwards.
+
+            Args:
+                m:
+                    [*, N_extra, N_res, C_m] extra MSA embedding. Updated in
+                    place
+                z:
+                    [*, N_res, N_res, C_z] pair embedding
+                msa_mask:
+                    [*, N_extra, N_res] MSA mask
+                pair_mask:
+                    [*, N_res, N_res] pair mask
+                block_size:
+                    Number of sequences per block
+                chunk_size:
+                    Inference-time subbatch size for Evoformer modules
+                use_lma:
+                    Whether to use low-memory attention
+            Returns:
+                [*, N_res, N_res, C_z] pair update
+        """
+        if(self.training or torch.is_grad_enabled()):
+            raise ValueError("Streaming is only supported during inference")
+
+        device = z.device
+        n_seq = m.shape[-3]
+        msa_mask = msa_mask.to(device=device)
+        block_starts = list(range(0, n_seq, block_size))
+
+        planner_args = (m[..., :block_size, :, :], z)
+        chunk_sizes = resolve_chunk_sizes(
+            chunk_size,
+            self.chunk_sizes,
+            planner=self.chunk_size_planner,
+            planner_args=planner_args,
+        )
+
+        def load(i):
+            m_block = m[..., i: i + block_size, :, :]
+            if(m_block.device != device):
+                m_block = m_block.to(device=device, non_blocking=True)
+            mask_block = msa_mask[..., i: i + block_size, :]
+            return m_block, mask_block
+
+        def store(i, m_block):
+            # Blocks on the same device are views of m, updated in place
+            if(m.device != device):
+                m[..., i: i + block_size, :, :].copy_(m_block)
+
+        for b in self.blocks:
+            col_att = b.msa_att_col
+            ga = col_att.global_attention
+            core = b.core
+
+            # Row attention. Also accumulates the masked sum of the 
+            # (normalized) MSA over sequences, from which the column 
+            # attention queries are computed
+            q_sum = z.new_zeros(m.shape[:-3] + m.shape[-2:])
+            mask_sum = z.new_zeros(msa_mask.shape[:-2] + msa_mask.shape[-1:])
+            for i in block_starts:
+                m_block, mask_block = load(i)
+                m_block = add(m_block,
+                    b.msa_att_row(
+                        m_block,
+                        z=z,
+                        mask=mask_block,
+                        chunk_size=get_module_chunk_size(
+                            chunk_sizes, "msa_att_row", chunk_size
+                        ),
+                        use_lma=use_lma,
+                        use_memory_efficient_kernel=not use_lma,
+                    ),
+                    inplace=True,
+                )
+
+                ln = col_att.layer_norm_m(m_block)
+                q_sum += torch.sum(ln * mask_block.unsqueeze(-1), dim=-3)
+                mask_sum += torch.sum(mask_block, dim=-2)
+                del ln
+
+                store(i, m_block)
+                del m_block
+
+            # [*, N_res, H, C_hidden]
+            q = q_sum / (mask_sum[..., None] + ga.eps)
+            q = ga.linear_q(q)
+            q *= (ga.c_hidden ** (-0.5))
+            q = q.view(q.shape[:-1] + (ga.no_heads, -1))
+            del q_sum, mask_sum
+
+            # Column global attention, with an online softmax over blocks
+            o = None
+            for i in block_starts:
+                m_block, mask_block = load(i)
+
+                # [*, N_res, N_block, C_m]
+                ln = col_att.layer_norm_m(m_block.transpose(-2, -3))
+                k = ga.linear_k(ln)
+                v = ga.linear_v(ln)
+                del ln
+
+                # [*, N_res, H, N_block]
+                a = torch.matmul(q, k.transpose(-1, -2))
+                a += (ga.inf * (mask_block.transpose(-1, -2) - 1))[
+                    ..., :, None, :
+                ]
+                a_max = torch.amax(a, dim=-1, keepdim=True)
+                if(o is None):
+                    running_max = a_max
+                    a = torch.exp(a - running_max)
+                    normalizer = torch.sum(a, dim=-1, keepdim=True)
+                    o = torch.matmul(a, v)
+                else:
+                    new_max = torch.maximum(running_max, a_max)
+                    scale = torch.exp(running_max - new_max)
+                    a = torch.exp(a - new_max)
+                    normalizer = normalizer * scale + torch.sum(
+                        a, dim=-1, keepdim=True
+                    )
+                    o = o * scale + torch.matmul(a, v)
+                    running_max = new_max
+                del a, k, v
+
+            # [*, N_res, H, C_hidden]
+            o = o / normalizer
+            del q, running_max, normalizer
+
+            # Gating and output projection of the column attention, the MSA
+            # transition and the outer product mean
+            outer_sum = torch.zeros_like(z)
+            norm_sum = z.new_zeros(z.shape[:-1] + (1,))
+            for i in block_starts:
+                m_block, mask_block = load(i)
+
+                # [*, N_res, N_block, C_m]
+                ln = col_att.layer_norm_m(m_block.transpose(-2, -3))
+                g = ga.sigmoid(ga.linear_g(ln))
+                del ln
+                g = g.view(g.shape[:-1] + (ga.no_heads, -1))
+                g *= o.unsqueeze(-3)
+                g = g.reshape(g.shape[:-2] + (-1,))
+                m_block = add(m_block,
+                    ga.linear_o(g).transpose(-2, -3),
+                    inplace=True,
+                )
+                del g
+
+                m_block = add(m_block,
+                    core.msa_transition(
+                        m_block,
+                        mask=mask_block if _mask_trans else None,
+                        chunk_size=get_module_chunk_size(
+                            chunk_sizes, "msa_transition", chunk_size
+                        ),
+                    ),
+                    inplace=True,
+                )
+
+                outer, norm = core.outer_product_mean._partial_sum(
+                    m_block,
+                    mask_block,
+                    chunk_size=get_module_chunk_size(
+                        chunk_sizes, "outer_product_mean", chunk_size
+                    ),
+                )
+                outer_sum += outer
+                norm_sum += norm
+                del outer, norm
+
+                store(i, m_block)
+                del m_block
+
+            del o
+
+            opm = core.outer_product_mean
+            outer_sum += opm.linear_out.bias
+            norm_sum += opm.eps
+            outer_sum /= norm_sum
+            z += outer_sum
+            del outer_sum, norm_sum
+
+            z = core._pair_updates(
+                z,
+                pair_mask=pair_mask,
+                chunk_size=chunk_size,
+                use_lma=use_lma,
+                _mask_trans=_mask_trans,
+                chunk_sizes=chunk_sizes,
+            )
+
+            if(self.clear_cache_between_blocks):
+                torch.cuda.empty_cache()
+
+        return z
@@ -42,6 +42,7 @@ from openfold.utils.feats import (
     build_template_pair_feat,
     atom14_to_atom37,
 )
+from openfold.utils.offload import to_device, to_host
 from openfold.utils.loss import (
     compute_plddt,
 )
@@ -71,6 +72,7 @@ class AlphaFold(nn.Module):
         self.config = config.model
         self.template_config = self.config.template
         self.extra_msa_config = self.config.extra_msa
+        self.offload_config = self.config.offload_inference
 
         # Main trunk + structure module
         self.input_embedder = InputEmbedder(
@@ -202,6 +204,59 @@ class AlphaFold(nn.Module):
 
         return ret
 
+    def embed_extra_msa_streaming(self, feats, z, pair_mask):
+        """
+            Inference-only alternative to running the extra MSA embedder and
+            stack on the full extra MSA. The extra MSA is embedded and 
+            processed in blocks of extra_msa.stream_block_size sequences. 
+            If extra_msa.offload_stream is set, the embedding is kept in 
+            CPU memory between blocks.
+        """
+        block_size = self.extra_msa_config.stream_block_size
+        n_seq = feats["extra_msa"].shape[-2]
+
+        storage_device = z.device
+        if(self.extra_msa_config.offload_stream):
+            storage_device = torch.device("cpu")
+
+        a = None
+        for i in range(0, n_seq, block_size):
+            block_feats = {
+                k: feats[k][..., i: i + block_size, :] 
+                for k in [
+                    "extra_msa", "extra_has_deletion", "extra_deletion_value"
+                ]
+            }
+
+            # [*, S_b, N, C_e]
+            a_block = self.extra_msa_embedder(build_extra_msa_feat(block_feats))
+            if(a is None):
+                a = torch.empty(
+                    a_block.shape[:-3] + (n_seq,) + a_block.shape[-2:],
+                    dtype=a_block.dtype,
+                    device=storage_device,
+                    pin_memory=(
+                        storage_device.type == "cpu" and z.device.type == "cuda"
+                    ),
+                )
+
+            a[..., i: i + block_size, :, :] = a_block
+            del a_block
+
+        # [*, N, N, C_z]
+        z = self.extra_msa_stack.forward_streaming(
+            a,
+            z,
+            msa_mask=feats["extra_msa_mask"].to(dtype=z.dtype),
+            pair_mask=pair_mask.to(dtype=z.dtype),
+            block_size=block_size,
+            chunk_size=self.globals.chunk_size,
+            use_lma=self.globals.use_lma,
+            _mask_trans=self.config._mask_trans,
+        )
+
+        return z
+
     def iteration(self, feats, prevs, _recycle=True):
         # Primary output dictionary
         outputs = {}
@@ -219,6 +274,8 @@ class AlphaFold(nn.Module):
         n_seq = feats["msa_feat"].shape[-3]
         device = feats["target_feat"].device
         inplace_safe = not (self.training or torch.is_grad_enabled())
+        offload = self.offload_config.enabled and inplace_safe
+        offload_chunk_size = self.offload_config.chunk_size
 
         # Prep some features
         seq_mask = feats["seq_mask"]
@@ -248,8 +305,10 @@ class AlphaFold(nn.Module):
             )
 
             # [*, N, N, C_z]
-            z_prev = z.new_zeros(
+            z_prev = torch.zeros(
                 (*batch_dims, n, n, self.config.input_embedder.c_z),
+                dtype=z.dtype,
+                device=("cpu" if offload else z.device),
                 requires_grad=False,
             )
 
@@ -263,46 +322,92 @@ class AlphaFold(nn.Module):
             feats["aatype"], x_prev, None
         ).to(dtype=z.dtype)
 
-        # m_1_prev_emb: [*, N, C_m]
-        # z_prev_emb: [*, N, N, C_z]
-        m_1_prev_emb, z_prev_emb = self.recycling_embedder(
-            m_1_prev,
-            z_prev,
-            x_prev,
-            _inplace=not (self.training or torch.is_grad_enabled()),
-        )
+        if(offload):
+            # z_prev is kept in host memory and streamed back in chunks
+            m_1_prev_emb, z = self.recycling_embedder.forward_chunked(
+                m_1_prev,
+                z,
+                z_prev,
+                x_prev,
+                chunk_size=offload_chunk_size,
+            )
 
-        # [*, S_c, N, C_m]
-        m[..., 0, :, :] += m_1_prev_emb
+            # [*, S_c, N, C_m]
+            m[..., 0, :, :] += m_1_prev_emb
 
-        # [*, N, N, C_z]
-        z += z_prev_emb
+            z_prev_emb = None
+        else:
+            # m_1_prev_emb: [*, N, C_m]
+            # z_prev_emb: [*, N, N, C_z]
+            m_1_prev_emb, z_prev_emb = self.recycling_embedder(
+                m_1_prev,
+                z_prev,
+                x_prev,
+                _inplace=not (self.training or torch.is_grad_enabled()),
+            )
+
+            # [*, S_c, N, C_m]
+            m[..., 0, :, :] += m_1_prev_emb
+
+            # [*, N, N, C_z]
+            z += z_prev_emb
 
         # This matters during inference with large N
         del m_1_prev, z_prev, x_prev, m_1_prev_emb, z_prev_emb
 
+        if(offload):
+            # The MSA embedding sits idle until the Evoformer
+            m = to_host(m, self.offload_config.mmap_dir)
+
         # Embed the templates + merge with MSA/pair embeddings
         if self.config.template.enabled:
             template_feats = {
                 k: v for k, v in feats.items() if k.startswith("template_")
             }
-            template_embeds = self.embed_templates(
-                template_feats,
-                z,
-                pair_mask.to(dtype=z.dtype),
-                no_batch_dims,
-            )
+            if(offload and not self.template_config.average_templates):
+                # Keep the pair embedding in host memory while the template
+                # pair stack runs
+                z = to_host(z, self.offload_config.mmap_dir)
+                template_embeds = embed_templates_offload(
+                    self,
+                    template_feats,
+                    z,
+                    pair_mask.to(dtype=z.dtype),
+                    no_batch_dims,
+                    template_chunk_size=offload_chunk_size,
+                )
 
-            # [*, N, N, C_z]
-            z = add(z,
-                template_embeds.pop("template_pair_embedding"),
-                inplace_safe,
-            )
+                # [*, N, N, C_z]
+                z = to_device(
+                    z,
+                    device,
+                    offload_chunk_size,
+                    out=template_embeds.pop("template_pair_embedding"),
+                    add=True,
+                )
+            else:
+                template_embeds = self.embed_templates(
+                    template_feats,
+                    z,
+                    pair_mask.to(dtype=z.dtype),
+                    no_batch_dims,
+                )
+
+                # [*, N, N, C_z]
+                z = add(z,
+                    template_embeds.pop("template_pair_embedding"),
+                    inplace_safe,
+                )
 
             if self.config.template.embed_angles:
                 # [*, S = S_c + S_t, N, C_m]
                 m = torch.cat(
-                    [m, template_embeds["template_angle_embedding"]], 
+                    [
+                        m, 
+                        template_embeds["template_angle_embedding"].to(
+                            device=m.device
+                        ),
+                    ], 
                     dim=-3
                 )
 
@@ -314,7 +419,13 @@ class AlphaFold(nn.Module):
                 )
 
         # Embed extra MSA features + merge with pairwise embeddings
-        if self.config.extra_msa.enabled:
+        if(self.config.extra_msa.enabled and 
+            self.extra_msa_config.stream_block_size is not None and
+            inplace_safe
+        ):
+            # [*, N, N, C_z]
+            z = self.embed_extra_msa_streaming(feats, z, pair_mask)
+        elif self.config.extra_msa.enabled:
             # [*, S_e, N, C_e]
             a = self.extra_msa_embedder(build_extra_msa_feat(feats))
            
@@ -331,6 +442,9 @@ class AlphaFold(nn.Module):
 
             del a
 
+        if(offload):
+            m = to_device(m, device, offload_chunk_size)
+
         # Run MSA + pair embeddings through the trunk of the network
         # m: [*, S, N, C_m]
         # z: [*, N, N, C_z]
@@ -375,6 +489,53 @@ class AlphaFold(nn.Module):
 
         return outputs, m_1_prev, z_prev, x_prev
 
+    def _recycling_converged(self, outputs, feats, prev_state):
+        """
+            Compares the structure (and optionally the pLDDT) predicted in
+            the current recycling iteration to that of the previous one.
+            Returns whether recycling has converged for every element of the
+            batch, along with the state to pass to the next call.
+        """
+        cfg = self.config.recycle_early_stop
+
+        ca_idx = residue_constants.atom_order["CA"]
+        ca = outputs["final_atom_positions"][..., ca_idx, :].float()
+        dists = torch.sqrt(
+            torch.sum(
+                (ca[..., :, None, :] - ca[..., None, :, :]) ** 2, dim=-1
+            ) + 1e-10
+        )
+        mask = feats["seq_mask"].float()
+        pair_mask = mask[..., :, None] * mask[..., None, :]
+
+        mean_plddt = None
+        if(cfg.plddt_tolerance is not None):
+            plddt = compute_plddt(
+                self.aux_heads.plddt(outputs["sm"]["single"])
+            ).float()
+            mean_plddt = (
+                torch.sum(plddt * mask, dim=-1) / 
+                (torch.sum(mask, dim=-1) + 1e-10)
+            )
+
+        state = (dists, mean_plddt)
+        if(prev_state is None):
+            return False, state
+
+        prev_dists, prev_mean_plddt = prev_state
+        rms_change = torch.sqrt(
+            torch.sum(pair_mask * (dists - prev_dists) ** 2, dim=(-1, -2)) /
+            (torch.sum(pair_mask, dim=(-1, -2)) + 1e-10)
+        )
+        converged = torch.all(rms_change < cfg.tolerance)
+        if(mean_plddt is not None):
+            plddt_change = torch.abs(mean_plddt - prev_mean_plddt)
+            converged = converged & torch.all(
+                plddt_change < cfg.plddt_tolerance
+            )
+
+        return bool(converged), state
+
     def forward(self, batch):
         """
         Args:
@@ -431,12 +592,22 @@ class AlphaFold(nn.Module):
         prevs = [m_1_prev, z_prev, x_prev]
 
         is_grad_enabled = torch.is_grad_enabled()
+        offload = (
+            self.offload_config.enabled and 
+            not (self.training or is_grad_enabled)
+        )
 
-        # Main recycling loop
-        num_iters = batch["aatype"].shape[-1]
+        # Main recycling loop. Features that don't change between iterations
+        # may be stored with a recycling dimension of size 1, which is then
+        # broadcast
+        num_iters = max(t.shape[-1] for t in batch.values())
+        early_stop = (
+            self.config.recycle_early_stop.enabled and not self.training
+        )
+        stop_state = None
         for cycle_no in range(num_iters): 
             # Select the features for the current recycling cycle
-            fetch_cur_batch = lambda t: t[..., cycle_no]
+            fetch_cur_batch = lambda t: t[..., min(cycle_no, t.shape[-1] - 1)]
             feats = tensor_tree_map(fetch_cur_batch, batch)
 
             # Enable grad iff we're training and it's the final recycling layer
@@ -455,11 +626,33 @@ class AlphaFold(nn.Module):
                 )
 
                 if(not is_final_iter):
+                    if(early_stop):
+                        converged, stop_state = self._recycling_converged(
+                            outputs, feats, stop_state,
+                        )
+                        if(converged):
+                            break
+
                     del outputs
+
+                    if(offload):
+                        # Keep the recycled pair embedding in host memory.
+                        # Also frees the rest of the MSA embedding
+                        m_1_prev = m_1_prev.clone()
+                        z_prev = to_host(z_prev, self.offload_config.mmap_dir)
+
                     prevs = [m_1_prev, z_prev, x_prev]
                     del m_1_prev, z_prev, x_prev
 
         # Run auxiliary heads
         outputs.update(self.aux_heads(outputs))
 
+        # Number of recycling iterations actually run
+        outputs["num_recycles"] = torch.full(
+            feats["aatype"].shape[:-1],
+            cycle_no,
+            dtype=torch.int64,
+            device=feats["aatype"].device,
+        )
+
         return outputs
@@ -14,7 +14,7 @@
 # limitations under the License.
 
 from functools import partial
-from typing import Optional
+from typing import Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -93,6 +93,57 @@ class OuterProductMean(nn.Module):
 
         return outer
 
+    @torch.jit.ignore
+    def _partial_sum(self,
+        m: torch.Tensor,
+        mask: torch.Tensor,
+        chunk_size: Optional[int] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+            Computes the contribution of a subset of the MSA's sequences to
+            the outer product mean, so that it can be computed incrementally
+            over blocks of sequences. Given the sums of the outputs over all
+            blocks, the outer product mean is
+            (outer + linear_out.bias) / (norm + eps).
+
+            Args:
+                m:
+                    [*, N_block, N_res, C_m] MSA embedding block
+                mask:
+                    [*, N_block, N_res] MSA mask block
+            Returns:
+                outer:
+                    [*, N_res, N_res, C_z] unnormalized contribution, without
+                    the output bias
+                norm:
+                    [*, N_res, N_res, 1] contribution to the normalization
+                    term
+        """
+        ln = self.layer_norm(m)
+
+        mask = mask.unsqueeze(-1)
+        a = self.linear_1(ln)
+        a = a * mask
+
+        b = self.linear_2(ln)
+        b = b * mask
+
+        del ln
+
+        a = a.transpose(-2, -3)
+        b = b.transpose(-2, -3)
+
+        if chunk_size is not None:
+            outer = self._chunk(a, b, chunk_size)
+        else:
+            outer = self._opm(a, b)
+
+        outer -= self.linear_out.bias
+
+        norm = torch.einsum("...abc,...adc->...bdc", mask, mask)
+
+        return outer, norm
+
     def forward(self, 
         m: torch.Tensor, 
         mask: Optional[torch.Tensor] = None,
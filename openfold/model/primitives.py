@@ -571,55 +571,96 @@ def _lma(
     q_chunk_size: int, 
     kv_chunk_size: int,
 ):
+    """
+        Low-memory attention (Staats & Rabe 2021), computed block by block
+        with an online softmax. For each query chunk, a running maximum,
+        softmax denominator and output are updated as each key/value chunk
+        is processed, so only a [*, H, q_chunk_size, kv_chunk_size] block of
+        logits exists at any time. Biases are added to each block as it is
+        computed.
+
+        Args:
+            q:
+                [*, H, Q, C_hidden] query tensor
+            k:
+                [*, H, K, C_hidden] key tensor
+            v:
+                [*, H, K, C_hidden] value tensor
+            biases:
+                List of biases that broadcast to [*, H, Q, K]
+            q_chunk_size:
+                Number of queries per block
+            kv_chunk_size:
+                Number of keys/values per block
+        Returns:
+            [*, H, Q, C_hidden] attention output
+    """
     no_q, no_kv = q.shape[-2], k.shape[-2]
 
+    # In-place operations are only safe when the blocks aren't needed for
+    # the backward pass
+    inplace_safe = not torch.is_grad_enabled()
+
+    # [*, H, C_hidden, K]
+    k = k.transpose(-1, -2)
+
     # [*, H, Q, C_hidden]
-    o = q.new_zeros(q.shape)
+    o = q.new_zeros(q.shape[:-1] + v.shape[-1:])
     for q_s in range(0, no_q, q_chunk_size):
         q_chunk = q[..., q_s: q_s + q_chunk_size, :]
         large_bias_chunks = [
-            b[..., q_s: q_s + q_chunk_size, :] for b in biases
+            b[..., q_s: q_s + q_chunk_size, :] 
+            if b.shape[-2] != 1 else b 
+            for b in biases
         ]
 
-        maxes = []
-        weights = []
-        values = []
+        max_a = None
+        weights = None
+        values = None
         for kv_s in range(0, no_kv, kv_chunk_size):
-            k_chunk = k[..., kv_s: kv_s + kv_chunk_size, :]
+            k_chunk = k[..., kv_s: kv_s + kv_chunk_size]
             v_chunk = v[..., kv_s: kv_s + kv_chunk_size, :]
-            small_bias_chunks = [
-                b[..., kv_s: kv_s + kv_chunk_size] for b in large_bias_chunks
-            ]
-
-            a = torch.einsum(
-                "...hqd,...hkd->...hqk", q_chunk, k_chunk,
-            )
-       
-            for b in small_bias_chunks:
-                a += b
-        
-            max_a = torch.max(a, dim=-1, keepdim=True)[0]
-            exp_a = torch.exp(a - max_a)
-            exp_v = torch.einsum("...hvf,...hqv->...hqf", v_chunk, exp_a)
- 
-            maxes.append(max_a.detach().squeeze(-1))
-            weights.append(torch.sum(exp_a, dim=-1))
-            values.append(exp_v)
 
-        chunk_max = torch.stack(maxes, dim=-3)
-        chunk_weights = torch.stack(weights, dim=-3)
-        chunk_values = torch.stack(values, dim=-4)
-
-        global_max = torch.max(chunk_max, dim=-3, keepdim=True)[0]
-        max_diffs = torch.exp(chunk_max - global_max)
-        chunk_values = chunk_values * max_diffs.unsqueeze(-1)
-        chunk_weights = chunk_weights * max_diffs
+            # [*, H, Q_chunk, K_chunk]
+            a = torch.matmul(q_chunk, k_chunk)
+            for b in large_bias_chunks:
+                b = b[..., kv_s: kv_s + kv_chunk_size] if b.shape[-1] != 1 else b
+                if(inplace_safe):
+                    a += b
+                else:
+                    a = a + b
+
+            chunk_max = torch.max(a, dim=-1, keepdim=True)[0].detach()
+            if(max_a is None):
+                new_max = chunk_max
+            else:
+                new_max = torch.maximum(max_a, chunk_max)
 
-        all_values = torch.sum(chunk_values, dim=-4)
-        all_weights = torch.sum(chunk_weights.unsqueeze(-1), dim=-4)
+            if(inplace_safe):
+                a -= new_max
+                exp_a = torch.exp_(a)
+            else:
+                exp_a = torch.exp(a - new_max)
 
-        q_chunk_out = all_values / all_weights
+            chunk_weights = torch.sum(exp_a, dim=-1, keepdim=True)
+            chunk_values = torch.matmul(exp_a, v_chunk)
+            del a, exp_a
 
-        o[..., q_s: q_s + q_chunk_size, :] = q_chunk_out
+            if(max_a is None):
+                weights = chunk_weights
+                values = chunk_values
+            else:
+                # Rescale the running sums to the new maximum
+                scale = torch.exp(max_a - new_max)
+                if(inplace_safe):
+                    weights.mul_(scale).add_(chunk_weights)
+                    values.mul_(scale).add_(chunk_values)
+                else:
+                    weights = weights * scale + chunk_weights
+                    values = values * scale + chunk_values
+
+            max_a = new_max
+
+        o[..., q_s: q_s + q_chunk_size, :] = values / weights
 
     return o
@@ -14,7 +14,7 @@
 # limitations under the License.
 from functools import partial
 import math
-from typing import Optional, List
+from typing import Dict, List, Mapping, Optional
 
 import torch
 import torch.nn as nn
@@ -34,6 +34,12 @@ from openfold.model.triangular_multiplicative_update import (
     TriangleMultiplicationIncoming,
 )
 from openfold.utils.checkpointing import checkpoint_blocks
+from openfold.utils.chunk_planner import (
+    ChunkSizePlanner,
+    PAIR_MODULES,
+    get_module_chunk_size,
+    resolve_chunk_sizes,
+)
 from openfold.utils.feats import (
     build_template_angle_feat,
     build_template_pair_feat,
@@ -201,7 +207,18 @@ class TemplatePairStackBlock(nn.Module):
         use_lma: bool = False,
         _mask_trans: bool = True,
         _inplace: bool = False,
+        chunk_sizes: Optional[Dict[str, int]] = None,
     ):
+        tri_att_chunk_size = get_module_chunk_size(
+            chunk_sizes, "tri_att", chunk_size
+        )
+        tri_mul_chunk_size = get_module_chunk_size(
+            chunk_sizes, "tri_mul", 256
+        )
+        pair_transition_chunk_size = get_module_chunk_size(
+            chunk_sizes, "pair_transition", chunk_size
+        )
+
         single_templates = [
             t.unsqueeze(-4) for t in torch.unbind(z, dim=-4)
         ]
@@ -216,7 +233,7 @@ class TemplatePairStackBlock(nn.Module):
                 self.dropout_row(
                     self.tri_att_start(
                         single,
-                        chunk_size=chunk_size,
+                        chunk_size=tri_att_chunk_size,
                         mask=single_mask,
                         use_lma=use_lma,
                     )
@@ -228,7 +245,7 @@ class TemplatePairStackBlock(nn.Module):
                 self.dropout_col(
                     self.tri_att_end(
                         single,
-                        chunk_size=chunk_size,
+                        chunk_size=tri_att_chunk_size,
                         mask=single_mask,
                         use_lma=use_lma,
                     )
@@ -241,6 +258,7 @@ class TemplatePairStackBlock(nn.Module):
                 mask=single_mask,
                 _inplace=_inplace,
                 _add_with_inplace=True,
+                _inplace_chunk_size=tri_mul_chunk_size,
             )
             if(not _inplace):
                 single = single + self.dropout_row(tmu_update)
@@ -254,6 +272,7 @@ class TemplatePairStackBlock(nn.Module):
                 mask=single_mask,
                 _inplace=_inplace,
                 _add_with_inplace=True,
+                _inplace_chunk_size=tri_mul_chunk_size,
             )
             if(not _inplace):
                 single = single + self.dropout_row(tmu_update)
@@ -266,7 +285,7 @@ class TemplatePairStackBlock(nn.Module):
                 self.pair_transition(
                     single,
                     mask=single_mask if _mask_trans else None,
-                    chunk_size=chunk_size,
+                    chunk_size=pair_transition_chunk_size,
                 ),
                 _inplace,
             )
@@ -295,6 +314,10 @@ class TemplatePairStack(nn.Module):
         dropout_rate,
         blocks_per_ckpt,
         tune_chunk_size: bool = False,
+        plan_chunk_size: bool = False,
+        chunk_size_memory_budget: Optional[float] = None,
+        chunk_size_cache_path: Optional[str] = None,
+        chunk_sizes: Optional[Mapping[str, int]] = None,
         inf=1e9,
         **kwargs,
     ):
@@ -315,6 +338,18 @@ class TemplatePairStack(nn.Module):
             blocks_per_ckpt:
                 Number of blocks per activation checkpoint. None disables
                 activation checkpointing
+            tune_chunk_size:
+                Whether to dynamically tune the module's chunk size
+            plan_chunk_size:
+                Whether to pick chunk sizes with ChunkSizePlanner's memory
+                model instead of tuning them by trial and error
+            chunk_size_memory_budget:
+                Memory budget (in GiB) of the chunk size planner
+            chunk_size_cache_path:
+                Optional JSON file in which planned chunk sizes are persisted
+            chunk_sizes:
+                Optional inference-time chunk sizes of individual modules,
+                keyed by the module names in PAIR_MODULES
         """
         super(TemplatePairStack, self).__init__()
 
@@ -335,10 +370,28 @@ class TemplatePairStack(nn.Module):
 
         self.layer_norm = LayerNorm(c_t)
 
+        self.chunk_sizes = dict(chunk_sizes) if chunk_sizes is not None else {}
+        unknown_modules = set(self.chunk_sizes) - set(PAIR_MODULES)
+        if(len(unknown_modules) > 0):
+            raise ValueError(f"Unknown chunked modules: {unknown_modules}")
+
         self.tune_chunk_size = tune_chunk_size
-        self.chunk_size_tuner = None
-        if(tune_chunk_size):
-            self.chunk_size_tuner = ChunkSizeTuner()
+        self.chunk_size_tuners = None
+        self.chunk_size_planner = None
+        if(plan_chunk_size):
+            self.chunk_size_planner = ChunkSizePlanner(
+                c_z=c_t,
+                c_hidden_mul=c_hidden_tri_mul,
+                c_hidden_pair_att=c_hidden_tri_att,
+                no_heads_pair=no_heads,
+                transition_n=pair_transition_n,
+                memory_budget=chunk_size_memory_budget,
+                cache_path=chunk_size_cache_path,
+            )
+        elif(tune_chunk_size):
+            self.chunk_size_tuners = {
+                k: ChunkSizeTuner() for k in PAIR_MODULES
+            }
 
     def forward(
         self,
@@ -374,13 +427,37 @@ class TemplatePairStack(nn.Module):
             for b in self.blocks
         ]
 
-        if(chunk_size is not None and self.chunk_size_tuner is not None):
-            chunk_size = self.chunk_size_tuner.tune_chunk_size(
-                representative_fn=blocks[0],
-                args=(t,),
-                min_chunk_size=chunk_size,
-            )
-            blocks = [partial(b, chunk_size=chunk_size) for b in blocks]
+        representative_fns = None
+        if(chunk_size is not None and self.chunk_size_tuners is not None):
+            # Templates are processed one at a time
+            single, single_mask = t[..., :1, :, :, :], mask[..., :1, :, :]
+            block = self.blocks[0]
+            representative_fns = {
+                "tri_att": (
+                    partial(
+                        block.tri_att_start, mask=single_mask, use_lma=use_lma
+                    ),
+                    (single,),
+                ),
+                "pair_transition": (
+                    partial(
+                        block.pair_transition, 
+                        mask=single_mask if _mask_trans else None,
+                    ),
+                    (single,),
+                ),
+            }
+
+        chunk_sizes = resolve_chunk_sizes(
+            chunk_size,
+            self.chunk_sizes,
+            planner=self.chunk_size_planner,
+            planner_args=(None, t[..., 0, :, :, :]),
+            tuners=self.chunk_size_tuners,
+            representative_fns=representative_fns,
+        )
+        if(chunk_sizes is not None):
+            blocks = [partial(b, chunk_sizes=chunk_sizes) for b in blocks]
 
         t, = checkpoint_blocks(
             blocks=blocks,
@@ -408,7 +485,8 @@ def embed_templates_offload(
         batch: 
             An AlphaFold input batch. See documentation of AlphaFold.
         z: 
-            A [*, N, N, C_z] pair embedding
+            A [*, N, N, C_z] pair embedding. May be kept in host memory, in 
+            which case it is streamed to the device in chunks
         pair_mask: 
             A [*, N, N] pair mask
         templ_dim: 
@@ -461,14 +539,18 @@ def embed_templates_offload(
         del t
 
     # Preallocate the output tensor
-    t = z.new_zeros(z.shape)
+    t = torch.zeros(z.shape, dtype=z.dtype, device=pair_mask.device)
 
     for i in range(0, n, template_chunk_size):
         pair_chunks = [
             p[..., i: i + template_chunk_size, :, :] for p in pair_embeds_cpu
         ]
-        pair_chunk = torch.cat(pair_chunks, dim=templ_dim).to(device=z.device)
-        z_chunk = z[..., i: i + template_chunk_size, :, :]
+        pair_chunk = torch.cat(pair_chunks, dim=templ_dim).to(
+            device=pair_mask.device
+        )
+        z_chunk = z[..., i: i + template_chunk_size, :, :].to(
+            device=pair_mask.device
+        )
         att_chunk = model.template_pointwise_att(
             pair_chunk,
             z_chunk,
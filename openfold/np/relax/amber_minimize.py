@@ -15,6 +15,7 @@
 
 """Restrained Amber Minimization of a structure."""
 
+import functools
 import io
 import time
 from typing import Collection, Optional, Sequence
@@ -76,6 +77,17 @@ def _add_restraints(
     system.addForce(force)
 
 
+@functools.lru_cache(maxsize=None)
+def get_force_field(name: str = "amber99sb.xml") -> openmm_app.ForceField:
+    """Loads an OpenMM force field, once per process.
+
+    Parsing the force field XML accounts for a sizable fraction of the cost of
+    relaxing small proteins, and ForceField objects are not modified by
+    createSystem, so they can safely be shared between calls.
+    """
+    return openmm_app.ForceField(name)
+
+
 def _openmm_minimize(
     pdb_str: str,
     max_iterations: int,
@@ -90,7 +102,7 @@ def _openmm_minimize(
     pdb_file = io.StringIO(pdb_str)
     pdb = openmm_app.PDBFile(pdb_file)
 
-    force_field = openmm_app.ForceField("amber99sb.xml")
+    force_field = get_force_field()
     constraints = openmm_app.HBonds
     system = force_field.createSystem(pdb.topology, constraints=constraints)
     if stiffness > 0 * ENERGY / (LENGTH ** 2):
@@ -383,6 +395,7 @@ def find_violations(prot_np: protein.Protein):
             {
                 "violation_tolerance_factor": 12,  # Taken from model config.
                 "clash_overlap_tolerance": 1.5,  # Taken from model config.
+                "sparse_clashes": True,
             }
         ),
     )
@@ -596,7 +609,7 @@ def get_initial_energies(
     openmm_pdbs = [
         openmm_app.PDBFile(PdbStructure(io.StringIO(p))) for p in pdb_strs
     ]
-    force_field = openmm_app.ForceField("amber99sb.xml")
+    force_field = get_force_field()
     system = force_field.createSystem(
         openmm_pdbs[0].topology, constraints=openmm_app.HBonds
     )
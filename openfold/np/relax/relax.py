@@ -14,7 +14,12 @@
 # limitations under the License.
 
 """Amber relaxation."""
-from typing import Any, Dict, Sequence, Tuple
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+from typing import Any, Dict, Hashable, Iterator, Optional, Sequence, Tuple
 from openfold.np import protein
 from openfold.np.relax import amber_minimize, utils
 import numpy as np
@@ -93,3 +98,140 @@ class AmberRelaxation(object):
             min_pdb = '\n'.join(['\n'.join(headers), min_pdb])
 
         return min_pdb, debug_data, violations
+
+
+def _relaxation_worker(relaxer_kwargs, device, in_queue, out_queue):
+    """Relaxes proteins from in_queue until it yields None."""
+    if device is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = device
+
+    relaxer = AmberRelaxation(**relaxer_kwargs)
+
+    # Load the force field up front. It's cached for the lifetime of the worker
+    amber_minimize.get_force_field()
+
+    while True:
+        item = in_queue.get()
+        if item is None:
+            break
+
+        key, prot = item
+        try:
+            out_queue.put((key, relaxer.process(prot=prot), None))
+        except Exception:
+            out_queue.put((key, None, traceback.format_exc()))
+
+
+class AmberRelaxationPool(object):
+    """Runs Amber relaxation in a pool of worker processes.
+
+    Proteins are submitted through a queue and relaxed concurrently, each
+    worker reusing its own force field across targets, so that relaxation
+    throughput scales with the number of CPU cores and doesn't block the
+    caller (e.g. model inference). Results are streamed back in order of
+    completion.
+    """
+    def __init__(
+        self,
+        *,
+        num_workers: int,
+        devices: Optional[Sequence[str]] = None,
+        start_method: str = "spawn",
+        **relaxer_kwargs,
+    ):
+        """Starts the worker processes.
+
+        Args:
+          num_workers: Number of worker processes.
+          devices: Optional CUDA device numbers (as in CUDA_VISIBLE_DEVICES),
+            assigned to the workers in round-robin fashion. Only relevant if
+            use_gpu is set.
+          start_method: multiprocessing start method of the workers. OpenMM
+            (and CUDA) state doesn't survive forking, so this should only be
+            changed if neither has been initialized in the parent process.
+          **relaxer_kwargs: Arguments of AmberRelaxation.
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers must be positive")
+
+        context = multiprocessing.get_context(start_method)
+        self._in_queue = context.Queue()
+        self._out_queue = context.Queue()
+        self._num_pending = 0
+        self._lock = threading.Lock()
+
+        self._workers = []
+        for i in range(num_workers):
+            device = devices[i % len(devices)] if devices else None
+            worker = context.Process(
+                target=_relaxation_worker,
+                args=(relaxer_kwargs, device, self._in_queue, self._out_queue),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def num_pending(self) -> int:
+        """Number of submitted proteins whose results haven't been returned."""
+        return self._num_pending
+
+    def submit(self, key: Hashable, prot: protein.Protein):
+        """Queues a protein for relaxation.
+
+        Args:
+          key: Picklable identifier returned alongside the result.
+          prot: The protein to relax.
+        """
+        with self._lock:
+            self._num_pending += 1
+        self._in_queue.put((key, prot))
+
+    def results(
+        self, wait: bool = True
+    ) -> Iterator[Tuple[Hashable, Tuple[str, Dict[str, Any], np.ndarray]]]:
+        """Yields (key, output of AmberRelaxation.process) for finished proteins.
+
+        Args:
+          wait: Whether to block until all submitted proteins are relaxed.
+            Otherwise, only results that are already available are yielded.
+        """
+        while self._num_pending > 0:
+            try:
+                key, result, error = self._out_queue.get(
+                    block=wait, timeout=1. if wait else None
+                )
+            except queue.Empty:
+                if not wait:
+                    return
+                if not all(w.is_alive() for w in self._workers):
+                    raise RuntimeError("An Amber relaxation worker died")
+                continue
+
+            with self._lock:
+                self._num_pending -= 1
+
+            if error is not None:
+                raise RuntimeError(f"Relaxation of {key} failed:\n{error}")
+
+            yield key, result
+
+    def close(self):
+        """Stops the workers.
+
+        Proteins whose results haven't been collected with results() by then
+        are discarded.
+        """
+        for _ in self._workers:
+            self._in_queue.put(None)
+        for worker in self._workers:
+            # Workers can't exit while their results are left unread
+            if self._num_pending > 0:
+                worker.terminate()
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
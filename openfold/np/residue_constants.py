@@ -1027,6 +1027,13 @@ ID_TO_HHBLITS_AA = {
     21: "-",
 }
 
+# Byte-indexed version of HHBLITS_AA_TO_ID, for translating whole alignments
+# at once. Characters without an HHblits ID are mapped to -1.
+HHBLITS_AA_TO_ID_TABLE = np.full((256,), -1, dtype=np.int8)
+for _res, _id in HHBLITS_AA_TO_ID.items():
+    HHBLITS_AA_TO_ID_TABLE[ord(_res)] = _id
+del _res, _id
+
 restypes_with_x_and_gap = restypes + ["X", "-"]
 MAP_HHBLITS_AATYPE_TO_OUR_AATYPE = tuple(
     restypes_with_x_and_gap.index(ID_TO_HHBLITS_AA[i])
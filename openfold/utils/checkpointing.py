@@ -12,16 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+import logging
 import deepspeed
 import torch
 import torch.utils.checkpoint
-from typing import Any, Tuple, List, Callable, Optional
+from typing import (
+    Any, Collection, Dict, Tuple, List, Callable, Optional, Sequence
+)
 
 
 BLOCK_ARG = Any
 BLOCK_ARGS = List[BLOCK_ARG]
 
 
+def _wrap(a):
+    return (a,) if type(a) is not tuple else a
+
+
+def _exec(b, a):
+    for block in b:
+        a = _wrap(block(*a))
+    return a
+
+
 def get_checkpoint_fn():
     if(deepspeed.checkpointing.is_configured()):
         checkpoint = deepspeed.checkpointing.checkpoint
@@ -56,25 +70,17 @@ def checkpoint_blocks(
     Returns:
         The output of the final block
     """
-    def wrap(a):
-        return (a,) if type(a) is not tuple else a
-
-    def exec(b, a):
-        for block in b:
-            a = wrap(block(*a))
-        return a
-
     def chunker(s, e):
         def exec_sliced(*a):
-            return exec(blocks[s:e], a)
+            return _exec(blocks[s:e], a)
 
         return exec_sliced
 
     # Avoids mishaps when the blocks take just one argument
-    args = wrap(args)
+    args = _wrap(args)
 
     if blocks_per_ckpt is None or not torch.is_grad_enabled():
-        return exec(blocks, args)
+        return _exec(blocks, args)
     elif blocks_per_ckpt < 1 or blocks_per_ckpt > len(blocks):
         raise ValueError("blocks_per_ckpt must be between 1 and len(blocks)")
 
@@ -83,6 +89,236 @@ def checkpoint_blocks(
     for s in range(0, len(blocks), blocks_per_ckpt):
         e = s + blocks_per_ckpt
         args = checkpoint(chunker(s, e), *args)
-        args = wrap(args)
+        args = _wrap(args)
 
     return args
+
+
+@torch.jit.ignore
+def checkpoint_sub_blocks(
+    blocks: Sequence[Sequence[Tuple[str, Callable]]],
+    args: BLOCK_ARGS,
+    ckpt_modules: Collection[str],
+) -> BLOCK_ARGS:
+    """
+    Runs a list of blocks, each given as a sequence of named steps, 
+    checkpointing only the steps whose names appear in ckpt_modules. Like
+    the blocks of checkpoint_blocks, each step takes the outputs of the
+    previous one as its only inputs. Consecutive checkpointed steps of the
+    same block share a single checkpoint, so that only the inputs of the
+    first step of the run are stored.
+
+    Args:
+        blocks:
+            List of blocks, each a list of (name, step) pairs
+        args:
+            Tuple of arguments for the first step
+        ckpt_modules:
+            Names of the steps to checkpoint
+    Returns:
+        The output of the final step
+    """
+    # Avoids mishaps when the steps take just one argument
+    args = _wrap(args)
+
+    if(len(ckpt_modules) == 0 or not torch.is_grad_enabled()):
+        for steps in blocks:
+            args = _exec([fn for _, fn in steps], args)
+        return args
+
+    checkpoint = get_checkpoint_fn()
+
+    def chunker(steps):
+        def exec_sliced(*a):
+            return _exec(steps, a)
+
+        return exec_sliced
+
+    for steps in blocks:
+        s = 0
+        while s < len(steps):
+            e = s + 1
+            if(steps[s][0] not in ckpt_modules):
+                args = _exec([steps[s][1]], args)
+            else:
+                while e < len(steps) and steps[e][0] in ckpt_modules:
+                    e += 1
+                fns = [fn for _, fn in steps[s:e]]
+                args = _wrap(checkpoint(chunker(fns), *args))
+            s = e
+
+    return args
+
+
+def offload_saved_tensors(enabled: bool = True):
+    """
+    Returns a context manager in which tensors saved for the backward pass
+    (including the inputs of activation checkpoints) are kept in pinned
+    CPU memory rather than on the GPU. Trades host-device transfers for
+    GPU memory.
+
+    Args:
+        enabled:
+            Whether to offload. If False, a no-op context is returned
+    """
+    if(not enabled or not torch.is_grad_enabled()):
+        return contextlib.nullcontext()
+
+    return torch.autograd.graph.save_on_cpu(
+        pin_memory=torch.cuda.is_available()
+    )
+
+
+def estimate_activation_memory(
+    n_res: int,
+    n_seq: int,
+    c_m: int,
+    c_z: int,
+    c_hidden_msa_att: int,
+    c_hidden_opm: int,
+    c_hidden_mul: int,
+    c_hidden_pair_att: int,
+    no_heads_msa: int,
+    no_heads_pair: int,
+    transition_n: int,
+    itemsize: int = 4,
+    **kwargs,
+) -> Dict[str, int]:
+    """
+    Roughly estimates the memory (in bytes) of the activations each module
+    of a single Evoformer block saves for the backward pass during
+    training, keyed by the names in CHUNKED_MODULES. Both triangular
+    updates (and both triangular attention modules) are counted under the
+    same name.
+
+    Args:
+        n_res:
+            Number of residues (i.e. the crop size)
+        n_seq:
+            Number of MSA sequences
+        itemsize:
+            Size of each activation element in bytes
+        **kwargs:
+            Ignored, so that an Evoformer stack config can be passed as-is
+    Returns:
+        A dictionary of per-module activation sizes
+    """
+    s, n = n_seq, n_res
+    msa = s * n * c_m
+    pair = n * n * c_z
+
+    act = {
+        # Layer norm, q, k, v and gate, output and dropout, logits and
+        # probabilities, pair bias
+        "msa_att_row": (
+            2 * msa + 5 * s * n * no_heads_msa * c_hidden_msa_att + 
+            2 * s * no_heads_msa * n * n + no_heads_msa * n * n
+        ),
+        "msa_att_col": (
+            2 * msa + 5 * s * n * no_heads_msa * c_hidden_msa_att +
+            2 * n * no_heads_msa * s * s
+        ),
+        "msa_transition": msa + 2 * transition_n * msa,
+        "outer_product_mean": (
+            msa + 2 * s * n * c_hidden_opm + n * n * c_hidden_opm ** 2 + pair
+        ),
+        # Layer norms, projections and gates, product and output gate
+        "tri_mul": 2 * (3 * pair + 8 * n * n * c_hidden_mul),
+        "tri_att": 2 * (
+            2 * pair + 5 * n * n * no_heads_pair * c_hidden_pair_att + 
+            2 * n * no_heads_pair * n * n + no_heads_pair * n * n
+        ),
+        "pair_transition": pair + 2 * transition_n * pair,
+    }
+
+    return {k: v * itemsize for k, v in act.items()}
+
+
+def choose_checkpoint_policy(
+    memory_budget: float,
+    n_res: int,
+    n_seq: int,
+    no_blocks: int,
+    itemsize: int = 4,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Picks the activation checkpointing policy of an Evoformer stack with
+    the least recomputation whose estimated activation memory fits in a
+    budget. In order of increasing recomputation (and decreasing memory),
+    the candidates are:
+
+        1. No checkpointing
+        2. Checkpointing some modules of each block individually, adding 
+           modules from largest to smallest activations
+        3. Checkpointing every block
+        4. Checkpointing every block and offloading the checkpointed
+           activations to CPU memory
+
+    If nothing fits, the last option is returned.
+
+    Args:
+        memory_budget:
+            Memory budget (in GiB) for the activations of the stack
+        n_res:
+            Number of residues (i.e. the crop size)
+        n_seq:
+            Number of MSA sequences
+        no_blocks:
+            Number of blocks in the stack
+        itemsize:
+            Size of each activation element in bytes
+        **kwargs:
+            Channel dimensions of the stack, as accepted by
+            estimate_activation_memory
+    Returns:
+        A dictionary with keys "ckpt_modules" and "ckpt_offload", the
+        corresponding arguments of EvoformerStack. A ckpt_modules of None
+        indicates that whole blocks should be checkpointed.
+    """
+    budget = memory_budget * 2 ** 30
+    act = estimate_activation_memory(
+        n_res=n_res, n_seq=n_seq, itemsize=itemsize, **kwargs
+    )
+    block_act = sum(act.values())
+
+    # Each checkpoint stores the MSA and pair representations
+    stream = (n_seq * n_res * kwargs["c_m"] + n_res ** 2 * kwargs["c_z"])
+    stream *= itemsize
+
+    def sub_block_memory(ckpt_modules):
+        # Consecutive checkpointed modules share a checkpoint, which is
+        # recomputed all at once
+        runs = [[]]
+        for k in act:
+            if(k in ckpt_modules):
+                runs[-1].append(act[k])
+            elif(len(runs[-1]) > 0):
+                runs.append([])
+        runs = [r for r in runs if len(r) > 0]
+
+        kept = sum(v for k, v in act.items() if k not in ckpt_modules)
+        recompute = max(sum(r) for r in runs)
+        return no_blocks * (kept + len(runs) * stream) + recompute
+
+    candidates = [([], False, no_blocks * block_act)]
+
+    ckpt_modules = []
+    for k in sorted(act, key=lambda k: act[k], reverse=True)[:-1]:
+        ckpt_modules.append(k)
+        mem = sub_block_memory(ckpt_modules)
+        candidates.append((list(ckpt_modules), False, mem))
+
+    candidates.append((None, False, no_blocks * stream + block_act))
+    candidates.append((None, True, stream + block_act))
+
+    for ckpt_modules, offload, mem in candidates:
+        if(mem <= budget):
+            break
+    else:
+        logging.warning(
+            f"Estimated activation memory ({mem / 2 ** 30:.2f} GiB) exceeds "
+            f"the budget of {memory_budget} GiB"
+        )
+
+    return {"ckpt_modules": ckpt_modules, "ckpt_offload": offload}
@@ -0,0 +1,473 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import math
+import os
+import tempfile
+from functools import reduce
+from operator import mul
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+import torch
+
+
+# Modules with independent inference-time chunk sizes. Pair-only stacks
+# (e.g. the template pair stack) only use PAIR_MODULES
+MSA_MODULES = (
+    "msa_att_row",
+    "msa_att_col",
+    "msa_transition",
+    "outer_product_mean",
+)
+PAIR_MODULES = (
+    "tri_mul",
+    "tri_att",
+    "pair_transition",
+)
+CHUNKED_MODULES = MSA_MODULES + PAIR_MODULES
+
+
+def get_module_chunk_size(
+    chunk_sizes: Optional[Dict[str, int]],
+    module: str,
+    default: Optional[int],
+) -> Optional[int]:
+    """
+        Looks up the chunk size of a module in a dictionary of per-module
+        chunk sizes (keyed by the names in CHUNKED_MODULES), falling back to
+        the default. If the default is None, chunking is disabled and
+        remains so.
+    """
+    if(default is None or chunk_sizes is None):
+        return default
+    if(module not in chunk_sizes):
+        return default
+    return chunk_sizes[module]
+
+
+def get_available_memory(device: torch.device) -> int:
+    """
+        Returns the number of bytes that can still be allocated on the
+        device, including memory cached by PyTorch's allocator. For CPU
+        devices, this is the available host RAM.
+    """
+    device = torch.device(device)
+    if(device.type == "cuda"):
+        free, _ = torch.cuda.mem_get_info(device)
+        cached = (
+            torch.cuda.memory_reserved(device) -
+            torch.cuda.memory_allocated(device)
+        )
+        return free + cached
+
+    try:
+        with open("/proc/meminfo", "r") as fp:
+            for line in fp:
+                if(line.startswith("MemAvailable:")):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+class ChunkSizePlanner:
+    """
+        Picks inference-time chunk sizes for the modules of an Evoformer-like
+        stack from an analytic model of their peak activation memory.
+
+        Unlike ChunkSizeTuner, which runs the stack with candidate chunk
+        sizes until it stops running out of memory, the planner never
+        executes the model: it estimates the transient memory each module
+        allocates for a given chunk size from N_seq, N_res and the module's
+        channel dimensions, and selects the largest power-of-two chunk size
+        that fits within the memory budget. Estimates are deliberately
+        conservative (they ignore in-place tricks and LMA).
+
+        Plans can be persisted to a JSON file keyed by the input shapes, the
+        device, the dtype and the module dimensions, so that subsequent runs
+        skip planning altogether.
+    """
+    def __init__(self,
+        c_z: int,
+        c_hidden_mul: int,
+        c_hidden_pair_att: int,
+        no_heads_pair: int,
+        transition_n: int,
+        c_m: Optional[int] = None,
+        c_hidden_msa_att: Optional[int] = None,
+        no_heads_msa: Optional[int] = None,
+        c_hidden_opm: Optional[int] = None,
+        global_msa_col_att: bool = False,
+        max_chunk_size: int = 256,
+        memory_budget: Optional[float] = None,
+        cache_path: Optional[str] = None,
+        headroom: float = 0.8,
+    ):
+        """
+            Args:
+                c_z:
+                    Pair channel dimension
+                c_hidden_mul:
+                    Hidden dimension of the triangular multiplicative updates
+                c_hidden_pair_att:
+                    Per-head hidden dimension of the triangular attention
+                no_heads_pair:
+                    Number of triangular attention heads
+                transition_n:
+                    Transition expansion factor
+                c_m:
+                    MSA channel dimension. If None, the stack is assumed to
+                    be pair-only and MSA modules are not planned
+                c_hidden_msa_att:
+                    Per-head hidden dimension of the MSA attention
+                no_heads_msa:
+                    Number of MSA attention heads
+                c_hidden_opm:
+                    Hidden dimension of the outer product mean
+                global_msa_col_att:
+                    Whether MSA column attention is global (as in the extra
+                    MSA stack)
+                max_chunk_size:
+                    Largest chunk size considered
+                memory_budget:
+                    Memory budget in GiB. If None, the memory available on
+                    the device (or the host, for CPU runs) is used
+                cache_path:
+                    Optional path of a JSON file in which plans are persisted
+                headroom:
+                    Fraction of the available memory the planner may use.
+                    Leaves room for allocator fragmentation
+        """
+        self.c_z = c_z
+        self.c_hidden_mul = c_hidden_mul
+        self.c_hidden_pair_att = c_hidden_pair_att
+        self.no_heads_pair = no_heads_pair
+        self.transition_n = transition_n
+        self.c_m = c_m
+        self.c_hidden_msa_att = c_hidden_msa_att
+        self.no_heads_msa = no_heads_msa
+        self.c_hidden_opm = c_hidden_opm
+        self.global_msa_col_att = global_msa_col_att
+        self.max_chunk_size = max_chunk_size
+        self.memory_budget = memory_budget
+        self.cache_path = cache_path
+        self.headroom = headroom
+
+        self.modules = PAIR_MODULES
+        if(c_m is not None):
+            self.modules = CHUNKED_MODULES
+
+        self.cached_key = None
+        self.cached_plan = None
+
+    def estimate_memory(self,
+        module: str,
+        chunk_size: int,
+        n_seq: int,
+        n_res: int,
+        batch_size: int = 1,
+        itemsize: int = 4,
+    ) -> int:
+        """
+            Estimates the peak transient memory, in bytes, allocated by a
+            module on top of its (already allocated) inputs.
+
+            Args:
+                module:
+                    One of MSA_MODULES or PAIR_MODULES
+                chunk_size:
+                    Chunk size along the module's chunked dimension
+                n_seq:
+                    MSA depth
+                n_res:
+                    Number of residues
+                batch_size:
+                    Product of the batch dimensions
+                itemsize:
+                    Size of an activation element in bytes
+            Returns:
+                The estimate, in bytes
+        """
+        s, n = n_seq, n_res
+        c_z, n_trans = self.c_z, self.transition_n
+
+        if(module == "msa_att_row"):
+            # Chunked along N_seq. The pair bias is computed once
+            c = min(chunk_size, s)
+            h, c_h = self.no_heads_msa, self.c_hidden_msa_att
+            fixed = 2 * s * n * self.c_m + n * n * c_z + h * n * n
+            chunked = (
+                5 * c * n * h * c_h +
+                2 * c * h * n * n +
+                c * n * self.c_m
+            )
+        elif(module == "msa_att_col"):
+            # Chunked along N_res
+            c = min(chunk_size, n)
+            h, c_h = self.no_heads_msa, self.c_hidden_msa_att
+            fixed = 3 * s * n * self.c_m
+            if(self.global_msa_col_att):
+                chunked = (
+                    c * s * h * c_h +
+                    3 * c * s * c_h +
+                    2 * c * h * s +
+                    c * s * self.c_m
+                )
+            else:
+                chunked = (
+                    5 * c * s * h * c_h +
+                    2 * c * h * s * s +
+                    c * s * self.c_m
+                )
+        elif(module == "msa_transition"):
+            # Chunked along N_seq
+            c = min(chunk_size, s)
+            fixed = 2 * s * n * self.c_m
+            chunked = 2 * c * n * n_trans * self.c_m
+        elif(module == "outer_product_mean"):
+            # Chunked along the first N_res dimension of the outer product
+            c = min(chunk_size, n)
+            c_h = self.c_hidden_opm
+            fixed = s * n * self.c_m + 2 * s * n * c_h + n * n * c_z
+            chunked = c * n * c_h * c_h + c * n * c_z
+        elif(module == "tri_mul"):
+            # See TriangleMultiplicativeUpdate._inference_forward. Chunked
+            # along N_res
+            c = min(chunk_size, n)
+            c_h = self.c_hidden_mul
+            fixed = n * n * c_h + (n // 2) * n * c_z
+            chunked = 3 * c * n * c_h + 2 * c * n * c_z
+        elif(module == "tri_att"):
+            # Chunked along N_res
+            c = min(chunk_size, n)
+            h, c_h = self.no_heads_pair, self.c_hidden_pair_att
+            fixed = 2 * n * n * c_z + h * n * n
+            chunked = (
+                5 * c * n * h * c_h +
+                2 * c * h * n * n +
+                c * n * c_z
+            )
+        elif(module == "pair_transition"):
+            # Chunked along N_res
+            c = min(chunk_size, n)
+            fixed = 2 * n * n * c_z
+            chunked = 2 * c * n * n_trans * c_z
+        else:
+            raise ValueError(f"Unknown module: {module}")
+
+        return (fixed + chunked) * batch_size * itemsize
+
+    def _get_budget(self, device: torch.device) -> int:
+        if(self.memory_budget is not None):
+            return int(self.memory_budget * 2 ** 30)
+
+        return int(get_available_memory(device) * self.headroom)
+
+    def _get_key(self,
+        n_seq, n_res, batch_size, dtype, device, budget, min_chunk_size
+    ):
+        device = torch.device(device)
+        device_name = device.type
+        if(device.type == "cuda"):
+            device_name = torch.cuda.get_device_name(device)
+
+        return json.dumps([
+            n_seq,
+            n_res,
+            batch_size,
+            str(dtype),
+            device_name,
+            # Small fluctuations in available memory shouldn't invalidate
+            # the cache
+            budget // 2 ** 30,
+            min_chunk_size,
+            self.max_chunk_size,
+            [
+                self.c_m, self.c_z, self.c_hidden_msa_att, self.no_heads_msa,
+                self.c_hidden_opm, self.c_hidden_mul, self.c_hidden_pair_att,
+                self.no_heads_pair, self.transition_n, self.global_msa_col_att,
+            ],
+        ])
+
+    def _load_cache(self) -> Dict[str, Dict[str, int]]:
+        if(self.cache_path is None or not os.path.isfile(self.cache_path)):
+            return {}
+
+        try:
+            with open(self.cache_path, "r") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            logging.warning(
+                f"Ignoring unreadable chunk size cache {self.cache_path}"
+            )
+            return {}
+
+    def _save_cache(self, key: str, plan: Dict[str, int]):
+        cache = self._load_cache()
+        cache[key] = plan
+
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(cache, fp, indent=1)
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            if(os.path.exists(tmp_path)):
+                os.remove(tmp_path)
+            raise
+
+    def _determine_chunk_sizes(self,
+        n_seq: int,
+        n_res: int,
+        batch_size: int,
+        itemsize: int,
+        budget: int,
+        min_chunk_size: int,
+    ) -> Dict[str, int]:
+        candidates = [
+            2**l for l in range(int(math.log(self.max_chunk_size, 2)) + 1)
+        ]
+        candidates = [c for c in candidates if c > min_chunk_size]
+        candidates = [min_chunk_size] + candidates
+
+        plan = {}
+        for module in self.modules:
+            # Memory use is monotonic in the chunk size
+            chunk_size = candidates[0]
+            for c in candidates[1:]:
+                mem = self.estimate_memory(
+                    module, c, n_seq, n_res, batch_size, itemsize
+                )
+                if(mem > budget):
+                    break
+                chunk_size = c
+
+            plan[module] = chunk_size
+
+        return plan
+
+    def plan(self,
+        m: Optional[torch.Tensor],
+        z: torch.Tensor,
+        min_chunk_size: int,
+    ) -> Dict[str, int]:
+        """
+            Plans chunk sizes for the modules of the stack.
+
+            Args:
+                m:
+                    [*, N_seq, N_res, C_m] MSA embedding, or None for
+                    pair-only stacks
+                z:
+                    [*, N_res, N_res, C_z] pair embedding
+                min_chunk_size:
+                    Smallest permissible chunk size
+            Returns:
+                A dictionary mapping module names to chunk sizes
+        """
+        n_res = z.shape[-2]
+        n_seq = m.shape[-3] if m is not None else 0
+        batch_size = reduce(mul, z.shape[:-3], 1)
+        itemsize = torch.finfo(z.dtype).bits // 8
+
+        budget = self._get_budget(z.device)
+        key = self._get_key(
+            n_seq, n_res, batch_size, z.dtype, z.device, budget,
+            min_chunk_size,
+        )
+
+        if(key == self.cached_key):
+            return self.cached_plan
+
+        plan = self._load_cache().get(key, None)
+        if(plan is None):
+            plan = self._determine_chunk_sizes(
+                n_seq, n_res, batch_size, itemsize, budget, min_chunk_size
+            )
+            logging.info(f"Planned chunk sizes: {plan}")
+            if(self.cache_path is not None):
+                self._save_cache(key, plan)
+
+        self.cached_key = key
+        self.cached_plan = plan
+
+        return plan
+
+
+def resolve_chunk_sizes(
+    chunk_size: Optional[int],
+    chunk_size_overrides: Mapping[str, int],
+    planner: Optional[ChunkSizePlanner] = None,
+    planner_args: Tuple[Any, ...] = (),
+    tuners: Optional[Mapping[str, Any]] = None,
+    representative_fns: Optional[
+        Mapping[str, Tuple[Callable, Tuple[Any, ...]]]
+    ] = None,
+) -> Optional[Dict[str, int]]:
+    """
+        Determines the per-module chunk sizes of a stack.
+
+        Per-module overrides, like the global chunk size, act as minima when
+        chunk sizes are planned or tuned. Modules missing from the returned
+        dictionary fall back to the chunk sizes passed to their block.
+
+        Args:
+            chunk_size:
+                The stack's global chunk size. If None, chunking is disabled
+                and None is returned
+            chunk_size_overrides:
+                User-specified chunk sizes, keyed by module name
+            planner:
+                An optional ChunkSizePlanner
+            planner_args:
+                The (m, z) arguments of ChunkSizePlanner.plan
+            tuners:
+                Optional dictionary of ChunkSizeTuners, keyed by module name.
+                Ignored if a planner is provided
+            representative_fns:
+                Dictionary mapping module names to (fn, args) pairs, where
+                fn(*args, chunk_size=chunk_size) runs the module
+        Returns:
+            A dictionary mapping module names to chunk sizes
+    """
+    if(chunk_size is None):
+        return None
+
+    chunk_sizes = dict(chunk_size_overrides)
+    if(planner is not None):
+        plan = planner.plan(*planner_args, min_chunk_size=chunk_size)
+        for module, planned in plan.items():
+            chunk_sizes[module] = max(
+                planned, chunk_sizes.get(module, planned)
+            )
+    elif(tuners is not None):
+        for module, (fn, args) in representative_fns.items():
+            min_chunk_size = chunk_sizes.get(module, chunk_size)
+            tuned = tuners[module].tune_chunk_size(
+                representative_fn=fn,
+                args=args,
+                min_chunk_size=min_chunk_size,
+            )
+            if(module in ("msa_att_row", "tri_att")):
+                # A temporary measure to address torch's occasional
+                # inability to allocate large tensors
+                tuned = max(min_chunk_size, tuned // 2)
+            chunk_sizes[module] = tuned
+
+    return chunk_sizes
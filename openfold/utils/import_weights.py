@@ -16,6 +16,11 @@
 from enum import Enum
 from dataclasses import dataclass
 from functools import partial
+import hashlib
+import json
+import os
+import tempfile
+
 import numpy as np
 import torch
 from typing import Union, List
@@ -447,3 +452,66 @@ def import_jax_weights_(model, npz_path, version="model_1"):
 
     # Set weights
     assign(flat, data)
+
+
+def convert_jax_weights(model, npz_path, version="model_1", cache_dir=None):
+    """
+        Imports JAX weights into the model and returns a copy of its CPU
+        state dict.
+
+        Translating the .npz parameters is slow. If cache_dir is provided,
+        the translated state dict is saved there as a .pt file, keyed on the
+        .npz file, the version and the parameter shapes of the model, and
+        subsequent calls load it directly.
+
+        Args:
+            model:
+                An AlphaFold model
+            npz_path:
+                Path to the JAX parameters
+            version:
+                Name of the model preset the parameters belong to
+            cache_dir:
+                Directory for the translated parameters
+        Returns:
+            The translated state dict. The model's own parameters are
+            updated as well.
+    """
+    cache_path = None
+    if(cache_dir is not None):
+        stat = os.stat(npz_path)
+        key = json.dumps([
+            os.path.abspath(npz_path),
+            stat.st_size,
+            stat.st_mtime_ns,
+            version,
+            [(k, list(v.shape)) for k, v in model.state_dict().items()],
+        ])
+        key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        basename = os.path.splitext(os.path.basename(npz_path))[0]
+        cache_path = os.path.join(cache_dir, f"{basename}_{key[:16]}.pt")
+
+        if(os.path.isfile(cache_path)):
+            state_dict = torch.load(cache_path, map_location="cpu")
+            model.load_state_dict(state_dict)
+            return state_dict
+
+    import_jax_weights_(model, npz_path, version=version)
+    state_dict = {
+        k: v.detach().to("cpu", copy=True)
+        for k, v in model.state_dict().items()
+    }
+
+    if(cache_path is not None):
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                torch.save(state_dict, fp)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            if(os.path.exists(tmp_path)):
+                os.remove(tmp_path)
+            raise
+
+    return state_dict
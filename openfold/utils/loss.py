@@ -14,6 +14,7 @@
 # limitations under the License.
 
 from functools import partial
+import itertools
 import logging
 import ml_collections
 import numpy as np
@@ -385,6 +386,17 @@ def compute_plddt(logits: torch.Tensor) -> torch.Tensor:
     return pred_lddt_ca * 100
 
 
+# Pairwise computations over more residues than this are chunked by default
+_AUTO_CHUNK_THRESHOLD = 512
+_AUTO_CHUNK_SIZE = 128
+
+
+def _get_pairwise_chunk_size(n: int, chunk_size: Optional[int]):
+    if(chunk_size is None and n > _AUTO_CHUNK_THRESHOLD):
+        chunk_size = _AUTO_CHUNK_SIZE
+    return chunk_size
+
+
 def lddt(
     all_atom_pred_pos: torch.Tensor,
     all_atom_positions: torch.Tensor,
@@ -392,51 +404,81 @@ def lddt(
     cutoff: float = 15.0,
     eps: float = 1e-10,
     per_residue: bool = True,
+    chunk_size: Optional[int] = None,
 ) -> torch.Tensor:
+    """
+        Computes lDDT scores.
+
+        Args:
+            all_atom_pred_pos:
+                [*, N, 3] predicted positions
+            all_atom_positions:
+                [*, N, 3] ground truth positions
+            all_atom_mask:
+                [*, N, 1] position mask
+            cutoff:
+                Inclusion radius
+            per_residue:
+                Whether to return per-residue scores or a single score
+            chunk_size:
+                If provided, distances are computed chunk_size rows at a 
+                time, bounding memory usage. Chosen automatically for large
+                N if not provided
+        Returns:
+            [*, N] or [*] lDDT scores
+    """
     n = all_atom_mask.shape[-2]
-    dmat_true = torch.sqrt(
-        eps
-        + torch.sum(
-            (
-                all_atom_positions[..., None, :]
-                - all_atom_positions[..., None, :, :]
+    chunk_size = _get_pairwise_chunk_size(n, chunk_size)
+    if(chunk_size is None):
+        chunk_size = n
+
+    def dmat(x, x_rows):
+        return torch.sqrt(
+            eps
+            + torch.sum(
+                (x_rows[..., None, :] - x[..., None, :, :]) ** 2,
+                dim=-1,
             )
-            ** 2,
-            dim=-1,
         )
-    )
 
-    dmat_pred = torch.sqrt(
-        eps
-        + torch.sum(
-            (
-                all_atom_pred_pos[..., None, :]
-                - all_atom_pred_pos[..., None, :, :]
-            )
-            ** 2,
-            dim=-1,
+    norm_sums = []
+    score_sums = []
+    for i in range(0, n, chunk_size):
+        rows = slice(i, i + chunk_size)
+        dmat_true = dmat(all_atom_positions, all_atom_positions[..., rows, :])
+        dmat_pred = dmat(all_atom_pred_pos, all_atom_pred_pos[..., rows, :])
+
+        row_idx = torch.arange(n, device=all_atom_mask.device)[rows]
+        col_idx = torch.arange(n, device=all_atom_mask.device)
+        dists_to_score = (
+            (dmat_true < cutoff)
+            * all_atom_mask[..., rows, :]
+            * permute_final_dims(all_atom_mask, (1, 0))
+            * (row_idx[..., None] != col_idx).type(all_atom_mask.dtype)
         )
-    )
-    dists_to_score = (
-        (dmat_true < cutoff)
-        * all_atom_mask
-        * permute_final_dims(all_atom_mask, (1, 0))
-        * (1.0 - torch.eye(n, device=all_atom_mask.device))
-    )
 
-    dist_l1 = torch.abs(dmat_true - dmat_pred)
+        dist_l1 = torch.abs(dmat_true - dmat_pred)
 
-    score = (
-        (dist_l1 < 0.5).type(dist_l1.dtype)
-        + (dist_l1 < 1.0).type(dist_l1.dtype)
-        + (dist_l1 < 2.0).type(dist_l1.dtype)
-        + (dist_l1 < 4.0).type(dist_l1.dtype)
-    )
-    score = score * 0.25
+        score = (
+            (dist_l1 < 0.5).type(dist_l1.dtype)
+            + (dist_l1 < 1.0).type(dist_l1.dtype)
+            + (dist_l1 < 2.0).type(dist_l1.dtype)
+            + (dist_l1 < 4.0).type(dist_l1.dtype)
+        )
+        score = score * 0.25
+
+        norm_sums.append(torch.sum(dists_to_score, dim=-1))
+        score_sums.append(torch.sum(dists_to_score * score, dim=-1))
 
-    dims = (-1,) if per_residue else (-2, -1)
-    norm = 1.0 / (eps + torch.sum(dists_to_score, dim=dims))
-    score = norm * (eps + torch.sum(dists_to_score * score, dim=dims))
+    # [*, N]
+    norm_sum = torch.cat(norm_sums, dim=-1)
+    score_sum = torch.cat(score_sums, dim=-1)
+    if(not per_residue):
+        norm_sum = torch.sum(norm_sum, dim=-1)
+        score_sum = torch.sum(score_sum, dim=-1)
+
+    norm = 1.0 / (eps + norm_sum)
+    score = norm * (eps + score_sum)
 
     return score
 
@@ -448,6 +490,7 @@ def lddt_ca(
     cutoff: float = 15.0,
     eps: float = 1e-10,
     per_residue: bool = True,
+    chunk_size: Optional[int] = None,
 ) -> torch.Tensor:
     ca_pos = residue_constants.atom_order["CA"]
     all_atom_pred_pos = all_atom_pred_pos[..., ca_pos, :]
@@ -461,6 +504,7 @@ def lddt_ca(
         cutoff=cutoff,
         eps=eps,
         per_residue=per_residue,
+        chunk_size=chunk_size,
     )
 
 
@@ -475,6 +519,7 @@ def lddt_loss(
     min_resolution: float = 0.1,
     max_resolution: float = 3.0,
     eps: float = 1e-10,
+    chunk_size: Optional[int] = None,
     **kwargs,
 ) -> torch.Tensor:
     n = all_atom_mask.shape[-2]
@@ -489,7 +534,8 @@ def lddt_loss(
         all_atom_positions, 
         all_atom_mask, 
         cutoff=cutoff, 
-        eps=eps
+        eps=eps,
+        chunk_size=chunk_size,
     )
 
     score = score.detach()
@@ -524,6 +570,7 @@ def distogram_loss(
     max_bin=21.6875,
     no_bins=64,
     eps=1e-6,
+    chunk_size=None,
     **kwargs,
 ):
     boundaries = torch.linspace(
@@ -533,28 +580,45 @@ def distogram_loss(
         device=logits.device,
     )
     boundaries = boundaries ** 2
-    
-    dists = torch.sum(
-        (pseudo_beta[..., None, :] - pseudo_beta[..., None, :, :]) ** 2,
-        dim=-1,
-        keepdims=True,
-    )
 
-    true_bins = torch.sum(dists > boundaries, dim=-1)
+    # Distances and errors are computed chunk_size rows at a time
+    n = pseudo_beta.shape[-2]
+    chunk_size = _get_pairwise_chunk_size(n, chunk_size)
+    if(chunk_size is None):
+        chunk_size = n
 
-    errors = softmax_cross_entropy(
-        logits,
-        torch.nn.functional.one_hot(true_bins, no_bins),
-    )
+    denom = eps + torch.sum(pseudo_beta_mask, dim=-1) ** 2
+
+    row_sums = []
+    logits_chunks = torch.split(logits, chunk_size, dim=-3)
+    for i, logits_chunk in zip(range(0, n, chunk_size), logits_chunks):
+        rows = slice(i, i + chunk_size)
+        dists = torch.sum(
+            (
+                pseudo_beta[..., rows, None, :] 
+                - pseudo_beta[..., None, :, :]
+            ) ** 2,
+            dim=-1,
+            keepdims=True,
+        )
 
-    square_mask = pseudo_beta_mask[..., None] * pseudo_beta_mask[..., None, :]
+        true_bins = torch.sum(dists > boundaries, dim=-1)
 
-    # FP16-friendly sum. Equivalent to:
-    # mean = (torch.sum(errors * square_mask, dim=(-1, -2)) /
-    #         (eps + torch.sum(square_mask, dim=(-1, -2))))
-    denom = eps + torch.sum(square_mask, dim=(-1, -2))
-    mean = errors * square_mask
-    mean = torch.sum(mean, dim=-1)
+        errors = softmax_cross_entropy(
+            logits_chunk,
+            torch.nn.functional.one_hot(true_bins, no_bins),
+        )
+
+        square_mask = (
+            pseudo_beta_mask[..., rows, None] * pseudo_beta_mask[..., None, :]
+        )
+
+        # FP16-friendly sum. Equivalent to:
+        # mean = (torch.sum(errors * square_mask, dim=(-1, -2)) /
+        #         (eps + torch.sum(square_mask, dim=(-1, -2))))
+        row_sums.append(torch.sum(errors * square_mask, dim=-1))
+
+    mean = torch.cat(row_sums, dim=-1)
     mean = mean / denom[..., None]
     mean = torch.sum(mean, dim=-1)
 
@@ -1021,6 +1085,226 @@ def between_residue_clash_loss(
     }
 
 
+def _cell_list_pairs(
+    positions: torch.Tensor,
+    batch_idx: torch.Tensor,
+    cell_size: float,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Finds candidate pairs of nearby points with a cell list. Points are 
+    hashed into cubic cells of side cell_size, and each point is paired with
+    every point in its own and the 26 adjacent cells. All pairs of points
+    closer than cell_size are guaranteed to be found, along with some
+    farther ones.
+
+    Args:
+        positions:
+            [M, 3] point coordinates
+        batch_idx:
+            [M] batch index of each point. Points in different batches are
+            never paired
+        cell_size:
+            Side length of each cell
+    Returns:
+        Two [P] tensors of indices into positions. Each unordered pair 
+        appears in both orders, and each point is also paired with itself.
+    """
+    device = positions.device
+    no_points = positions.shape[0]
+
+    # [M, 3]
+    cells = torch.floor(positions.detach() / cell_size).long()
+    cells = cells - torch.min(cells, dim=0)[0] + 1
+    dims = torch.max(cells, dim=0)[0] + 2
+
+    def get_key(b, c):
+        return ((b * dims[0] + c[..., 0]) * dims[1] + c[..., 1]) * dims[2] + (
+            c[..., 2]
+        )
+
+    sorted_keys, order = torch.sort(get_key(batch_idx, cells))
+
+    # [27, 3]
+    offsets = torch.tensor(
+        list(itertools.product((-1, 0, 1), repeat=3)), device=device
+    )
+
+    # [M, 27]
+    neighbour_keys = get_key(batch_idx[..., None], cells[..., None, :] + offsets)
+    start = torch.searchsorted(sorted_keys, neighbour_keys)
+    end = torch.searchsorted(sorted_keys, neighbour_keys, right=True)
+
+    # Expand each (point, neighbouring cell) combination into the points in 
+    # the cell
+    counts = (end - start).reshape(-1)
+    start = start.reshape(-1).repeat_interleave(counts)
+    run_start = torch.cumsum(counts, dim=0) - counts
+    within_run = (
+        torch.arange(start.shape[0], device=device) - 
+        run_start.repeat_interleave(counts)
+    )
+
+    i = torch.arange(no_points, device=device).repeat_interleave(
+        offsets.shape[0]
+    )
+    i = i.repeat_interleave(counts)
+    j = order[start + within_run]
+
+    return i, j
+
+
+def between_residue_clash_loss_sparse(
+    atom14_pred_positions: torch.Tensor,
+    atom14_atom_exists: torch.Tensor,
+    atom14_atom_radius: torch.Tensor,
+    residue_index: torch.Tensor,
+    overlap_tolerance_soft=1.5,
+    overlap_tolerance_hard=1.5,
+    eps=1e-10,
+) -> Dict[str, torch.Tensor]:
+    """Sparse version of between_residue_clash_loss.
+
+    Instead of computing the distances between all pairs of atoms, only
+    evaluates pairs of atoms close enough to clash, found with a cell list.
+    Memory usage is linear in the number of atoms rather than quadratic.
+    Outputs are identical to those of between_residue_clash_loss.
+
+    Args:
+      atom14_pred_positions: Predicted positions of atoms in
+        global prediction frame
+      atom14_atom_exists: Mask denoting whether atom at positions exists for given
+        amino acid type
+      atom14_atom_radius: Van der Waals radius for each atom.
+      residue_index: Residue index for given amino acid.
+      overlap_tolerance_soft: Soft tolerance factor.
+      overlap_tolerance_hard: Hard tolerance factor.
+
+    Returns:
+      Dict containing:
+        * 'mean_loss': average clash loss
+        * 'per_atom_loss_sum': sum of all clash losses per atom, shape (N, 14)
+        * 'per_atom_clash_mask': mask whether atom clashes with any other atom
+            shape (N, 14)
+    """
+    fp_type = atom14_pred_positions.dtype
+    batch_dims = atom14_atom_exists.shape[:-2]
+    no_res = atom14_atom_exists.shape[-2]
+    no_atoms = atom14_atom_exists.shape[-1]
+
+    # [B, N, 14(, 3)]
+    positions = atom14_pred_positions.reshape(-1, no_res, no_atoms, 3)
+    exists = atom14_atom_exists.reshape(-1, no_res, no_atoms).type(fp_type)
+    radius = atom14_atom_radius.reshape(-1, no_res, no_atoms).type(fp_type)
+    residue_index = torch.broadcast_to(
+        residue_index, batch_dims + (no_res,)
+    ).reshape(-1, no_res)
+    
+    n_idx = 0
+    c_idx = 2
+    cys = residue_constants.restype_name_to_atom14_names["CYS"]
+    cys_sg_idx = cys.index("SG")
+
+    # Count the valid atom pairs (the denominator of the mean loss) without
+    # enumerating them. For each residue, sum the weights of the residues 
+    # that precede it.
+    sorted_residue_index, sort_idx = torch.sort(residue_index, dim=-1)
+    def sum_preceding(w, query, right=False):
+        w = torch.gather(w, -1, sort_idx)
+        w = torch.nn.functional.pad(torch.cumsum(w, dim=-1), (1, 0))
+        pos = torch.searchsorted(
+            sorted_residue_index, query.contiguous(), right=right
+        )
+        return torch.gather(w, -1, pos)
+
+    atoms = torch.sum(exists, dim=-1)
+    no_pairs = torch.sum(atoms * sum_preceding(atoms, residue_index))
+
+    # Exclude the disulfide bridge and peptide bond pairs, as below
+    sg = exists[..., cys_sg_idx]
+    no_pairs = no_pairs - torch.sum(sg * sum_preceding(sg, residue_index))
+    c, n = exists[..., c_idx], exists[..., n_idx]
+    no_pairs = no_pairs - torch.sum(
+        n * (
+            sum_preceding(c, residue_index - 1, right=True) - 
+            sum_preceding(c, residue_index - 1)
+        )
+    )
+
+    per_atom_loss_sum = positions.new_zeros(exists.numel())
+    per_atom_clash_mask = positions.new_zeros(exists.numel())
+
+    # Atoms farther apart than this can't clash
+    flat_exists = exists.reshape(-1)
+    atom_idx = torch.nonzero(flat_exists > 0).squeeze(-1)
+    cutoff = 0.
+    if(atom_idx.shape[0] > 0):
+        cutoff = (
+            2 * float(torch.max(radius)) - 
+            min(overlap_tolerance_soft, overlap_tolerance_hard)
+        )
+
+    errors = positions.new_zeros(1)
+    if(cutoff > 0):
+        b = torch.div(atom_idx, no_res * no_atoms, rounding_mode="floor")
+        r = torch.div(atom_idx, no_atoms, rounding_mode="floor") % no_res
+        a = atom_idx % no_atoms
+
+        flat_positions = positions.reshape(-1, 3)
+        i, j = _cell_list_pairs(flat_positions[atom_idx], b, cutoff)
+
+        # Mask out duplicate pairs and pairs within the same residue
+        res_i = residue_index[b[i], r[i]]
+        res_j = residue_index[b[j], r[j]]
+        keep = res_i < res_j
+
+        # Backbone C--N bond between subsequent residues is no clash.
+        keep = keep & ~(
+            (res_i + 1 == res_j) & (a[i] == c_idx) & (a[j] == n_idx)
+        )
+
+        # Disulfide bridge between two cysteines is no clash.
+        keep = keep & ~((a[i] == cys_sg_idx) & (a[j] == cys_sg_idx))
+
+        i = atom_idx[i[keep]]
+        j = atom_idx[j[keep]]
+        
+        dists = torch.sqrt(
+            eps + torch.sum(
+                (flat_positions[i] - flat_positions[j]) ** 2, dim=-1
+            )
+        )
+        dists_mask = flat_exists[i] * flat_exists[j]
+        flat_radius = radius.reshape(-1)
+        dists_lower_bound = dists_mask * (flat_radius[i] + flat_radius[j])
+
+        errors = dists_mask * torch.nn.functional.relu(
+            dists_lower_bound - overlap_tolerance_soft - dists
+        )
+        per_atom_loss_sum = per_atom_loss_sum.index_add(0, i, errors)
+        per_atom_loss_sum = per_atom_loss_sum.index_add(0, j, errors)
+
+        clash_mask = dists_mask * (
+            dists < (dists_lower_bound - overlap_tolerance_hard)
+        )
+        # Count each atom's clashes, then binarize. Tensor.scatter_reduce
+        # would do this in one step, but requires torch 1.12
+        per_atom_clash_mask = per_atom_clash_mask.index_add(0, i, clash_mask)
+        per_atom_clash_mask = per_atom_clash_mask.index_add(0, j, clash_mask)
+        per_atom_clash_mask = (per_atom_clash_mask > 0).to(positions.dtype)
+
+    mean_loss = torch.sum(errors) / (1e-6 + no_pairs)
+
+    return {
+        "mean_loss": mean_loss,  # shape ()
+        "per_atom_loss_sum": per_atom_loss_sum.reshape(
+            atom14_atom_exists.shape
+        ),  # shape (N, 14)
+        "per_atom_clash_mask": per_atom_clash_mask.reshape(
+            atom14_atom_exists.shape
+        ),  # shape (N, 14)
+    }
+
+
 def within_residue_violations(
     atom14_pred_positions: torch.Tensor,
     atom14_atom_exists: torch.Tensor,
@@ -1113,9 +1397,15 @@ def find_structural_violations(
     atom14_pred_positions: torch.Tensor,
     violation_tolerance_factor: float,
     clash_overlap_tolerance: float,
+    sparse_clashes: bool = False,
     **kwargs,
 ) -> Dict[str, torch.Tensor]:
-    """Computes several checks for structural violations."""
+    """Computes several checks for structural violations.
+
+    If sparse_clashes is set, between-residue clashes are computed with
+    between_residue_clash_loss_sparse, which only evaluates nearby atom
+    pairs.
+    """
 
     # Compute between residue backbone violations of bonds and angles.
     connection_violations = between_residue_bond_loss(
@@ -1141,7 +1431,11 @@ def find_structural_violations(
     )
 
     # Compute the between residue clash loss.
-    between_residue_clashes = between_residue_clash_loss(
+    clash_loss_fn = between_residue_clash_loss
+    if(sparse_clashes):
+        clash_loss_fn = between_residue_clash_loss_sparse
+
+    between_residue_clashes = clash_loss_fn(
         atom14_pred_positions=atom14_pred_positions,
         atom14_atom_exists=batch["atom14_atom_exists"],
         atom14_atom_radius=atom14_atom_radius,
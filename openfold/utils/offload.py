@@ -0,0 +1,108 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+from typing import Optional
+
+import torch
+
+
+def to_host(
+    t: torch.Tensor,
+    mmap_dir: Optional[str] = None,
+) -> torch.Tensor:
+    """
+        Copies a tensor into host memory, e.g. to free up device memory
+        during inference on long sequences.
+
+        Args:
+            t:
+                The tensor to offload
+            mmap_dir:
+                Optional directory (ideally on fast local disk) in which to
+                memory-map the copy, so that it can be paged out of RAM.
+                Otherwise, the copy is held in pinned memory if t is on the
+                GPU
+        Returns:
+            A copy of t in host memory
+    """
+    if(mmap_dir is not None):
+        fd, path = tempfile.mkstemp(dir=mmap_dir, suffix=".tensor")
+        os.close(fd)
+        try:
+            host = torch.from_file(
+                path, shared=True, size=t.numel(), dtype=t.dtype
+            )
+        finally:
+            # The mapping outlives the file, which is reclaimed as soon as the
+            # tensor is freed
+            os.remove(path)
+        host = host.view(t.shape)
+    else:
+        host = torch.empty(
+            t.shape,
+            dtype=t.dtype,
+            device="cpu",
+            pin_memory=(t.device.type == "cuda"),
+        )
+
+    host.copy_(t)
+
+    return host
+
+
+def to_device(
+    t: torch.Tensor,
+    device: torch.device,
+    chunk_size: int,
+    out: Optional[torch.Tensor] = None,
+    add: bool = False,
+) -> torch.Tensor:
+    """
+        Streams a (host) tensor to a device chunk_size slices of its
+        third-to-last dimension (the row dimension of pair representations)
+        at a time, bounding the size of the staging buffers.
+
+        Args:
+            t:
+                The tensor to copy
+            device:
+                The target device
+            chunk_size:
+                Number of slices copied at a time
+            out:
+                Optional preallocated output tensor on the device.
+            add:
+                Whether to add t to out in place instead of overwriting it.
+                Requires out
+        Returns:
+            The copy of t (or out)
+    """
+    if(out is None):
+        if(add):
+            raise ValueError("add requires out")
+        out = torch.empty(t.shape, dtype=t.dtype, device=device)
+
+    for i in range(0, t.shape[-3], chunk_size):
+        chunk = t[..., i: i + chunk_size, :, :].to(
+            device=device, dtype=out.dtype, non_blocking=True
+        )
+        out_chunk = out[..., i: i + chunk_size, :, :]
+        if(add):
+            out_chunk += chunk
+        else:
+            out_chunk.copy_(chunk)
+
+    return out
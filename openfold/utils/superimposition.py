@@ -12,39 +12,41 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from Bio.SVDSuperimposer import SVDSuperimposer
-import numpy as np
 import torch
 
 
-def _superimpose_np(reference, coords):
+def _kabsch_rotation(reference, coords):
     """
-        Superimposes coordinates onto a reference by minimizing RMSD using SVD.
+        Computes the rotations that best superimpose centered coordinates
+        onto centered references.
 
         Args:
             reference:
-                [N, 3] reference array
+                [*, N, 3] centered reference tensor
             coords:
-                [N, 3] array
+                [*, N, 3] centered tensor
         Returns:
-            A tuple of [N, 3] superimposed coords and the final RMSD.
+            [*, 3, 3] rotation matrices, to be applied to coords as 
+            coords @ rot.transpose(-1, -2)
     """
-    sup = SVDSuperimposer()
-    sup.set(reference, coords)
-    sup.run()
-    return sup.get_transformed(), sup.get_rms()
+    # [*, 3, 3]
+    cov = coords.transpose(-1, -2) @ reference
+    u, _, vh = torch.linalg.svd(cov)
 
+    # Flip the last singular vector to avoid reflections
+    d = torch.sign(torch.linalg.det(vh.transpose(-1, -2) @ u.transpose(-1, -2)))
+    d = torch.where(d == 0, torch.ones_like(d), d)
+    flip = torch.ones(d.shape + (3,), dtype=d.dtype, device=d.device)
+    flip[..., -1] = d
 
-def _superimpose_single(reference, coords):
-    reference_np = reference.detach().cpu().numpy()    
-    coords_np = coords.detach().cpu().numpy()
-    superimposed, rmsd = _superimpose_np(reference_np, coords_np)
-    return coords.new_tensor(superimposed), coords.new_tensor(rmsd)
+    return vh.transpose(-1, -2) @ (flip[..., None] * u.transpose(-1, -2))
 
 
 def superimpose(reference, coords, mask):
     """
-        Superimposes coordinates onto a reference by minimizing RMSD using SVD.
+        Superimposes coordinates onto a reference by minimizing RMSD using SVD
+        (the Kabsch algorithm). Fully batched and runs on the device of the
+        inputs.
 
         Args:
             reference:
@@ -55,47 +57,35 @@ def superimpose(reference, coords, mask):
                 [*, N] tensor
         Returns:
             A tuple of [*, N, 3] superimposed coords and [*] final RMSDs.
+            Masked coordinates are set to zero.
     """
-    def select_unmasked_coords(coords, mask):
-        return torch.masked_select(
-            coords,
-            (mask > 0.)[..., None],
-        ).reshape(-1, 3)
-
-    batch_dims = reference.shape[:-2]
-    flat_reference = reference.reshape((-1,) + reference.shape[-2:])
-    flat_coords = coords.reshape((-1,) + reference.shape[-2:])
-    flat_mask = mask.reshape((-1,) + mask.shape[-1:])
-    superimposed_list = []
-    rmsds = []
-    for r, c, m in zip(flat_reference, flat_coords, flat_mask):
-        r_unmasked_coords = select_unmasked_coords(r, m)
-        c_unmasked_coords = select_unmasked_coords(c, m)
-        superimposed, rmsd = _superimpose_single(
-            r_unmasked_coords, 
-            c_unmasked_coords
-        )
-
-        # This is very inelegant, but idk how else to invert the masking
-        # procedure.
-        count = 0
-        superimposed_full_size = torch.zeros_like(r)
-        for i, unmasked in enumerate(m):
-            if(unmasked):
-                superimposed_full_size[i] = superimposed[count]
-                count += 1
-
-        superimposed_list.append(superimposed_full_size)
-        rmsds.append(rmsd)
-
-    superimposed_stacked = torch.stack(superimposed_list, dim=0)
-    rmsds_stacked = torch.stack(rmsds, dim=0)
-
-    superimposed_reshaped = superimposed_stacked.reshape(
-        batch_dims + coords.shape[-2:]
-    )
-    rmsds_reshaped = rmsds_stacked.reshape(
-        batch_dims
+    dtype = coords.dtype
+
+    # SVDs aren't supported at half precision
+    reference = reference.float()
+    coords = coords.float()
+    mask = (mask > 0.).float()[..., None]
+
+    # [*, 1, 1]
+    n = torch.clamp(torch.sum(mask, dim=-2, keepdim=True), min=1.)
+
+    # [*, 1, 3]
+    reference_centroid = torch.sum(reference * mask, dim=-2, keepdim=True) / n
+    coords_centroid = torch.sum(coords * mask, dim=-2, keepdim=True) / n
+
+    reference = (reference - reference_centroid) * mask
+    coords = (coords - coords_centroid) * mask
+
+    # [*, 3, 3]
+    rot = _kabsch_rotation(reference, coords)
+
+    # [*, N, 3]
+    superimposed = coords @ rot.transpose(-1, -2)
+    rmsds = torch.sqrt(
+        torch.sum((superimposed - reference) ** 2, dim=(-1, -2)) / 
+        n[..., 0, 0]
     )
 
-    return superimposed_reshaped, rmsds_reshaped
+    superimposed = (superimposed + reference_centroid) * mask
+
+    return superimposed.to(dtype=dtype), rmsds.to(dtype=dtype)
@@ -476,7 +476,7 @@ class ChunkSizeTuner:
             arg_data_iter = zip(self.cached_arg_data, arg_data)
             for cached_arg_datum, arg_datum in arg_data_iter:
                 assert(type(cached_arg_datum) == type(arg_datum))
-                consistent = cached_arg_datum == arg_datum
+                consistent = consistent and cached_arg_datum == arg_datum
         else:
             # Otherwise, we can reuse the precomputed value
             consistent = False
@@ -137,7 +137,8 @@ python run_pretrained_openfold_all_ptm.py \
 	--pdb70_database_path /data/db/pdb70/pdb70 \
 	--uniclust30_database_path /data/db/uniclust30/uniclust30_2018_08/uniclust30_2018_08 \
 	--output_dir ${outputdir} \
-	--use_precomputed_alignments ${aligndir}/
+	--use_precomputed_alignments ${aligndir}/ \
+	--param_cache_dir openfold/resources/params/converted
 
 source scripts/deactivate_conda_env.sh
 
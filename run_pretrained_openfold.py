@@ -14,8 +14,12 @@
 # limitations under the License.
 
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from functools import partial
 import gc
+from itertools import islice
 import logging
 import numpy as np
 import os
@@ -29,8 +33,14 @@ import sys
 import time
 import torch
 
-from openfold.config import model_config
-from openfold.data import templates, feature_pipeline, data_pipeline
+from openfold.config import model_config, NUM_RES
+from openfold.data import (
+    batching,
+    templates,
+    feature_cache,
+    feature_pipeline,
+    data_pipeline,
+)
 from openfold.model.model import AlphaFold
 from openfold.model.torchscript import script_preset_
 from openfold.np import residue_constants, protein
@@ -77,6 +87,33 @@ def precompute_alignments(tags, seqs, alignment_dir, args):
         os.remove(tmp_fasta_path)
 
 
+def generate_feature_dict(tags, seqs, alignment_dir, data_processor, args):
+    tmp_fasta_path = os.path.join(args.output_dir, f"tmp_{os.getpid()}.fasta")
+    if(len(seqs) == 1):
+        tag = tags[0]
+        seq = seqs[0]
+        with open(tmp_fasta_path, "w") as fp:
+            fp.write(f">{tag}\n{seq}")
+
+        local_alignment_dir = os.path.join(alignment_dir, tag)
+        feature_dict = data_processor.process_fasta(
+            fasta_path=tmp_fasta_path, alignment_dir=local_alignment_dir
+        )
+    else:
+        with open(tmp_fasta_path, "w") as fp:
+            fp.write(
+                '\n'.join([f">{tag}\n{seq}" for tag, seq in zip(tags, seqs)])
+            )
+        feature_dict = data_processor.process_multiseq_fasta(
+            fasta_path=tmp_fasta_path, super_alignment_dir=alignment_dir, 
+        )
+
+    # Remove temporary FASTA file
+    os.remove(tmp_fasta_path)
+
+    return feature_dict
+
+
 def run_model(model, batch, tag, args):
     logging.info("Executing model...")
     with torch.no_grad():
@@ -94,10 +131,53 @@ def run_model(model, batch, tag, args):
         t = time.perf_counter()
         out = model(batch)
         logging.info(f"Inference time: {time.perf_counter() - t}")
+        logging.info(f"Recycling iterations: {out['num_recycles'].tolist()}")
     
     return out
 
 
+def run_model_batched(model, features, config, args):
+    """
+        Runs targets through the model in padded batches of similar size.
+        Consumes (tag, feature_dict, processed_feature_dict) tuples and
+        yields (tag, feature_dict, processed_feature_dict, out) tuples.
+    """
+    tm_config = None
+    if(config.model.heads.tm.enabled):
+        tm_config = config.model.heads.tm
+
+    # Targets are batched within windows of consecutive inputs, so that
+    # batching doesn't hold up the other pipeline stages for too long
+    windows = iter(
+        lambda: list(islice(features, args.predict_batch_window)), []
+    )
+    for window in windows:
+        sizes = [batching.get_target_size(t[2]) for t in window]
+        batch_idx = batching.plan_batches(
+            sizes,
+            args.predict_batch_max_tokens,
+            args.predict_batch_bucket_size,
+        )
+        for idx in batch_idx:
+            targets = [window[i] for i in idx]
+            batch = batching.pad_and_stack(
+                [t[2] for t in targets],
+                config.data.common.feat,
+                args.predict_batch_bucket_size,
+            )
+            tag = ', '.join([t[0] for t in targets])
+            out = run_model(model, batch, tag, args)
+            outs = batching.unbatch_outputs(
+                out,
+                [sizes[i][NUM_RES] for i in idx],
+                tm_config,
+            )
+            for (tag, feature_dict, processed_feature_dict), out in zip(
+                targets, outs
+            ):
+                yield tag, feature_dict, processed_feature_dict, out
+
+
 def prep_output(out, batch, feature_dict, feature_processor, args):
     plddt = out["plddt"]
     mean_plddt = np.mean(plddt)
@@ -125,7 +205,7 @@ def prep_output(out, batch, feature_dict, feature_processor, args):
                 :feature_processor.config.predict.max_templates
             ]
 
-    no_recycling = feature_processor.config.common.max_recycling_iters
+    no_recycling = int(out["num_recycles"])
     remark = ', '.join([
         f"no_recycling={no_recycling}",
         f"max_templates={feature_processor.config.predict.max_templates}",
@@ -157,12 +237,173 @@ def prep_output(out, batch, feature_dict, feature_processor, args):
 
     return unrelaxed_protein
 
+
+def featurize_fasta(
+    fasta_path,
+    alignment_dir,
+    data_processor,
+    feature_processor,
+    raw_feature_cache,
+    template_params,
+    args,
+):
+    # Gather input sequences
+    with open(fasta_path, "r") as fp:
+        data = fp.read()
+
+    lines = [
+        l.replace('\n', '')
+        for prot in data.split('>') for l in prot.strip().split('\n', 1)
+    ][1:]
+    tags, seqs = lines[::2], lines[1::2]
+
+    tags = [t.split()[0] for t in tags]
+    assert len(tags) == len(set(tags)), "All FASTA tags must be unique"
+    tag = '-'.join(tags)
+
+    precompute_alignments(tags, seqs, alignment_dir, args)
+
+    feature_dict = None
+    if(raw_feature_cache is not None):
+        cache_key = feature_cache.make_cache_key(
+            tags,
+            seqs,
+            [
+                feature_cache.file_signature(
+                    os.path.join(alignment_dir, t)
+                ) for t in tags
+            ],
+            template_params,
+        )
+        feature_dict = raw_feature_cache.get(cache_key)
+
+    if(feature_dict is None):
+        feature_dict = generate_feature_dict(
+            tags, seqs, alignment_dir, data_processor, args,
+        )
+        if(raw_feature_cache is not None):
+            raw_feature_cache.put(cache_key, feature_dict)
+
+    processed_feature_dict = feature_processor.process_features(
+        feature_dict, mode='predict',
+    )
+
+    return tag, feature_dict, processed_feature_dict
+
+
+def postprocess_prediction(
+    tag,
+    out,
+    batch,
+    feature_dict,
+    feature_processor,
+    config,
+    prediction_dir,
+    args,
+    relaxation_pool=None,
+):
+    unrelaxed_protein = prep_output(
+        out, batch, feature_dict, feature_processor, args
+    )
+
+    output_name = f'{tag}_{args.model_name}'
+    if(args.output_postfix is not None):
+        output_name = f'{output_name}_{args.output_postfix}'
+
+    # Save the unrelaxed PDB.
+    unrelaxed_output_path = os.path.join(
+        prediction_dir, f'{output_name}_unrelaxed.pdb'
+    )
+    with open(unrelaxed_output_path, 'w') as fp:
+        fp.write(protein.to_pdb(unrelaxed_protein))
+
+    relaxed_output_path = os.path.join(
+        prediction_dir, f'{output_name}_relaxed.pdb'
+    )
+    if(relaxation_pool is not None):
+        # Relaxed in the background. See write_relaxed_predictions
+        relaxation_pool.submit(relaxed_output_path, unrelaxed_protein)
+    elif(not args.skip_relaxation):
+        amber_relaxer = relax.AmberRelaxation(
+            use_gpu=(args.model_device != "cpu"),
+            **config.relax,
+        )
+
+        # Relax the prediction.
+        t = time.perf_counter()
+        visible_devices = os.getenv("CUDA_VISIBLE_DEVICES", default="")
+        if("cuda" in args.model_device):
+            device_no = args.model_device.split(":")[-1]
+            os.environ["CUDA_VISIBLE_DEVICES"] = device_no
+        relaxed_pdb_str, _, _ = amber_relaxer.process(prot=unrelaxed_protein)
+        os.environ["CUDA_VISIBLE_DEVICES"] = visible_devices
+        logging.info(f"Relaxation time: {time.perf_counter() - t}")
+
+        # Save the relaxed PDB.
+        with open(relaxed_output_path, 'w') as fp:
+            fp.write(relaxed_pdb_str)
+
+    if(args.save_outputs):
+        output_dict_path = os.path.join(
+            args.output_dir, f'{output_name}_output_dict.pkl'
+        )
+        with open(output_dict_path, "wb") as fp:
+            pickle.dump(out, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_relaxed_predictions(relaxation_pool, wait):
+    """
+        Saves the relaxed PDBs returned by the relaxation pool. If wait is
+        False, only the relaxations that have already finished are saved.
+    """
+    for relaxed_output_path, (relaxed_pdb_str, debug_data, _) in (
+        relaxation_pool.results(wait=wait)
+    ):
+        logging.info(
+            f"Relaxed {relaxed_output_path} "
+            f"({debug_data['attempts']} attempt(s))"
+        )
+        with open(relaxed_output_path, 'w') as fp:
+            fp.write(relaxed_pdb_str)
+
+
+def run_stage_ahead(fn, items, executor, depth):
+    """
+        Yields fn(item) for each item, in order. If an executor is provided,
+        up to depth results are computed ahead of the consumer.
+    """
+    if(executor is None):
+        for item in items:
+            yield fn(item)
+        return
+
+    items = iter(items)
+    pending = deque(
+        executor.submit(fn, item) for item in islice(items, depth)
+    )
+    try:
+        while(pending):
+            result = pending.popleft().result()
+            for item in islice(items, 1):
+                pending.append(executor.submit(fn, item))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
 def main(args):
     # Create the output directory
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Prep the model
     config = model_config(args.model_name)
+    if(args.recycle_early_stop_tolerance is not None):
+        config.model.recycle_early_stop.enabled = True
+        config.model.recycle_early_stop.tolerance = (
+            args.recycle_early_stop_tolerance
+        )
+
     model = AlphaFold(config)
     model = model.eval()
 
@@ -206,13 +447,31 @@ def main(args):
         max_hits=config.data.predict.max_templates,
         kalign_binary_path=args.kalign_binary_path,
         release_dates_path=args.release_dates_path,
-        obsolete_pdbs_path=args.obsolete_pdbs_path
+        obsolete_pdbs_path=args.obsolete_pdbs_path,
+        num_workers=args.template_num_workers,
+        template_store_path=args.template_store_path,
     )
 
     data_processor = data_pipeline.DataPipeline(
         template_featurizer=template_featurizer,
     )
 
+    # Raw features are cached, rather than processed ones, because the 
+    # former are also needed to construct the output
+    raw_feature_cache = None
+    template_params = None
+    if(args.feature_cache_dir is not None):
+        raw_feature_cache = feature_cache.FeatureCache(args.feature_cache_dir)
+        template_params = [
+            args.template_mmcif_dir,
+            args.max_template_date,
+            config.data.predict.max_templates,
+            feature_cache.file_signature(args.release_dates_path)
+            if args.release_dates_path is not None else None,
+            feature_cache.file_signature(args.obsolete_pdbs_path)
+            if args.obsolete_pdbs_path is not None else None,
+        ]
+
     output_dir_base = args.output_dir
     random_seed = args.data_random_seed
     if random_seed is None:
@@ -228,100 +487,104 @@ def main(args):
     prediction_dir = os.path.join(args.output_dir, "predictions")
     os.makedirs(prediction_dir, exist_ok=True)
 
-    for fasta_file in os.listdir(args.fasta_dir):
-        # Gather input sequences
-        with open(os.path.join(args.fasta_dir, fasta_file), "r") as fp:
-            data = fp.read()
-
-        lines = [
-            l.replace('\n', '') 
-            for prot in data.split('>') for l in prot.strip().split('\n', 1)
-        ][1:]
-        tags, seqs = lines[::2], lines[1::2]
-
-        tags = [t.split()[0] for t in tags]
-        assert len(tags) == len(set(tags)), "All FASTA tags must be unique"
-        tag = '-'.join(tags)
+    fasta_paths = [
+        os.path.join(args.fasta_dir, f) for f in os.listdir(args.fasta_dir)
+    ]
+
+    featurize_fn = partial(
+        featurize_fasta,
+        alignment_dir=alignment_dir,
+        data_processor=data_processor,
+        feature_processor=feature_processor,
+        raw_feature_cache=raw_feature_cache,
+        template_params=template_params,
+        args=args,
+    )
+    relaxation_pool = None
+    if(not args.skip_relaxation and args.relax_num_workers > 0):
+        # Minimizations run in separate processes, without holding up the
+        # model
+        devices = None
+        if("cuda" in args.model_device):
+            devices = [args.model_device.split(":")[-1]]
+        relaxation_pool = relax.AmberRelaxationPool(
+            num_workers=args.relax_num_workers,
+            devices=devices,
+            use_gpu=(args.model_device != "cpu"),
+            **config.relax,
+        )
 
-        precompute_alignments(tags, seqs, alignment_dir, args)
+    postprocess_fn = partial(
+        postprocess_prediction,
+        feature_processor=feature_processor,
+        config=config,
+        prediction_dir=prediction_dir,
+        args=args,
+        relaxation_pool=relaxation_pool,
+    )
 
-        tmp_fasta_path = os.path.join(args.output_dir, f"tmp_{os.getpid()}.fasta")
-        if(len(seqs) == 1):
-            seq = seqs[0]
-            with open(tmp_fasta_path, "w") as fp:
-                fp.write(f">{tag}\n{seq}")
-
-            local_alignment_dir = os.path.join(alignment_dir, tag)
-            feature_dict = data_processor.process_fasta(
-                fasta_path=tmp_fasta_path, alignment_dir=local_alignment_dir
-            )
+    if(args.pipeline_depth > 0):
+        # Featurization and post-processing each run on a background thread,
+        # so that the model is kept busy while the CPU-bound stages (and the
+        # alignment tools and relaxation they launch) work on the targets
+        # before and after it
+        featurization_executor = ThreadPoolExecutor(max_workers=1)
+        postprocessing_executor = ThreadPoolExecutor(max_workers=1)
+    else:
+        featurization_executor = None
+        postprocessing_executor = None
+
+    pending = deque()
+    try:
+        features = run_stage_ahead(
+            featurize_fn,
+            fasta_paths,
+            featurization_executor,
+            args.pipeline_depth,
+        )
+        if(args.predict_batch_max_tokens > 0):
+            predictions = run_model_batched(model, features, config, args)
         else:
-            with open(tmp_fasta_path, "w") as fp:
-                fp.write(
-                    '\n'.join([f">{tag}\n{seq}" for tag, seq in zip(tags, seqs)])
-                )
-            feature_dict = data_processor.process_multiseq_fasta(
-                fasta_path=tmp_fasta_path, super_alignment_dir=alignment_dir, 
+            predictions = (
+                (tag, feature_dict, batch, run_model(model, batch, tag, args))
+                for tag, feature_dict, batch in features
             )
- 
-        # Remove temporary FASTA file
-        os.remove(tmp_fasta_path)
-    
-        processed_feature_dict = feature_processor.process_features(
-            feature_dict, mode='predict',
-        )
 
-        batch = processed_feature_dict
-        out = run_model(model, batch, tag, args)
+        for tag, feature_dict, batch, out in predictions:
+            # Toss out the recycling dimensions --- we don't need them anymore
+            batch = tensor_tree_map(lambda x: np.array(x[..., -1].cpu()), batch)
+            out = tensor_tree_map(lambda x: np.array(x.cpu()), out)
 
-        # Toss out the recycling dimensions --- we don't need them anymore
-        batch = tensor_tree_map(lambda x: np.array(x[..., -1].cpu()), batch)
-        out = tensor_tree_map(lambda x: np.array(x.cpu()), out)
-        
-        unrelaxed_protein = prep_output(
-            out, batch, feature_dict, feature_processor, args
-        )
+            if(relaxation_pool is not None):
+                write_relaxed_predictions(relaxation_pool, wait=False)
 
-        output_name = f'{tag}_{args.model_name}'
-        if(args.output_postfix is not None):
-            output_name = f'{output_name}_{args.output_postfix}'
+            if(postprocessing_executor is None):
+                postprocess_fn(tag, out, batch, feature_dict)
+                continue
 
-        # Save the unrelaxed PDB.
-        unrelaxed_output_path = os.path.join(
-            prediction_dir, f'{output_name}_unrelaxed.pdb'
-        )
-        with open(unrelaxed_output_path, 'w') as fp:
-            fp.write(protein.to_pdb(unrelaxed_protein))
+            # Bound the number of predictions waiting to be written
+            while(len(pending) >= args.pipeline_depth):
+                pending.popleft().result()
 
-        if(not args.skip_relaxation):
-            amber_relaxer = relax.AmberRelaxation(
-                use_gpu=(args.model_device != "cpu"),
-                **config.relax,
-            )
-            
-            # Relax the prediction.
-            t = time.perf_counter()
-            visible_devices = os.getenv("CUDA_VISIBLE_DEVICES", default="")
-            if("cuda" in args.model_device):
-                device_no = args.model_device.split(":")[-1]
-                os.environ["CUDA_VISIBLE_DEVICES"] = device_no
-            relaxed_pdb_str, _, _ = amber_relaxer.process(prot=unrelaxed_protein)
-            os.environ["CUDA_VISIBLE_DEVICES"] = visible_devices
-            logging.info(f"Relaxation time: {time.perf_counter() - t}")
-            
-            # Save the relaxed PDB.
-            relaxed_output_path = os.path.join(
-                prediction_dir, f'{output_name}_relaxed.pdb'
+            pending.append(
+                postprocessing_executor.submit(
+                    postprocess_fn, tag, out, batch, feature_dict
+                )
             )
-            with open(relaxed_output_path, 'w') as fp:
-                fp.write(relaxed_pdb_str)
 
-        if(args.save_outputs):
-            output_dict_path = os.path.join(
-                args.output_dir, f'{output_name}_output_dict.pkl'
-            )
-            with open(output_dict_path, "wb") as fp:
-                pickle.dump(out, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        while(pending):
+            pending.popleft().result()
+
+        if(relaxation_pool is not None):
+            write_relaxed_predictions(relaxation_pool, wait=True)
+    finally:
+        for future in pending:
+            future.cancel()
+        for executor in [featurization_executor, postprocessing_executor]:
+            if(executor is not None):
+                executor.shutdown(wait=True)
+        if(relaxation_pool is not None):
+            relaxation_pool.close()
 
 
 if __name__ == "__main__":
@@ -385,10 +648,59 @@ if __name__ == "__main__":
     parser.add_argument(
         "--skip_relaxation", action="store_true", default=False,
     )
+    parser.add_argument(
+        "--relax_num_workers", type=int, default=0,
+        help="""If positive, Amber relaxation runs in this many worker 
+             processes, in parallel with inference and with each other. 
+             Otherwise, each prediction is relaxed inline"""
+    )
     parser.add_argument(
         "--multimer_ri_gap", type=int, default=200,
         help="""Residue index offset between multiple sequences, if provided"""
     )
+    parser.add_argument(
+        "--template_num_workers", type=int, default=4,
+        help="""Number of template hits to featurize concurrently"""
+    )
+    parser.add_argument(
+        "--template_store_path", type=str, default=None,
+        help="""Index of a template store generated by 
+             scripts/generate_template_store.py"""
+    )
+    parser.add_argument(
+        "--feature_cache_dir", type=str, default=None,
+        help="""Directory in which to cache input features. Useful when 
+             running several models on the same precomputed alignments"""
+    )
+    parser.add_argument(
+        "--recycle_early_stop_tolerance", type=float, default=None,
+        help="""If set, recycling stops once the RMS change in CA-CA distances
+             between consecutive iterations falls below this value (in 
+             Angstroms)"""
+    )
+    parser.add_argument(
+        "--pipeline_depth", type=int, default=0,
+        help="""If positive, featurization, model execution and 
+             post-processing (output writing and relaxation) run concurrently,
+             with up to this many targets queued between stages. Featurization
+             and post-processing then overlap with inference on other targets"""
+    )
+    parser.add_argument(
+        "--predict_batch_max_tokens", type=int, default=0,
+        help="""If positive, targets of similar size are padded and run through
+             the model together, with at most this many (padded) residues per 
+             batch. Useful when predicting many short sequences"""
+    )
+    parser.add_argument(
+        "--predict_batch_bucket_size", type=int, default=32,
+        help="""Batched targets are padded to a multiple of this many 
+             residues"""
+    )
+    parser.add_argument(
+        "--predict_batch_window", type=int, default=64,
+        help="""Number of consecutive targets among which batches are 
+             formed"""
+    )
     add_data_args(parser)
     args = parser.parse_args()
 
@@ -34,7 +34,7 @@ from openfold.model.model import AlphaFold
 from openfold.np import residue_constants, protein
 import openfold.np.relax.relax as relax
 from openfold.utils.import_weights import (
-    import_jax_weights_,
+    convert_jax_weights,
 )
 from openfold.utils.tensor_utils import (
     tensor_tree_map,
@@ -49,8 +49,54 @@ logging.basicConfig(filename='run_pretrained_openfold.log', filemode='w',
                     level=logging.DEBUG)
 
 
+def load_models(configs, args):
+    """
+        Builds a single model shared by all presets, along with the
+        parameters of each preset, which are swapped into it as needed.
+    """
+    # The presets only differ in their parameters and in whether templates
+    # are enabled, which is switched at runtime
+    def strip(c):
+        c = c.model.copy_and_resolve_references()
+        c.template.enabled = True
+        return str(c)
+
+    if(len(set(strip(c) for c in configs.values())) > 1):
+        raise ValueError("Model presets must share the same architecture")
+
+    model = AlphaFold(configs[model_names[0]])
+    model = model.eval()
+
+    params = {}
+    for model_name in model_names:
+        param_path = os.path.join(
+            args.jax_param_dir, "params_" + model_name + ".npz"
+        )
+        t = time.perf_counter()
+        params[model_name] = convert_jax_weights(
+            model, param_path, version=model_name,
+            cache_dir=args.param_cache_dir,
+        )
+        logging.info(
+            f"Loaded {model_name} parameters in {time.perf_counter() - t}"
+        )
+
+        if("cuda" in args.model_device):
+            # Speeds up swapping parameter sets into the model
+            params[model_name] = {
+                k: v.pin_memory() for k, v in params[model_name].items()
+            }
+
+    model = model.to(args.model_device)
+
+    return model, params
+
+
 def main(args):
-    config = model_config(model_names[0])
+    configs = {
+        model_name: model_config(model_name) for model_name in model_names
+    }
+    config = configs[model_names[0]]
 
     template_featurizer = templates.TemplateHitFeaturizer(
         mmcif_dir=args.template_mmcif_dir,
@@ -77,7 +123,12 @@ def main(args):
         alignment_dir = os.path.join(output_dir_base, "alignments")
     else:
         alignment_dir = args.use_precomputed_alignments
-    feature_processor = feature_pipeline.FeaturePipeline(config.data)
+    feature_processors = {
+        model_name: feature_pipeline.FeaturePipeline(c.data)
+        for model_name, c in configs.items()
+    }
+
+    model, params = load_models(configs, args)
 
     # Gather input sequences
     with open(args.fasta_path, "r") as fp:
@@ -124,19 +175,25 @@ def main(args):
         pae_outputs = {}
         unrelaxed_proteins = {}
 
+        # Presets with identical data configs share processed features
+        processed_feature_dicts = {}
+
         for model_name in model_names:
-            processed_feature_dict = feature_processor.process_features(
-                feature_dict, mode='predict',
-            )
-            config = model_config(model_name)
-            model = AlphaFold(config)
-            model = model.eval()
-            param_path = os.path.join(
-                "openfold", "resources", "params",
-                "params_" + model_name + ".npz"
+            data_key = str(configs[model_name].data)
+            if(data_key not in processed_feature_dicts):
+                processed_feature_dicts[data_key] = (
+                    feature_processors[model_name].process_features(
+                        feature_dict, mode='predict',
+                    )
+                )
+            processed_feature_dict = processed_feature_dicts[data_key]
+
+            # Swap the preset's parameters into the shared model
+            model.load_state_dict(params[model_name])
+            model.config.template.enabled = (
+                configs[model_name].model.template.enabled
             )
-            import_jax_weights_(model, param_path, version=model_name)
-            model = model.to(args.model_device)
+
             logging.info("Executing model "+model_name+"...")
             batch = processed_feature_dict
             with torch.no_grad():
@@ -183,8 +240,6 @@ def main(args):
                 pickle.dump(out, f, protocol=4)
 
             # Delete unused outputs to save memory.
-            del model
-            del processed_feature_dict
             del out
 
             # Save the unrelaxed PDB.
@@ -194,6 +249,8 @@ def main(args):
             with open(unrelaxed_output_path, 'w') as f:
                 f.write(protein.to_pdb(unrelaxed_protein))
 
+        del processed_feature_dicts
+
         amber_relaxer = relax.AmberRelaxation(
                 use_gpu=(args.model_device != "cpu"), **config.relax,)
 
@@ -275,6 +332,16 @@ if __name__ == "__main__":
     parser.add_argument(
         '--data_random_seed', type=str, default=None
     )
+    parser.add_argument(
+        "--jax_param_dir", type=str,
+        default=os.path.join("openfold", "resources", "params"),
+        help="""Directory containing the params_model_{1-5}_ptm.npz files"""
+    )
+    parser.add_argument(
+        "--param_cache_dir", type=str, default=None,
+        help="""Directory in which to cache the parameters after conversion to
+             PyTorch. Speeds up startup in subsequent runs"""
+    )
     add_data_args(parser)
     args = parser.parse_args()
 
@@ -0,0 +1,199 @@
+import argparse
+import logging
+import time
+
+import sys
+sys.path.append(".") # an innocent hack to get this to run from the top level
+
+import torch
+
+from openfold.config import model_config
+from openfold.model.evoformer import EvoformerStack
+from openfold.utils.checkpointing import choose_checkpoint_policy
+
+
+DEFAULT_POLICIES = [
+    "none",
+    "tri_att",
+    "tri_mul,tri_att",
+    "msa_att_row,tri_mul,tri_att",
+    "blocks",
+    "blocks+offload",
+]
+
+
+def parse_policy(policy):
+    """
+        Converts a policy string into EvoformerStack arguments. "none"
+        disables checkpointing, "blocks" checkpoints every block and any
+        other value is a comma-separated list of modules to checkpoint. A
+        "+offload" suffix additionally offloads saved activations.
+    """
+    offload = policy.endswith("+offload")
+    if(offload):
+        policy = policy[:-len("+offload")]
+
+    if(policy == "none"):
+        ckpt_modules = []
+    elif(policy == "blocks"):
+        ckpt_modules = None
+    else:
+        ckpt_modules = policy.split(",")
+
+    return {"ckpt_modules": ckpt_modules, "ckpt_offload": offload}
+
+
+def benchmark(stack, policy, inputs, args):
+    stack.ckpt_modules = policy["ckpt_modules"]
+    if(stack.ckpt_modules is not None):
+        stack.ckpt_modules = set(stack.ckpt_modules)
+    stack.ckpt_offload = policy["ckpt_offload"]
+
+    m, z, msa_mask, pair_mask = inputs
+
+    # Bytes of activations kept on the device between the forward and
+    # backward passes
+    saved = [0]
+    def pack(t):
+        if(t.device == m.device):
+            saved[0] += t.numel() * t.element_size()
+        return t
+
+    use_cuda = m.device.type == "cuda"
+    times = []
+    for i in range(args.warmup + args.no_steps):
+        if(use_cuda):
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+        saved[0] = 0
+
+        t = time.perf_counter()
+        with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+            m_out, z_out, s_out = stack(
+                m, z, msa_mask=msa_mask, pair_mask=pair_mask, chunk_size=None,
+            )
+        loss = torch.mean(z_out) + torch.mean(s_out)
+        loss.backward()
+        stack.zero_grad(set_to_none=True)
+        if(use_cuda):
+            torch.cuda.synchronize()
+
+        if(i >= args.warmup):
+            times.append(time.perf_counter() - t)
+
+    peak = torch.cuda.max_memory_allocated() if use_cuda else None
+
+    return sum(times) / len(times), peak, saved[0]
+
+
+def main(args):
+    config = model_config(args.config_preset, train=True)
+    stack_config = config.model.evoformer_stack
+    if(args.no_blocks is not None):
+        stack_config.no_blocks = args.no_blocks
+
+    stack = EvoformerStack(**stack_config).to(args.device).train()
+    if(args.bfloat16):
+        stack = stack.to(torch.bfloat16)
+    dtype = torch.bfloat16 if args.bfloat16 else torch.float32
+
+    n_seq, n_res = args.n_seq, args.crop_size
+    m = torch.rand(
+        (1, n_seq, n_res, stack_config.c_m), device=args.device, dtype=dtype,
+        requires_grad=True,
+    )
+    z = torch.rand(
+        (1, n_res, n_res, stack_config.c_z), device=args.device, dtype=dtype,
+        requires_grad=True,
+    )
+    msa_mask = torch.ones((1, n_seq, n_res), device=args.device, dtype=dtype)
+    pair_mask = torch.ones((1, n_res, n_res), device=args.device, dtype=dtype)
+    inputs = (m, z, msa_mask, pair_mask)
+
+    policies = [(p, parse_policy(p)) for p in args.policies]
+    if(args.memory_budget is not None):
+        policy = choose_checkpoint_policy(
+            args.memory_budget,
+            n_res=n_res,
+            n_seq=n_seq,
+            itemsize=m.element_size(),
+            **stack_config,
+        )
+        policies.append(("auto", policy))
+
+    print(
+        f"{'policy':<40} {'step time (s)':>14} {'peak memory (GiB)':>18} "
+        f"{'saved (GiB)':>12}"
+    )
+    for name, policy in policies:
+        try:
+            step_time, peak, saved = benchmark(stack, policy, inputs, args)
+        except RuntimeError as e:
+            if("out of memory" not in str(e)):
+                raise
+            torch.cuda.empty_cache()
+            print(f"{name:<40} {'OOM':>14}")
+            continue
+
+        peak = f"{peak / 2 ** 30:.2f}" if peak is not None else "n/a"
+        print(
+            f"{name:<40} {step_time:>14.3f} {peak:>18} "
+            f"{saved / 2 ** 30:>12.2f}"
+        )
+        logging.info(f"{name}: {policy}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="""Reports the training step time and peak memory of the
+                       Evoformer stack under different activation
+                       checkpointing policies"""
+    )
+    parser.add_argument(
+        "--config_preset", type=str, default="model_1",
+        help="Model config preset"
+    )
+    parser.add_argument(
+        "--crop_size", type=int, default=256,
+        help="Number of residues"
+    )
+    parser.add_argument(
+        "--n_seq", type=int, default=128,
+        help="Number of MSA sequences"
+    )
+    parser.add_argument(
+        "--no_blocks", type=int, default=None,
+        help="Number of Evoformer blocks. Defaults to that of the preset"
+    )
+    parser.add_argument(
+        "--policies", type=str, nargs="+", default=DEFAULT_POLICIES,
+        help="""Policies to benchmark. "none" disables checkpointing,
+             "blocks" checkpoints every block and any other value is a
+             comma-separated list of modules to checkpoint individually.
+             Append "+offload" to offload saved activations to CPU memory"""
+    )
+    parser.add_argument(
+        "--memory_budget", type=float, default=None,
+        help="""If provided, the policy automatically chosen for this
+             activation memory budget (in GiB) is benchmarked as well"""
+    )
+    parser.add_argument(
+        "--device", type=str, default="cuda:0",
+        help="Device on which to run the benchmark"
+    )
+    parser.add_argument(
+        "--bfloat16", action="store_true", default=False,
+        help="Whether to run the stack in bfloat16"
+    )
+    parser.add_argument(
+        "--no_steps", type=int, default=3,
+        help="Number of timed training steps per policy"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=1,
+        help="Number of untimed warmup steps per policy"
+    )
+
+    args = parser.parse_args()
+
+    main(args)
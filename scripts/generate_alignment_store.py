@@ -0,0 +1,86 @@
+import argparse
+from functools import partial
+import logging
+from multiprocessing import Pool
+import os
+
+import sys
+sys.path.append(".") # an innocent hack to get this to run from the top level
+
+from tqdm import tqdm
+
+from openfold.data import parsers
+from openfold.data.alignment_store import AlignmentStoreWriter
+
+
+def parse_chain_dir(chain_id, args):
+    chain_dir = os.path.join(args.alignment_dir, chain_id)
+    msas = {}
+    hits = {}
+    for f in sorted(os.listdir(chain_dir)):
+        path = os.path.join(chain_dir, f)
+        ext = os.path.splitext(f)[-1]
+        with open(path, "r") as fp:
+            file_str = fp.read()
+
+        if(ext == ".a3m"):
+            msa, deletion_matrix = parsers.parse_a3m_np(file_str)
+        elif(ext == ".sto"):
+            msa, deletion_matrix, _ = parsers.parse_stockholm_np(file_str)
+        elif(ext == ".hhr"):
+            hits[f] = parsers.parse_hhr(file_str)
+            continue
+        else:
+            continue
+
+        msas[f] = (msa, deletion_matrix)
+
+    return chain_id, msas, hits
+
+
+def main(args):
+    chain_ids = [
+        d for d in os.listdir(args.alignment_dir)
+        if os.path.isdir(os.path.join(args.alignment_dir, d))
+    ]
+    fn = partial(parse_chain_dir, args=args)
+    with AlignmentStoreWriter(args.db_path, args.index_path) as writer:
+        with Pool(processes=args.no_workers) as p:
+            with tqdm(total=len(chain_ids)) as pbar:
+                for chain_id, msas, hits in p.imap_unordered(
+                    fn, chain_ids, chunksize=args.chunksize
+                ):
+                    if(len(msas) == 0 and len(hits) == 0):
+                        logging.info(f"No alignments for {chain_id}...")
+                    writer.add_chain(chain_id, msas, hits)
+                    pbar.update()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "alignment_dir", type=str,
+        help="""Directory containing one subdirectory of precomputed
+                alignments (.a3m, .sto, .hhr) per chain, as output by
+                scripts/precompute_alignments.py"""
+    )
+    parser.add_argument(
+        "db_path", type=str, help="Path for the binary alignment data file"
+    )
+    parser.add_argument(
+        "index_path", type=str,
+        help="""Path for the .json index of the store. Should be in the same
+                directory as db_path"""
+    )
+    parser.add_argument(
+        "--no_workers", type=int, default=4,
+        help="Number of workers to use for parsing"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=10,
+        help="How many chains should be distributed to each worker at a time"
+    )
+
+    args = parser.parse_args()
+
+    main(args)
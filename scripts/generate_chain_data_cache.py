@@ -10,6 +10,10 @@ sys.path.append(".") # an innocent hack to get this to run from the top level
 
 from tqdm import tqdm
 
+from openfold.data.chain_data_cache import (
+    chain_data_to_columns,
+    write_chain_data_cache,
+)
 from openfold.data.mmcif_parsing import parse 
 from openfold.np import protein, residue_constants
 
@@ -68,7 +72,24 @@ def parse_file(
     return out
 
 
+def write_output(data, args):
+    if(args.db_path is not None):
+        write_chain_data_cache(
+            chain_data_to_columns(data), args.db_path, args.output_path
+        )
+    else:
+        with open(args.output_path, "w") as fp:
+            fp.write(json.dumps(data, indent=4))
+
+
 def main(args):
+    if(os.path.isfile(args.data_dir)):
+        # Convert an existing JSON cache
+        with open(args.data_dir, "r") as fp:
+            data = json.load(fp)
+        write_output(data, args)
+        return
+
     chain_cluster_size_dict = None
     if(args.cluster_file is not None):
         chain_cluster_size_dict = {}
@@ -97,18 +118,27 @@ def main(args):
                 data.update(d)
                 pbar.update()
 
-    with open(args.output_path, "w") as fp:
-        fp.write(json.dumps(data, indent=4))
+    write_output(data, args)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "data_dir", type=str, help="Directory containing mmCIF or PDB files"
+        "data_dir", type=str,
+        help="""Directory containing mmCIF or PDB files. Alternatively, the
+                path of an existing .json chain data cache to be converted
+                (see --db_path)"""
     )
     parser.add_argument(
         "output_path", type=str, help="Path for .json output"
     )
+    parser.add_argument(
+        "--db_path", type=str, default=None,
+        help="""If provided, the cache is written in the compact, columnar 
+                format, with its data in this file and output_path its .json
+                index. Should be in the same directory as output_path. 
+                Recommended for large datasets (e.g. distillation sets)"""
+    )
     parser.add_argument(
         "--cluster_file", type=str, default=None,
         help=(
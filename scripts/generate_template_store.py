@@ -0,0 +1,77 @@
+import argparse
+from functools import partial
+import logging
+from multiprocessing import Pool
+import os
+
+import sys
+sys.path.append(".") # an innocent hack to get this to run from the top level
+
+from tqdm import tqdm
+
+from openfold.data.mmcif_parsing import parse
+from openfold.data.template_store import (
+    TemplateStoreWriter,
+    extract_template_chains,
+)
+
+
+def parse_file(f, args):
+    with open(os.path.join(args.mmcif_dir, f), "r") as fp:
+        mmcif_string = fp.read()
+    file_id = os.path.splitext(f)[0]
+    mmcif = parse(file_id=file_id, mmcif_string=mmcif_string)
+    if mmcif.mmcif_object is None:
+        # Files that can't be parsed are left out of the store. The template
+        # featurizer falls back to the original file in that case.
+        logging.info(f"Could not parse {f}. Skipping...")
+        return None
+    else:
+        mmcif = mmcif.mmcif_object
+
+    return (
+        file_id,
+        mmcif.header["release_date"],
+        extract_template_chains(mmcif),
+    )
+
+
+def main(args):
+    files = [f for f in os.listdir(args.mmcif_dir) if f.endswith(".cif")]
+    fn = partial(parse_file, args=args)
+    with TemplateStoreWriter(args.db_path, args.index_path) as writer:
+        with Pool(processes=args.no_workers) as p:
+            with tqdm(total=len(files)) as pbar:
+                for entry in p.imap_unordered(
+                    fn, files, chunksize=args.chunksize
+                ):
+                    if(entry is not None):
+                        writer.add_entry(*entry)
+                    pbar.update()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "mmcif_dir", type=str, help="Directory containing template mmCIF files"
+    )
+    parser.add_argument(
+        "db_path", type=str, help="Path for the binary structure data file"
+    )
+    parser.add_argument(
+        "index_path", type=str,
+        help="""Path for the .json index of the store. Should be in the same
+                directory as db_path"""
+    )
+    parser.add_argument(
+        "--no_workers", type=int, default=4,
+        help="Number of workers to use for parsing"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=10,
+        help="How many files should be distributed to each worker at a time"
+    )
+
+    args = parser.parse_args()
+
+    main(args)
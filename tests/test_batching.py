@@ -0,0 +1,102 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import torch
+import unittest
+
+from openfold.config import model_config, NUM_RES, NUM_MSA_SEQ, NUM_EXTRA_SEQ
+from openfold.data import batching, data_pipeline, feature_pipeline
+from openfold.np import residue_constants
+
+
+def _random_raw_features(n_res, n_seq):
+    restypes = residue_constants.restypes
+    seqs = [
+        "".join(np.random.choice(restypes + ["-"], size=n_res))
+        for _ in range(n_seq)
+    ]
+    seqs[0] = "".join(np.random.choice(restypes, size=n_res))
+
+    feats = {}
+    feats.update(
+        data_pipeline.make_sequence_features(seqs[0], "test", n_res)
+    )
+    feats.update(
+        data_pipeline.make_msa_features(
+            [seqs], [[[0] * n_res for _ in seqs]]
+        )
+    )
+    feats.update(data_pipeline.empty_template_feats(n_res))
+
+    return feats
+
+
+class TestBatching(unittest.TestCase):
+    def test_plan_batches(self):
+        sizes = [
+            {NUM_RES: n, NUM_MSA_SEQ: d, NUM_EXTRA_SEQ: 0}
+            for n, d in [(30, 5), (10, 100), (60, 1), (20, 3), (33, 1)]
+        ]
+
+        batches = batching.plan_batches(
+            sizes, max_tokens=64, res_bucket_size=32
+        )
+
+        self.assertEqual(sorted(sum(batches, [])), list(range(len(sizes))))
+        self.assertEqual(batches, [[3, 0], [1], [2], [4]])
+
+    def test_pad_and_unbatch(self):
+        config = model_config("model_1_ptm")
+        fp = feature_pipeline.FeaturePipeline(config.data)
+        lengths = [9, 13]
+        feats = [
+            fp.process_features(_random_raw_features(n, d), "predict")
+            for n, d in zip(lengths, [3, 7])
+        ]
+
+        batch = batching.pad_and_stack(
+            feats, config.data.common.feat, res_bucket_size=16
+        )
+
+        self.assertEqual(batch["aatype"].shape[:2], (2, 16))
+        self.assertEqual(batch["msa_feat"].shape[1], 7)
+        for i, (f, n) in enumerate(zip(feats, lengths)):
+            self.assertTrue(torch.all(batch["seq_mask"][i, n:] == 0))
+            self.assertTrue(torch.all(batch["msa_mask"][i, :, n:] == 0))
+            self.assertTrue(
+                torch.equal(batch["msa_feat"][i, :3, :n], f["msa_feat"][:3])
+            )
+
+        n_pad = batch["aatype"].shape[1]
+        no_bins = config.model.heads.tm.no_bins
+        out = {
+            "plddt": torch.rand(2, n_pad),
+            "tm_logits": torch.rand(2, n_pad, n_pad, no_bins),
+            "predicted_tm_score": torch.tensor(0.),
+            "sm": {"positions": torch.rand(8, 2, n_pad, 14, 3)},
+        }
+        outs = batching.unbatch_outputs(
+            out, lengths, config.model.heads.tm
+        )
+
+        for i, (o, n) in enumerate(zip(outs, lengths)):
+            self.assertTrue(torch.equal(o["plddt"], out["plddt"][i, :n]))
+            self.assertEqual(o["tm_logits"].shape, (n, n, no_bins))
+            self.assertEqual(o["sm"]["positions"].shape, (8, n, 14, 3))
+            self.assertTrue(o["predicted_tm_score"] > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
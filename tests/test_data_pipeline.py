@@ -12,14 +12,45 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import os
 import pickle
 import shutil
+import tempfile
 
 import torch
 import numpy as np
 import unittest
 
-from openfold.data.data_pipeline import DataPipeline
+from openfold.config import (
+    NUM_EXTRA_SEQ,
+    NUM_MSA_SEQ,
+    NUM_RES,
+    NUM_TEMPLATES,
+    model_config,
+)
+from openfold.data import feature_pipeline, parsers
+from openfold.data.alignment_store import AlignmentStore, AlignmentStoreWriter
+from openfold.data.chain_data_cache import (
+    ChainDataCache,
+    chain_data_to_columns,
+    write_chain_data_cache,
+)
+from openfold.data import data_modules
+from openfold.data.data_pipeline import (
+    DataPipeline,
+    encode_msa,
+    make_msa_features,
+    make_msa_features_from_arrays,
+    make_sequence_features,
+)
+from openfold.data.feature_cache import FeatureCache
+from openfold.data.prefetch import DevicePrefetcher
+from openfold.data import mmcif_parsing
+from openfold.data.template_store import (
+    TemplateStoreWriter,
+    extract_template_chains,
+)
 from openfold.data.templates import TemplateHitFeaturizer
 from openfold.model.embedders import (
     InputEmbedder,
@@ -27,6 +58,7 @@ from openfold.model.embedders import (
     TemplateAngleEmbedder,
     TemplatePairEmbedder,
 )
+from openfold.np import residue_constants
 import tests.compare_utils as compare_utils
 
 if compare_utils.alphafold_is_installed():
@@ -35,6 +67,106 @@ if compare_utils.alphafold_is_installed():
     import haiku as hk
 
 
+def _parse_msa_feats_legacy(alignment_dir, filenames):
+    msas = []
+    deletion_matrices = []
+    for f in filenames:
+        with open(os.path.join(alignment_dir, f), "r") as fp:
+            file_str = fp.read()
+        if(os.path.splitext(f)[-1] == ".a3m"):
+            msa, deletion_matrix = parsers.parse_a3m(file_str)
+        else:
+            msa, deletion_matrix, _ = parsers.parse_stockholm(file_str)
+        msas.append(msa)
+        deletion_matrices.append(deletion_matrix)
+
+    return make_msa_features(msas, deletion_matrices)
+
+
+def _ambiguous_msa(query):
+    # Rows that are distinct, but identical once encoded as HHblits IDs
+    return [
+        query,
+        query.replace("D", "B"),
+        query.replace("E", "Z"),
+        "X" + query[1:],
+        "J" + query[1:],
+        "O" + query[1:],
+        "C" + query[1:],
+        "U" + query[1:],
+        query,
+    ]
+
+
+def _random_raw_features(n_res, n_seq, n_templ):
+    restypes = residue_constants.restypes
+    seqs = [
+        "".join(np.random.choice(restypes + ["-"], size=n_res))
+        for _ in range(n_seq)
+    ]
+    seqs[0] = "".join(np.random.choice(restypes, size=n_res))
+
+    feats = {}
+    feats.update(make_sequence_features(seqs[0], "test", n_res))
+    feats.update(make_msa_features([seqs], [[[0] * n_res for _ in seqs]]))
+
+    templ_aatype = np.random.randint(0, 22, (n_templ, n_res))
+    feats["template_aatype"] = np.eye(22, dtype=np.int64)[templ_aatype]
+    feats["template_all_atom_positions"] = (
+        np.random.rand(n_templ, n_res, 37, 3).astype(np.float32)
+    )
+    feats["template_all_atom_mask"] = (
+        np.random.randint(0, 2, (n_templ, n_res, 37)).astype(np.float32)
+    )
+    feats["template_sum_probs"] = (
+        np.random.rand(n_templ, 1).astype(np.float32)
+    )
+
+    feats["all_atom_positions"] = (
+        np.random.rand(n_res, 37, 3).astype(np.float32)
+    )
+    feats["all_atom_mask"] = (
+        np.random.randint(0, 2, (n_res, 37)).astype(np.float32)
+    )
+    feats["resolution"] = np.array([2.], dtype=np.float32)
+    feats["is_distillation"] = np.array(0., dtype=np.float32)
+
+    return feats
+
+
+def _random_chain_data(no_chains):
+    restypes = list("ACDEFGHIKLMNPQRSTVWY")
+    chain_data = {}
+    for i in range(no_chains):
+        n_res = np.random.randint(1, 700)
+        p = None if i % 5 else [0.9] + [0.1 / 19] * 19
+        entry = {
+            "seq": "".join(np.random.choice(restypes, size=n_res, p=p)),
+            "release_date": "2021-01-01",
+        }
+        if(i % 3):
+            entry["resolution"] = float(np.random.uniform(0, 12))
+        if(i % 4):
+            entry["cluster_size"] = int(np.random.randint(-1, 20))
+        chain_data[f"{i}_A"] = entry
+
+    return chain_data
+
+
+class _ChainDataset:
+    def __init__(self, chain_ids):
+        self.chain_ids = chain_ids
+
+    def __len__(self):
+        return len(self.chain_ids)
+
+    def __getitem__(self, idx):
+        return self.chain_ids[idx]
+
+    def idx_to_chain_id(self, idx):
+        return self.chain_ids[idx]
+
+
 class TestDataPipeline(unittest.TestCase):
     @compare_utils.skip_unless_alphafold_installed()
     def test_fasta_compare(self): 
@@ -103,7 +235,540 @@ class TestDataPipeline(unittest.TestCase):
             self.assertTrue(
                 k in checked or np.all(v == openfold_feature_dict[k])
             )
-               
+
+
+    def test_alignment_store(self):
+        alignment_dir = "tests/test_data/alignments"
+        data_pipeline = DataPipeline(template_featurizer=None)
+
+        msas = {}
+        hits = {}
+        for f in sorted(os.listdir(alignment_dir)):
+            with open(os.path.join(alignment_dir, f), "r") as fp:
+                file_str = fp.read()
+            ext = os.path.splitext(f)[-1]
+            if(ext == ".a3m"):
+                msa, dm = parsers.parse_a3m_np(file_str)
+            elif(ext == ".sto"):
+                msa, dm, _ = parsers.parse_stockholm_np(file_str)
+            else:
+                hits[f] = parsers.parse_hhr(file_str)
+                continue
+            msas[f] = (msa, dm)
+
+        ambiguous_a3m = "".join(
+            f">seq_{i}\n{seq}\n" for i, seq in enumerate(_ambiguous_msa("ADE"))
+        )
+        ambiguous_msa = parsers.parse_a3m_np(ambiguous_a3m)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "alignments.db")
+            index_path = os.path.join(tmp_dir, "alignments.json")
+            with AlignmentStoreWriter(db_path, index_path) as writer:
+                writer.add_chain("query", msas, hits)
+                writer.add_chain(
+                    "ambiguous", {"ambiguous.a3m": ambiguous_msa}, {}
+                )
+
+            store = AlignmentStore(index_path)
+            entry = store["query"]
+
+            # Rows are only dropped if their residues are exactly the same
+            gt_feats = make_msa_features(*zip(parsers.parse_a3m(ambiguous_a3m)))
+            store_msa = store["ambiguous"].get_msas()["ambiguous.a3m"]
+            self.assertEqual(store_msa["msa"].shape[0], 8)
+            self.assertTrue(
+                np.all(gt_feats["msa"] == encode_msa(store_msa["msa"]))
+            )
+            self.assertTrue(np.all(
+                gt_feats["deletion_matrix_int"] == store_msa["deletion_matrix"]
+            ))
+
+            # The store holds pre-parsed copies of the original template hits
+            self.assertEqual(
+                data_pipeline._parse_template_hits(alignment_dir),
+                data_pipeline._parse_template_hits(
+                    tmp_dir, _alignment_index=entry
+                ),
+            )
+
+            # Iterate over MSAs in the same order in both cases so that 
+            # deduplication keeps the same rows
+            gt_feats = _parse_msa_feats_legacy(alignment_dir, sorted(msas))
+            store_feats = data_pipeline._process_msa_feats(
+                tmp_dir, _alignment_index=entry
+            )
+
+            for k, v in gt_feats.items():
+                self.assertTrue(np.all(v == store_feats[k]))
+                self.assertEqual(v.dtype, store_feats[k].dtype)
+
+    def test_vectorized_msa_feats(self):
+        alignment_dir = "tests/test_data/alignments"
+        data_pipeline = DataPipeline(template_featurizer=None)
+
+        msa_data = data_pipeline._parse_msa_data(alignment_dir)
+        gt_feats = _parse_msa_feats_legacy(alignment_dir, list(msa_data))
+        feats = data_pipeline._process_msa_feats(alignment_dir)
+
+        for k, v in gt_feats.items():
+            self.assertTrue(np.all(v == feats[k]))
+            self.assertEqual(v.dtype, feats[k].dtype)
+
+    def test_ambiguous_msa_feats(self):
+        msa = ["ACDE", "ACBE", "ACDE", "XCDE", "ACDE", "OCDE"]
+        deletion_matrix = [[0] * 4 for _ in msa]
+        gt_feats = make_msa_features([msa], [deletion_matrix])
+        feats = make_msa_features_from_arrays(
+            [np.array([list(s.encode("ascii")) for s in msa], dtype=np.uint8)],
+            [np.array(deletion_matrix)],
+        )
+        self.assertEqual(gt_feats["num_alignments"][0], 4)
+        for k, v in gt_feats.items():
+            self.assertTrue(np.all(v == feats[k]))
+
+        data_pipeline = DataPipeline(template_featurizer=None)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            alignment_dir = os.path.join(tmp_dir, "alignments")
+            shutil.copytree("tests/test_data/alignments", alignment_dir)
+            with open(
+                os.path.join(alignment_dir, "bfd_uniclust_hits.a3m"), "r"
+            ) as fp:
+                query = fp.read().split("\n")[1]
+            with open(os.path.join(alignment_dir, "ambiguous.a3m"), "w") as fp:
+                for i, seq in enumerate(_ambiguous_msa(query)):
+                    fp.write(f">seq_{i}\n{seq}\n")
+
+            msa_data = data_pipeline._parse_msa_data(alignment_dir)
+            gt_feats = _parse_msa_feats_legacy(alignment_dir, list(msa_data))
+            feats = data_pipeline._process_msa_feats(alignment_dir)
+
+        for k, v in gt_feats.items():
+            self.assertTrue(np.all(v == feats[k]))
+            self.assertEqual(v.dtype, feats[k].dtype)
+
+    def test_vectorized_parsers(self):
+        a3m = ">query\nAB-C\n>hit_1\naaAbB-cC\n>hit_2\nA-BCddd\n"
+        msa, deletion_matrix = parsers.parse_a3m(a3m)
+        msa_np, deletion_matrix_np = parsers.parse_a3m_np(a3m)
+        self.assertEqual(
+            [s.encode("ascii") for s in msa], list(map(bytes, msa_np))
+        )
+        self.assertTrue(
+            np.all(np.array(deletion_matrix) == deletion_matrix_np)
+        )
+
+        sto = (
+            "# STOCKHOLM 1.0\nquery A-B--C\nhit_1 ABBC-C\nhit_2 --B-DC\n//\n"
+        )
+        msa, deletion_matrix, names = parsers.parse_stockholm(sto)
+        msa_np, deletion_matrix_np, names_np = parsers.parse_stockholm_np(sto)
+        self.assertEqual(
+            [s.encode("ascii") for s in msa], list(map(bytes, msa_np))
+        )
+        self.assertTrue(
+            np.all(np.array(deletion_matrix) == deletion_matrix_np)
+        )
+        self.assertEqual(names, names_np)
+
+    def test_parallel_templates(self):
+        with open("tests/test_data/short.fasta", "r") as fp:
+            seq = fp.read().split()[1]
+        with open("tests/test_data/alignments/pdb70_hits.hhr", "r") as fp:
+            hits = parsers.parse_hhr(fp.read())
+
+        mmcif_dir = "tests/test_data/mmcifs"
+        hits = [
+            h for h in hits if os.path.exists(
+                os.path.join(mmcif_dir, h.name[:4].lower() + ".cif")
+            )
+        ]
+
+        results = []
+        for num_workers in [1, 3]:
+            template_featurizer = TemplateHitFeaturizer(
+                mmcif_dir=mmcif_dir,
+                max_template_date="2021-12-20",
+                max_hits=4,
+                kalign_binary_path=shutil.which("kalign"),
+                num_workers=num_workers,
+            )
+            results.append(
+                template_featurizer.get_templates(seq, None, None, hits)
+            )
+
+        serial, parallel = results
+        self.assertEqual(serial.warnings, parallel.warnings)
+        self.assertEqual(serial.errors, parallel.errors)
+        for k, v in serial.features.items():
+            self.assertTrue(np.array_equal(v, parallel.features[k]))
+
+    def test_template_store(self):
+        with open("tests/test_data/short.fasta", "r") as fp:
+            seq = fp.read().split()[1]
+        with open("tests/test_data/alignments/pdb70_hits.hhr", "r") as fp:
+            hits = parsers.parse_hhr(fp.read())
+
+        mmcif_dir = "tests/test_data/mmcifs"
+        hits = [
+            h for h in hits if os.path.exists(
+                os.path.join(mmcif_dir, h.name[:4].lower() + ".cif")
+            )
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "templates.db")
+            index_path = os.path.join(tmp_dir, "templates.json")
+            with TemplateStoreWriter(db_path, index_path) as writer:
+                for f in os.listdir(mmcif_dir):
+                    with open(os.path.join(mmcif_dir, f), "r") as fp:
+                        mmcif_string = fp.read()
+                    file_id = os.path.splitext(f)[0]
+                    mmcif = mmcif_parsing.parse(
+                        file_id=file_id, mmcif_string=mmcif_string
+                    ).mmcif_object
+                    writer.add_entry(
+                        file_id,
+                        mmcif.header["release_date"],
+                        extract_template_chains(mmcif),
+                    )
+
+            results = []
+            for template_store_path in [None, index_path]:
+                template_featurizer = TemplateHitFeaturizer(
+                    mmcif_dir=mmcif_dir,
+                    max_template_date="2021-12-20",
+                    max_hits=20,
+                    kalign_binary_path=shutil.which("kalign"),
+                    template_store_path=template_store_path,
+                )
+                results.append(
+                    template_featurizer.get_templates(seq, None, None, hits)
+                )
+
+        parsed, stored = results
+        self.assertEqual(parsed.warnings, stored.warnings)
+        self.assertEqual(parsed.errors, stored.errors)
+        for k, v in parsed.features.items():
+            self.assertTrue(np.array_equal(v, stored.features[k]))
+
+    def test_feature_cache(self):
+        feats = {
+            "aatype": torch.randint(0, 20, (7,)),
+            "msa": np.random.rand(3, 7).astype(np.float32),
+            "domain_name": np.array([b"1abc_A"], dtype=np.object_),
+        }
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = FeatureCache(tmp_dir)
+            self.assertIsNone(cache.get("ab" * 32))
+            cache.put("ab" * 32, feats)
+            cached = cache.get("ab" * 32)
+
+            self.assertTrue(np.all(cached["aatype"] == feats["aatype"].numpy()))
+            self.assertTrue(np.all(cached["msa"] == feats["msa"]))
+            self.assertEqual(cached["domain_name"][0].decode(), "1abc_A")
+
+            # Entries are evicted in least-recently-used order
+            entry_size = os.path.getsize(cache._path("ab" * 32))
+            cache.max_size = int(2.5 * entry_size)
+            cache._size = None
+            cache.put("cd" * 32, feats)
+            os.utime(cache._path("ab" * 32), ns=(0, 0))
+            os.utime(cache._path("cd" * 32), ns=(1, 1))
+            cache.get("ab" * 32)
+            cache.put("ef" * 32, feats)
+            
+            self.assertTrue("ab" * 32 in cache)
+            self.assertFalse("cd" * 32 in cache)
+            self.assertTrue("ef" * 32 in cache)
+
+    def test_compact_recycling_features(self):
+        raw_feats = _random_raw_features(40, 5, 6)
+        for mode in ["predict", "train"]:
+            config = model_config("model_1", train=(mode == "train"))
+            # Training samples are cropped, and their templates subsampled
+            config.data.train.crop_size = 16
+            feats = feature_pipeline.FeaturePipeline(
+                config.data
+            ).process_features(raw_feats, mode)
+
+            config.data.common.compact_recycling_features = True
+            compact_feats = feature_pipeline.FeaturePipeline(
+                config.data
+            ).process_features(raw_feats, mode)
+
+            num_iters = config.data.common.max_recycling_iters + 1
+            schema = config.data.common.feat
+            for k, v in feats.items():
+                self.assertEqual(v.shape[-1], num_iters)
+                if(NUM_MSA_SEQ in schema[k] or NUM_EXTRA_SEQ in schema[k]):
+                    self.assertEqual(compact_feats[k].shape, v.shape)
+                    continue
+
+                # Constant features really are the same in each iteration
+                self.assertTrue(torch.equal(v[..., :1].expand(v.shape), v))
+                self.assertEqual(compact_feats[k].shape, v.shape[:-1] + (1,))
+                if(mode == "predict"):
+                    # Nothing is sampled, so both runs see the same inputs
+                    self.assertTrue(
+                        torch.equal(compact_feats[k].expand(v.shape), v)
+                    )
+
+    def test_chain_data_cache(self):
+        chain_data = _random_chain_data(200)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, "chain_data_cache.json")
+            with open(json_path, "w") as fp:
+                json.dump(chain_data, fp)
+
+            db_path = os.path.join(tmp_dir, "chain_data_cache.db")
+            index_path = os.path.join(tmp_dir, "chain_data_cache_index.json")
+            write_chain_data_cache(
+                chain_data_to_columns(chain_data), db_path, index_path
+            )
+
+            columns = ChainDataCache(index_path).columns()
+            mask = data_modules.deterministic_train_filter_mask(columns)
+            probs = data_modules.get_stochastic_train_filter_probs(columns)
+            for i, chain_id in enumerate(columns["chain_id"]):
+                entry = chain_data[chain_id.decode()]
+                self.assertEqual(
+                    mask[i], data_modules.deterministic_train_filter(entry)
+                )
+                self.assertEqual(
+                    probs[i],
+                    data_modules.get_stochastic_train_filter_prob(entry),
+                )
+
+            # Both formats yield the same samples
+            chain_ids = list(chain_data.keys())[::-1]
+            datapoints = []
+            for path in [json_path, index_path]:
+                dataset = data_modules.OpenFoldDataset(
+                    datasets=[_ChainDataset(chain_ids)],
+                    probabilities=[1.],
+                    epoch_len=50,
+                    chain_data_cache_paths=[path],
+                    generator=torch.Generator().manual_seed(42),
+                )
+                datapoints.append([int(i) for _, i in dataset.datapoints])
+
+            self.assertEqual(datapoints[0], datapoints[1])
+            for i in datapoints[0]:
+                self.assertTrue(
+                    data_modules.deterministic_train_filter(
+                        chain_data[chain_ids[i]]
+                    )
+                )
+
+            with self.assertRaises(KeyError):
+                ChainDataCache(index_path).get_rows(["0_A", "missing_A"])
+
+    def test_openfold_dataset_sampler_state(self):
+        chain_data = _random_chain_data(300)
+        chain_ids = list(chain_data.keys())
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "chain_data_cache.json")
+            with open(path, "w") as fp:
+                json.dump(chain_data, fp)
+
+            def make_dataset(seed):
+                return data_modules.OpenFoldDataset(
+                    datasets=[
+                        _ChainDataset(chain_ids), 
+                        _ChainDataset(chain_ids[:100]),
+                    ],
+                    probabilities=[0.75, 0.25],
+                    epoch_len=400,
+                    chain_data_cache_paths=[path, path],
+                    generator=torch.Generator().manual_seed(seed),
+                )
+
+            dataset = make_dataset(42)
+            self.assertEqual(make_dataset(42).datapoints, dataset.datapoints)
+            self.assertEqual(len(dataset), 400)
+            for dataset_idx, datapoint_idx in dataset.datapoints:
+                self.assertTrue(
+                    data_modules.deterministic_train_filter(
+                        chain_data[chain_ids[datapoint_idx]]
+                    )
+                )
+                if(dataset_idx == 1):
+                    self.assertLess(datapoint_idx, 100)
+
+            state = dataset.state_dict()
+            epoch = [dataset[i] for i in range(len(dataset))]
+            dataset.reroll()
+            next_epoch = [dataset[i] for i in range(len(dataset))]
+
+            # Resume mid-epoch
+            resumed = make_dataset(0)
+            resumed.load_state_dict(state, start=150)
+            resumed.reroll()
+            self.assertEqual(len(resumed), 250)
+            self.assertEqual(
+                [resumed[i] for i in range(len(resumed))], epoch[150:]
+            )
+
+            # Resume at the end of the epoch
+            resumed.load_state_dict(state)
+            resumed.reroll()
+            self.assertEqual(
+                [resumed[i] for i in range(len(resumed))], next_epoch
+            )
+
+    def test_length_bucketing(self):
+        chain_data = _random_chain_data(300)
+        chain_ids = list(chain_data.keys())
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "chain_data_cache.json")
+            with open(path, "w") as fp:
+                json.dump(chain_data, fp)
+
+            dataset = data_modules.OpenFoldDataset(
+                datasets=[_ChainDataset(chain_ids)],
+                probabilities=[1.],
+                epoch_len=200,
+                chain_data_cache_paths=[path],
+                generator=torch.Generator().manual_seed(42),
+            )
+
+        crop_size, bucket_size = 256, 64
+        max_residue_pairs = 2 * crop_size ** 2
+        samplers = [
+            data_modules.OpenFoldBucketBatchSampler(
+                dataset,
+                crop_size=crop_size,
+                bucket_size=bucket_size,
+                max_residue_pairs=max_residue_pairs,
+                num_replicas=2,
+                rank=rank,
+                generator=torch.Generator().manual_seed(0),
+            ) for rank in range(2)
+        ]
+
+        batches = [list(sampler) for sampler in samplers]
+        self.assertEqual(len(batches[0]), len(samplers[0]))
+        self.assertEqual(len(batches[0]), len(batches[1]))
+
+        seen = set()
+        for batch in batches[0] + batches[1]:
+            lengths = [
+                min(len(chain_data[dataset[i]]["seq"]), crop_size) 
+                for i in batch
+            ]
+            padded = {
+                min(-(-l // bucket_size) * bucket_size, crop_size) 
+                for l in lengths
+            }
+            self.assertEqual(len(padded), 1)
+            self.assertLessEqual(
+                len(batch) * padded.pop() ** 2, max_residue_pairs
+            )
+            self.assertFalse(seen.intersection(batch))
+            seen.update(batch)
+
+        # Batched samples are trimmed to the longest one in the batch
+        def sample(n_res):
+            no_recycling = 2
+            return {
+                "aatype": torch.zeros((crop_size, no_recycling)),
+                "template_aatype": torch.zeros((4, crop_size, no_recycling)),
+                "seq_length": torch.full((no_recycling,), n_res),
+            }
+
+        shape_schema = {
+            "aatype": [NUM_RES], 
+            "template_aatype": [NUM_TEMPLATES, NUM_RES],
+            "seq_length": [],
+        }
+        collator = data_modules.OpenFoldBucketCollator(
+            shape_schema, bucket_size
+        )
+        batch = collator([sample(30), sample(70)])
+        self.assertEqual(batch["aatype"].shape, (2, 128, 2))
+        self.assertEqual(batch["template_aatype"].shape, (2, 4, 128, 2))
+        self.assertEqual(batch["seq_length"].shape, (2, 2))
+        batch = collator([sample(crop_size)])
+        self.assertEqual(batch["aatype"].shape, (1, crop_size, 2))
+
+    def test_length_bucketing_distributed(self):
+        config = model_config("model_1", train=True).data
+        config.data_module.data_loaders.length_bucketing.enabled = True
+        data_module = data_modules.OpenFoldDataModule(
+            config=config,
+            template_mmcif_dir="",
+            max_template_date="",
+            train_data_dir="",
+            train_alignment_dir="",
+        )
+
+        # Lightning would try to re-instantiate the bucketed batch sampler
+        self.assertFalse(data_module.replace_sampler_ddp)
+
+        chain_data = _random_chain_data(50)
+        chain_ids = list(chain_data.keys())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "chain_data_cache.json")
+            with open(path, "w") as fp:
+                json.dump(chain_data, fp)
+
+            data_module.train_dataset = data_modules.OpenFoldDataset(
+                datasets=[_ChainDataset(chain_ids)],
+                probabilities=[1.],
+                epoch_len=20,
+                chain_data_cache_paths=[path],
+                generator=torch.Generator().manual_seed(42),
+            )
+            data_module._bucket_generator = torch.Generator()
+            data_module.eval_dataset = _ChainDataset(chain_ids)
+
+            torch.distributed.init_process_group(
+                "gloo",
+                init_method=f"file://{os.path.join(tmp_dir, 'store')}",
+                rank=0,
+                world_size=1,
+            )
+            try:
+                train_loader = data_module.train_dataloader()
+                val_loader = data_module.val_dataloader()
+            finally:
+                torch.distributed.destroy_process_group()
+
+        self.assertIsInstance(
+            train_loader.batch_sampler,
+            data_modules.OpenFoldBucketBatchSampler,
+        )
+
+        # The data module shards the remaining loaders in Lightning's stead
+        self.assertIsInstance(
+            val_loader.sampler, torch.utils.data.distributed.DistributedSampler,
+        )
+        self.assertFalse(val_loader.sampler.shuffle)
+
+    @unittest.skipUnless(torch.cuda.is_available(), "Requires CUDA")
+    def test_device_prefetcher(self):
+        batches = [
+            {
+                # Non-contiguous, like truncated recycling dimensions
+                "msa_feat": torch.rand(4, 8, 16, 4)[..., :i + 1],
+                "seq_mask": torch.rand(16) > 0.5,
+                "aatype": torch.randint(0, 20, (16,)),
+            } for i in range(4)
+        ]
+
+        prefetched = list(
+            DevicePrefetcher(iter(batches), device=torch.device("cuda"))
+        )
+        self.assertEqual(len(prefetched), len(batches))
+        for batch, gt in zip(prefetched, batches):
+            for k, v in gt.items():
+                self.assertEqual(batch[k].device.type, "cuda")
+                self.assertTrue(torch.equal(batch[k].cpu(), v))
 
 
 if __name__ == "__main__":
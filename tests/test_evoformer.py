@@ -86,6 +86,186 @@ class TestEvoformerStack(unittest.TestCase):
         self.assertTrue(z.shape == shape_z_before)
         self.assertTrue(s.shape == (batch_size, n_res, c_s))
 
+    def test_planned_chunk_size(self):
+        batch_size = consts.batch_size
+        n_seq = consts.n_seq
+        n_res = consts.n_res
+        c_m = consts.c_m
+        c_z = consts.c_z
+
+        es = EvoformerStack(
+            c_m,
+            c_z,
+            c_hidden_msa_att=12,
+            c_hidden_opm=17,
+            c_hidden_mul=19,
+            c_hidden_pair_att=14,
+            c_s=consts.c_s,
+            no_heads_msa=3,
+            no_heads_pair=7,
+            no_blocks=2,
+            transition_n=2,
+            msa_dropout=0.15,
+            pair_dropout=0.25,
+            blocks_per_ckpt=None,
+            inf=1e9,
+            eps=1e-10,
+            plan_chunk_size=True,
+            chunk_size_memory_budget=1e-4,
+        ).eval()
+
+        m = torch.rand((batch_size, n_seq, n_res, c_m))
+        z = torch.rand((batch_size, n_res, n_res, c_z))
+        msa_mask = torch.randint(0, 2, size=(batch_size, n_seq, n_res))
+        pair_mask = torch.randint(0, 2, size=(batch_size, n_res, n_res))
+
+        with torch.no_grad():
+            out_planned = es(
+                m.clone(), z.clone(), chunk_size=1, 
+                msa_mask=msa_mask, pair_mask=pair_mask,
+            )
+            plan = es.chunk_size_planner.cached_plan
+            out = es(
+                m.clone(), z.clone(), chunk_size=None, 
+                msa_mask=msa_mask, pair_mask=pair_mask,
+            )
+
+        self.assertTrue(all(1 <= c <= 256 for c in plan.values()))
+        for t_planned, t in zip(out_planned, out):
+            self.assertTrue(torch.max(torch.abs(t_planned - t)) < consts.eps)
+
+    def test_per_module_chunk_sizes(self):
+        batch_size = consts.batch_size
+        n_seq = consts.n_seq
+        n_res = consts.n_res
+        c_m = consts.c_m
+        c_z = consts.c_z
+
+        def get_stack(**kwargs):
+            return EvoformerStack(
+                c_m,
+                c_z,
+                c_hidden_msa_att=12,
+                c_hidden_opm=17,
+                c_hidden_mul=19,
+                c_hidden_pair_att=14,
+                c_s=consts.c_s,
+                no_heads_msa=3,
+                no_heads_pair=7,
+                no_blocks=2,
+                transition_n=2,
+                msa_dropout=0.15,
+                pair_dropout=0.25,
+                blocks_per_ckpt=None,
+                inf=1e9,
+                eps=1e-10,
+                **kwargs,
+            ).eval()
+
+        chunk_sizes = {
+            "msa_att_row": 1,
+            "msa_att_col": 3,
+            "outer_product_mean": 2,
+            "tri_mul": 5,
+            "pair_transition": 7,
+        }
+
+        es = get_stack(chunk_sizes=chunk_sizes, tune_chunk_size=True)
+        with torch.no_grad():
+            for p in es.parameters():
+                p.normal_(std=0.02)
+
+        m = torch.rand((batch_size, n_seq, n_res, c_m))
+        z = torch.rand((batch_size, n_res, n_res, c_z))
+        msa_mask = torch.randint(0, 2, size=(batch_size, n_seq, n_res))
+        pair_mask = torch.randint(0, 2, size=(batch_size, n_res, n_res))
+
+        def run(chunk_size):
+            with torch.no_grad():
+                return es(
+                    m.clone(), z.clone(), chunk_size=chunk_size,
+                    msa_mask=msa_mask, pair_mask=pair_mask,
+                )
+
+        out = run(None)
+        out_tuned = run(4)
+        es.chunk_size_tuners = None
+        out_chunked = run(4)
+
+        for t_tuned, t_chunked, t in zip(out_tuned, out_chunked, out):
+            self.assertTrue(torch.max(torch.abs(t_tuned - t)) < consts.eps)
+            self.assertTrue(torch.max(torch.abs(t_chunked - t)) < consts.eps)
+
+        with self.assertRaises(ValueError):
+            get_stack(chunk_sizes={"not_a_module": 4})
+
+    def test_sub_block_checkpointing(self):
+        batch_size = consts.batch_size
+        n_seq = consts.n_seq
+        n_res = consts.n_res
+        c_m = consts.c_m
+        c_z = consts.c_z
+
+        es = EvoformerStack(
+            c_m,
+            c_z,
+            c_hidden_msa_att=12,
+            c_hidden_opm=17,
+            c_hidden_mul=19,
+            c_hidden_pair_att=14,
+            c_s=consts.c_s,
+            no_heads_msa=3,
+            no_heads_pair=7,
+            no_blocks=2,
+            transition_n=2,
+            msa_dropout=0.15,
+            pair_dropout=0.25,
+            blocks_per_ckpt=None,
+            inf=1e9,
+            eps=1e-10,
+            ckpt_modules=[],
+        ).eval()
+
+        with torch.no_grad():
+            for p in es.parameters():
+                p.normal_(std=0.02)
+
+        m = torch.rand((batch_size, n_seq, n_res, c_m))
+        z = torch.rand((batch_size, n_res, n_res, c_z))
+        msa_mask = torch.randint(0, 2, size=(batch_size, n_seq, n_res))
+        pair_mask = torch.randint(0, 2, size=(batch_size, n_res, n_res))
+
+        def run():
+            m_in = m.clone().requires_grad_()
+            z_in = z.clone().requires_grad_()
+            out = es(
+                m_in, z_in, chunk_size=None, 
+                msa_mask=msa_mask, pair_mask=pair_mask,
+            )
+            sum(torch.sum(t ** 2) for t in out).backward()
+            grads = [m_in.grad, z_in.grad]
+            grads.extend(p.grad.clone() for p in es.parameters())
+            es.zero_grad()
+            return [t.detach() for t in out], grads
+
+        # With no modules checkpointed, the steps are run directly
+        out_steps, grads_steps = run()
+        es.ckpt_modules = None
+        out, grads = run()
+
+        for t_steps, t in zip(out_steps + grads_steps, out + grads):
+            self.assertTrue(torch.max(torch.abs(t_steps - t)) < consts.eps)
+
+        for ckpt_modules, offload in [
+            (["tri_mul", "tri_att"], False),
+            (["msa_att_row", "outer_product_mean", "pair_transition"], True),
+        ]:
+            es.ckpt_modules = set(ckpt_modules)
+            es.ckpt_offload = offload
+            out_ckpt, grads_ckpt = run()
+            for t_ckpt, t in zip(out_ckpt + grads_ckpt, out + grads):
+                self.assertTrue(torch.max(torch.abs(t_ckpt - t)) < consts.eps)
+
     @compare_utils.skip_unless_alphafold_installed()
     def test_compare(self):
         def run_ei(activations, masks):
@@ -204,6 +384,54 @@ class TestExtraMSAStack(unittest.TestCase):
 
         self.assertTrue(z.shape == shape_z_before)
 
+    def test_streaming(self):
+        batch_size = 2
+        s_t = 23
+        n_res = 5
+        c_m = 7
+        c_z = 11
+
+        es = ExtraMSAStack(
+            c_m,
+            c_z,
+            c_hidden_msa_att=12,
+            c_hidden_opm=17,
+            c_hidden_mul=19,
+            c_hidden_pair_att=16,
+            no_heads_msa=3,
+            no_heads_pair=8,
+            no_blocks=2,
+            transition_n=5,
+            msa_dropout=0.15,
+            pair_dropout=0.25,
+            ckpt=False,
+            inf=1e9,
+            eps=1e-10,
+        ).eval()
+
+        with torch.no_grad():
+            for p in es.parameters():
+                p.normal_(std=0.1)
+
+        m = torch.rand((batch_size, s_t, n_res, c_m))
+        z = torch.rand((batch_size, n_res, n_res, c_z))
+        msa_mask = torch.randint(0, 2, size=(batch_size, s_t, n_res)).float()
+        pair_mask = torch.randint(0, 2, size=(batch_size, n_res, n_res)).float()
+
+        with torch.no_grad():
+            out = es(
+                m.clone(), z.clone(), chunk_size=4, 
+                msa_mask=msa_mask, pair_mask=pair_mask,
+            )
+            for block_size in [1, 7, s_t]:
+                out_streaming = es.forward_streaming(
+                    m.clone(), z.clone(), msa_mask=msa_mask, 
+                    pair_mask=pair_mask, block_size=block_size, chunk_size=4,
+                )
+                self.assertTrue(
+                    torch.max(torch.abs(out_streaming - out)) < consts.eps
+                )
+
 
 class TestMSATransition(unittest.TestCase):
     def test_shape(self):
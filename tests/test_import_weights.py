@@ -12,13 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import shutil
+import tempfile
+
 import torch
 import numpy as np
 import unittest
 
 from openfold.config import model_config
 from openfold.model.model import AlphaFold
-from openfold.utils.import_weights import import_jax_weights_
+from openfold.utils.import_weights import (
+    convert_jax_weights,
+    import_jax_weights_,
+)
 
 
 class TestImportWeights(unittest.TestCase):
@@ -71,3 +78,32 @@ class TestImportWeights(unittest.TestCase):
 
         for w_alpha, w_repro in test_pairs:
             self.assertTrue(torch.all(w_alpha == w_repro))
+
+    @unittest.skipUnless(
+        os.path.exists("openfold/resources/params/params_model_3_ptm.npz"),
+        "JAX parameters are not available",
+    )
+    def test_convert_jax_weights_cache(self):
+        npz_path = "openfold/resources/params/params_model_3_ptm.npz"
+
+        c = model_config("model_3_ptm")
+        c.globals.blocks_per_ckpt = None
+        model = AlphaFold(c)
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            sd_1 = convert_jax_weights(
+                model, npz_path, version="model_3_ptm", cache_dir=cache_dir
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            model = AlphaFold(c)
+            sd_2 = convert_jax_weights(
+                model, npz_path, version="model_3_ptm", cache_dir=cache_dir
+            )
+        finally:
+            shutil.rmtree(cache_dir)
+
+        for k, v in model.state_dict().items():
+            self.assertTrue(torch.equal(sd_1[k], sd_2[k]))
+            self.assertTrue(torch.equal(sd_1[k], v))
@@ -30,6 +30,7 @@ from openfold.utils.loss import (
     compute_fape,
     between_residue_bond_loss,
     between_residue_clash_loss,
+    between_residue_clash_loss_sparse,
     find_structural_violations,
     compute_renamed_ground_truth,
     masked_msa_loss,
@@ -37,6 +38,7 @@ from openfold.utils.loss import (
     experimentally_resolved_loss,
     violation_loss,
     fape_loss,
+    lddt,
     lddt_loss,
     supervised_chi_loss,
     backbone_loss,
@@ -182,6 +184,74 @@ class TestLoss(unittest.TestCase):
             residue_index,
         )
 
+    def test_between_residue_clash_loss_sparse(self):
+        bs = consts.batch_size
+        n = consts.n_res
+
+        # Dense enough for plenty of clashes
+        pred_pos = (torch.rand(bs, n, 14, 3) * 6).requires_grad_()
+        pred_atom_mask = torch.randint(0, 2, (bs, n, 14)).float()
+        atom14_atom_radius = (1.5 + torch.rand(bs, n, 14) * 0.3)
+        atom14_atom_radius = atom14_atom_radius * pred_atom_mask
+
+        # Residue indices with gaps, out of order
+        residue_index = torch.randperm(2 * n)[:n].sort()[0]
+        residue_index[1] = residue_index[0] + 1
+        residue_index = residue_index[torch.randperm(n)].unsqueeze(0)
+
+        def run(fn):
+            out = fn(
+                pred_pos,
+                pred_atom_mask,
+                atom14_atom_radius,
+                residue_index,
+            )
+            torch.sum(out["per_atom_loss_sum"] ** 2).backward()
+            grad = pred_pos.grad.clone()
+            pred_pos.grad = None
+            return out, grad
+
+        out, grad = run(between_residue_clash_loss)
+        out_sparse, grad_sparse = run(between_residue_clash_loss_sparse)
+
+        self.assertTrue(torch.sum(out["per_atom_clash_mask"]) > 0)
+        for k, v in out.items():
+            self.assertTrue(torch.max(torch.abs(out_sparse[k] - v)) < 1e-5)
+        self.assertTrue(
+            torch.allclose(grad_sparse, grad, rtol=1e-5, atol=1e-5)
+        )
+
+    def test_chunked_lddt_and_distogram(self):
+        bs = consts.batch_size
+        n = consts.n_res
+
+        pos = torch.rand(bs, n, 3) * 20
+        pred_pos = pos + torch.randn(bs, n, 3) * 2
+        mask = torch.randint(0, 2, (bs, n, 1)).float()
+
+        for per_residue in [True, False]:
+            score = lddt(pred_pos, pos, mask, per_residue=per_residue)
+            score_chunked = lddt(
+                pred_pos, pos, mask, per_residue=per_residue, chunk_size=4
+            )
+            self.assertTrue(torch.max(torch.abs(score_chunked - score)) < 1e-6)
+
+        logits = torch.randn(bs, n, n, 64, requires_grad=True)
+        
+        def run(chunk_size):
+            loss = distogram_loss(
+                logits, pos, mask[..., 0], chunk_size=chunk_size
+            )
+            loss.backward()
+            grad = logits.grad.clone()
+            logits.grad = None
+            return loss, grad
+
+        loss, grad = run(None)
+        loss_chunked, grad_chunked = run(3)
+        self.assertTrue(torch.abs(loss_chunked - loss) < 1e-6)
+        self.assertTrue(torch.max(torch.abs(grad_chunked - grad)) < 1e-6)
+
     @compare_utils.skip_unless_alphafold_installed()
     def test_between_residue_clash_loss_compare(self):
         def run_brcl(pred_pos, atom_exists, atom_radius, res_ind):
@@ -0,0 +1,107 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import numpy as np
+import unittest
+
+from openfold.data import mmcif_parsing
+
+
+MMCIF_DIR = "tests/test_data/mmcifs"
+
+
+class TestMmcifParsing(unittest.TestCase):
+    def test_fast_parser_compare(self):
+        for f in sorted(os.listdir(MMCIF_DIR)):
+            with open(os.path.join(MMCIF_DIR, f), "r") as fp:
+                mmcif_string = fp.read()
+            file_id = os.path.splitext(f)[0]
+
+            parsed = [
+                mmcif_parsing.parse(
+                    file_id=file_id,
+                    mmcif_string=mmcif_string,
+                    use_fast_parser=use_fast_parser,
+                ).mmcif_object
+                for use_fast_parser in [False, True]
+            ]
+            bio, fast = parsed
+
+            self.assertIsInstance(
+                fast.structure, mmcif_parsing.FastStructure
+            )
+            self.assertEqual(bio.header, fast.header)
+            self.assertEqual(bio.chain_to_seqres, fast.chain_to_seqres)
+            self.assertEqual(
+                bio.seqres_to_structure, fast.seqres_to_structure
+            )
+            self.assertEqual(
+                [c.id for c in bio.structure.get_chains()],
+                [c.id for c in fast.structure.get_chains()],
+            )
+
+            for chain_id in bio.chain_to_seqres:
+                for zero_center in [True, False]:
+                    coords = [
+                        mmcif_parsing.get_atom_coords(
+                            mmcif_object=mmcif_object,
+                            chain_id=chain_id,
+                            _zero_center_positions=zero_center,
+                        )
+                        for mmcif_object in parsed
+                    ]
+                    for bio_array, fast_array in zip(*coords):
+                        self.assertTrue(np.array_equal(bio_array, fast_array))
+
+    def test_fast_parser_tokenizer(self):
+        mmcif_string = "\n".join([
+            "data_TEST",
+            "#",
+            "_entry.id TEST",
+            "_exptl.method 'X-RAY DIFFRACTION'",
+            "_struct.title",
+            ";A title",
+            "_exptl.crystals_number 1",
+            ";",
+            "loop_",
+            "_chem_comp.id",
+            "_chem_comp.type",
+            "_chem_comp.name",
+            "ALA 'L-peptide linking' ALANINE # comment",
+            "G   'RNA linking' \"GUANOSINE-5'-MONOPHOSPHATE\"",
+            "#",
+        ])
+
+        parsed_info = mmcif_parsing._tokenize_mmcif(
+            mmcif_string, mmcif_parsing._FAST_PARSER_CATEGORIES
+        )
+
+        self.assertEqual(parsed_info["_entry.id"], ["TEST"])
+        self.assertEqual(parsed_info["_exptl.method"], ["X-RAY DIFFRACTION"])
+        self.assertFalse("_struct.title" in parsed_info)
+        self.assertFalse("_exptl.crystals_number" in parsed_info)
+        self.assertEqual(parsed_info["_chem_comp.id"], ["ALA", "G"])
+        self.assertEqual(
+            parsed_info["_chem_comp.type"], ["L-peptide linking", "RNA linking"]
+        )
+        self.assertEqual(
+            parsed_info["_chem_comp.name"],
+            ["ALANINE", "GUANOSINE-5'-MONOPHOSPHATE"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
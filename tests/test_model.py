@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import pickle
+import tempfile
 import torch
 import torch.nn as nn
 import numpy as np
@@ -36,19 +37,12 @@ if compare_utils.alphafold_is_installed():
 
 
 class TestModel(unittest.TestCase):
-    def test_dry_run(self):
+    def _random_batch(self, c):
         n_seq = consts.n_seq
         n_templ = consts.n_templ
         n_res = consts.n_res
         n_extra_seq = consts.n_extra
 
-        c = model_config("model_1")
-        c.model.evoformer_stack.no_blocks = 4  # no need to go overboard here
-        c.model.evoformer_stack.blocks_per_ckpt = None  # don't want to set up
-        # deepspeed for this test
-
-        model = AlphaFold(c)
-
         batch = {}
         tf = torch.randint(c.model.input_embedder.tf_dim - 1, size=(n_res,))
         batch["target_feat"] = nn.functional.one_hot(
@@ -73,9 +67,101 @@ class TestModel(unittest.TestCase):
         )
         batch = tensor_tree_map(add_recycling_dims, batch)
 
+        return batch
+
+    def test_dry_run(self):
+        c = model_config("model_1")
+        c.model.evoformer_stack.no_blocks = 4  # no need to go overboard here
+        c.model.evoformer_stack.blocks_per_ckpt = None  # don't want to set up
+        # deepspeed for this test
+
+        model = AlphaFold(c)
+
+        batch = self._random_batch(c)
+
         with torch.no_grad():
             out = model(batch)
 
+    def test_recycling_early_stop(self):
+        c = model_config("model_1")
+        c.model.evoformer_stack.no_blocks = 2
+        c.model.evoformer_stack.blocks_per_ckpt = None
+        c.model.recycle_early_stop.enabled = True
+        c.model.recycle_early_stop.plddt_tolerance = 100.
+
+        model = AlphaFold(c).eval()
+        batch = self._random_batch(c)
+        num_iters = batch["aatype"].shape[-1]
+
+        with torch.no_grad():
+            # Everything counts as converged
+            c.model.recycle_early_stop.tolerance = float("inf")
+            out = model(batch)
+            self.assertEqual(int(out["num_recycles"]), 1)
+
+            # Nothing does
+            c.model.recycle_early_stop.tolerance = 0.
+            out = model(batch)
+            self.assertEqual(int(out["num_recycles"]), num_iters - 1)
+
+    def test_offload_inference(self):
+        c = model_config("model_1")
+        c.model.evoformer_stack.no_blocks = 2
+        c.model.evoformer_stack.blocks_per_ckpt = None
+        c.model.offload_inference.chunk_size = 3
+
+        model = AlphaFold(c).eval()
+        with torch.no_grad():
+            for p in model.parameters():
+                p.normal_(std=0.02)
+
+        batch = self._random_batch(c)
+
+        def run():
+            with torch.no_grad():
+                return model(batch)
+
+        out = run()
+
+        c.model.offload_inference.enabled = True
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for mmap_dir in [None, tmp_dir]:
+                c.model.offload_inference.mmap_dir = mmap_dir
+                out_offload = run()
+                for k in ["msa", "pair", "single", "final_atom_positions"]:
+                    self.assertTrue(
+                        torch.max(torch.abs(out_offload[k] - out[k])) < 
+                        consts.eps
+                    )
+
+    def test_compact_recycling_features(self):
+        c = model_config("model_1")
+        c.model.evoformer_stack.no_blocks = 2
+        c.model.evoformer_stack.blocks_per_ckpt = None
+
+        model = AlphaFold(c).eval()
+        with torch.no_grad():
+            for p in model.parameters():
+                p.normal_(std=0.02)
+
+        batch = self._random_batch(c)
+
+        # Only MSA features keep the full recycling dimension
+        msa_feats = ["msa_feat", "msa_mask", "extra_msa", "extra_msa_mask"]
+        compact_batch = {
+            k: v if k in msa_feats else v[..., :1] for k, v in batch.items()
+        }
+
+        with torch.no_grad():
+            out = model(batch)
+            out_compact = model(compact_batch)
+
+        for k in ["msa", "pair", "single", "final_atom_positions"]:
+            self.assertTrue(torch.equal(out_compact[k], out[k]))
+        self.assertEqual(
+            int(out_compact["num_recycles"]), batch["aatype"].shape[-1] - 1
+        )
+
     @compare_utils.skip_unless_alphafold_installed()
     def test_compare(self):
         def run_alphafold(batch):
@@ -18,6 +18,9 @@ import unittest
 
 from openfold.model.primitives import (
     Attention,
+    GlobalAttention,
+    _attention,
+    _lma,
 )
 from tests.config import consts
 
@@ -48,6 +51,63 @@ class TestLMA(unittest.TestCase):
         
         self.assertTrue(torch.max(torch.abs(l - real)) < consts.eps)
 
+    def test_lma_vs_attention_cpu(self):
+        batch_size = consts.batch_size
+        c_hidden = 16
+        no_heads = 4
+        n_q = 37
+        n_kv = 53
+
+        q = torch.rand(batch_size, no_heads, n_q, c_hidden)
+        k = torch.rand(batch_size, no_heads, n_kv, c_hidden)
+        v = torch.rand(batch_size, no_heads, n_kv, c_hidden)
+
+        biases = [
+            torch.rand(batch_size, 1, 1, n_kv),
+            torch.rand(1, no_heads, n_q, n_kv),
+        ]
+        expanded_biases = [
+            b.expand(batch_size, no_heads, n_q, n_kv) for b in biases
+        ]
+
+        with torch.no_grad():
+            real = _attention(q, k, v, biases)
+            for q_chunk_size, kv_chunk_size in [(8, 16), (n_q, n_kv), (64, 5)]:
+                l = _lma(
+                    q, k, v, expanded_biases, q_chunk_size, kv_chunk_size
+                )
+                self.assertTrue(torch.max(torch.abs(l - real)) < consts.eps)
+
+        # Gradients should match too
+        q.requires_grad_()
+        _lma(q, k, v, expanded_biases, 8, 16).sum().backward()
+        l_grad = q.grad.clone()
+        q.grad = None
+        _attention(q, k, v, biases).sum().backward()
+        self.assertTrue(torch.max(torch.abs(l_grad - q.grad)) < consts.eps)
+
+    def test_global_attention_lma(self):
+        batch_size = consts.batch_size
+        n_seq = consts.n_seq
+        n_res = consts.n_res
+        c_in = 16
+        c_hidden = 8
+        no_heads = 4
+
+        ga = GlobalAttention(c_in, c_hidden, no_heads, inf=1e9, eps=1e-10)
+        with torch.no_grad():
+            for p in ga.parameters():
+                p.normal_()
+
+        m = torch.rand(batch_size, n_res, n_seq, c_in)
+        mask = torch.randint(0, 2, (batch_size, n_res, n_seq)).float()
+
+        with torch.no_grad():
+            l = ga(m, mask, use_lma=True)
+            real = ga(m, mask)
+
+        self.assertTrue(torch.max(torch.abs(l - real)) < consts.eps)
+
  
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,109 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import unittest
+from unittest import mock
+
+from openfold.config import model_config
+
+try:
+    from openfold.np.relax import amber_minimize, relax
+    relax_is_installed = True
+except ImportError:
+    relax_is_installed = False
+
+
+def _process(self, *, prot):
+    # Stands in for AmberRelaxation.process. "Proteins" are just strings
+    if(prot == "bad"):
+        raise ValueError("Bad protein")
+    elif(prot == "die"):
+        os._exit(1)
+    elif(prot == "slow"):
+        time.sleep(60)
+
+    return f"relaxed {prot}", {}, None
+
+
+@unittest.skipUnless(relax_is_installed, "Requires OpenMM and PDBFixer")
+class TestAmberRelaxationPool(unittest.TestCase):
+    def setUp(self):
+        # Workers are forked so that they inherit the patches
+        patches = [
+            mock.patch.object(relax.AmberRelaxation, "process", _process),
+            mock.patch.object(amber_minimize, "get_force_field"),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _get_pool(self, num_workers):
+        return relax.AmberRelaxationPool(
+            num_workers=num_workers,
+            start_method="fork",
+            use_gpu=False,
+            **model_config("model_1").relax,
+        )
+
+    def test_results(self):
+        with self._get_pool(num_workers=2) as pool:
+            for i in range(4):
+                pool.submit(i, str(i))
+            self.assertEqual(pool.num_pending, 4)
+
+            results = dict(pool.results())
+            self.assertEqual(pool.num_pending, 0)
+            self.assertEqual(
+                results, {i: (f"relaxed {i}", {}, None) for i in range(4)}
+            )
+
+            # Without waiting, only finished results are returned
+            self.assertEqual(list(pool.results(wait=False)), [])
+            pool.submit("a", "a")
+            results = []
+            deadline = time.time() + 30
+            while(len(results) == 0 and time.time() < deadline):
+                results.extend(pool.results(wait=False))
+                time.sleep(0.01)
+            self.assertEqual(results, [("a", ("relaxed a", {}, None))])
+
+            # Errors in the workers are re-raised by the caller
+            pool.submit("b", "bad")
+            with self.assertRaisesRegex(RuntimeError, "Bad protein"):
+                list(pool.results())
+            self.assertEqual(pool.num_pending, 0)
+
+            # The workers are still usable afterwards
+            pool.submit("c", "c")
+            self.assertEqual(
+                list(pool.results()), [("c", ("relaxed c", {}, None))]
+            )
+
+    def test_dead_worker(self):
+        with self._get_pool(num_workers=1) as pool:
+            pool.submit("d", "die")
+            with self.assertRaisesRegex(RuntimeError, "died"):
+                list(pool.results())
+
+    def test_close_with_pending(self):
+        pool = self._get_pool(num_workers=2)
+        pool.submit("s", "slow")
+        pool.submit("t", "t")
+
+        t = time.time()
+        pool.close()
+        self.assertLess(time.time() - t, 30)
+        self.assertFalse(any(w.is_alive() for w in pool._workers))
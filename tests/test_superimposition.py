@@ -0,0 +1,75 @@
+# Copyright 2021 AlQuraishi Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from Bio.SVDSuperimposer import SVDSuperimposer
+import torch
+import unittest
+
+from openfold.utils.superimposition import superimpose
+from tests.config import consts
+
+
+class TestSuperimposition(unittest.TestCase):
+    def test_superimpose_vs_svd_superimposer(self):
+        batch_size = consts.batch_size
+        n_res = consts.n_res
+
+        reference = torch.rand((batch_size, 2, n_res, 3)) * 10
+        coords = torch.rand((batch_size, 2, n_res, 3)) * 10
+        mask = torch.randint(0, 2, (batch_size, 2, n_res)).float()
+        mask[..., :3] = 1.
+
+        superimposed, rmsds = superimpose(reference, coords, mask)
+        self.assertEqual(superimposed.shape, coords.shape)
+        self.assertEqual(rmsds.shape, mask.shape[:-1])
+
+        flat = zip(
+            reference.reshape(-1, n_res, 3),
+            coords.reshape(-1, n_res, 3),
+            mask.reshape(-1, n_res).bool(),
+            superimposed.reshape(-1, n_res, 3),
+            rmsds.reshape(-1),
+        )
+        for r, c, m, s, rmsd in flat:
+            sup = SVDSuperimposer()
+            sup.set(r[m].double().numpy(), c[m].double().numpy())
+            sup.run()
+
+            expected = torch.zeros_like(s)
+            expected[m] = torch.tensor(sup.get_transformed()).float()
+            self.assertTrue(torch.max(torch.abs(s - expected)) < 1e-4)
+            self.assertTrue(abs(float(rmsd) - sup.get_rms()) < 1e-4)
+
+    def test_superimpose_recovers_rigid_motion(self):
+        n_res = consts.n_res
+
+        reference = torch.rand((n_res, 3)) * 10
+        q = torch.nn.functional.normalize(torch.rand(4), dim=-1)
+        a, b, c, d = q
+        rot = torch.stack([
+            torch.stack([a**2+b**2-c**2-d**2, 2*(b*c-a*d), 2*(b*d+a*c)]),
+            torch.stack([2*(b*c+a*d), a**2-b**2+c**2-d**2, 2*(c*d-a*b)]),
+            torch.stack([2*(b*d-a*c), 2*(c*d+a*b), a**2-b**2-c**2+d**2]),
+        ])
+        coords = reference @ rot.T + torch.rand(3)
+
+        superimposed, rmsd = superimpose(
+            reference, coords, torch.ones(n_res)
+        )
+        self.assertTrue(torch.max(torch.abs(superimposed - reference)) < 1e-4)
+        self.assertTrue(float(rmsd) < 1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main()
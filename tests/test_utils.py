@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import math
+import os
+import tempfile
 import numpy as np
 import torch
 import unittest
@@ -23,6 +25,8 @@ from openfold.utils.rigid_utils import (
     quat_to_rot,
     rot_to_quat,
 )
+from openfold.utils.checkpointing import choose_checkpoint_policy
+from openfold.utils.chunk_planner import ChunkSizePlanner
 from openfold.utils.tensor_utils import chunk_layer, _chunk_slice
 import tests.compare_utils as compare_utils
 from tests.config import consts
@@ -221,6 +225,89 @@ class TestUtils(unittest.TestCase):
 
                 self.assertTrue(torch.all(chunked == chunked_flattened))
 
+    def test_chunk_size_planner(self):
+        def get_planner(memory_budget, cache_path=None):
+            return ChunkSizePlanner(
+                c_z=128,
+                c_hidden_mul=128,
+                c_hidden_pair_att=32,
+                no_heads_pair=4,
+                transition_n=4,
+                c_m=256,
+                c_hidden_msa_att=32,
+                no_heads_msa=8,
+                c_hidden_opm=32,
+                memory_budget=memory_budget,
+                cache_path=cache_path,
+            )
+
+        n_seq, n_res = 128, 512
+        m = torch.zeros(1, n_seq, n_res, 1)
+        z = torch.zeros(1, n_res, n_res, 1)
+
+        small = get_planner(1).plan(m, z, min_chunk_size=4)
+        large = get_planner(16).plan(m, z, min_chunk_size=4)
+        for module, chunk_size in small.items():
+            self.assertTrue(chunk_size >= 4)
+            self.assertTrue(chunk_size <= large[module])
+
+            # The planned chunk size should be the largest one that fits
+            planner = get_planner(1)
+            budget = 2 ** 30
+            if(chunk_size > 4):
+                mem = planner.estimate_memory(module, chunk_size, n_seq, n_res)
+                self.assertTrue(mem <= budget)
+            if(chunk_size < min(planner.max_chunk_size, n_res)):
+                mem = planner.estimate_memory(
+                    module, 2 * chunk_size, n_seq, n_res
+                )
+                self.assertTrue(mem > budget)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "chunk_sizes.json")
+            plan = get_planner(1, cache_path).plan(m, z, min_chunk_size=4)
+            self.assertTrue(os.path.isfile(cache_path))
+
+            planner = get_planner(1, cache_path)
+            planner._determine_chunk_sizes = None
+            self.assertEqual(planner.plan(m, z, min_chunk_size=4), plan)
+
+    def test_choose_checkpoint_policy(self):
+        dims = {
+            "c_m": 256,
+            "c_z": 128,
+            "c_hidden_msa_att": 32,
+            "c_hidden_opm": 32,
+            "c_hidden_mul": 128,
+            "c_hidden_pair_att": 32,
+            "no_heads_msa": 8,
+            "no_heads_pair": 4,
+            "transition_n": 4,
+            "no_blocks": 48,
+        }
+
+        def choose(memory_budget, n_res=256):
+            return choose_checkpoint_policy(
+                memory_budget, n_res=n_res, n_seq=128, **dims
+            )
+
+        self.assertEqual(choose(2 ** 10)["ckpt_modules"], [])
+
+        # Tighter budgets checkpoint more modules, then whole blocks
+        prev = []
+        for memory_budget in [2 ** 7, 2 ** 6, 2 ** 5]:
+            policy = choose(memory_budget)
+            if(policy["ckpt_modules"] is None):
+                break
+            self.assertTrue(set(prev) <= set(policy["ckpt_modules"]))
+            prev = policy["ckpt_modules"]
+
+        self.assertTrue("tri_att" in choose(2 ** 7)["ckpt_modules"])
+        self.assertEqual(
+            choose(1, n_res=2048),
+            {"ckpt_modules": None, "ckpt_offload": True},
+        )
+
     @compare_utils.skip_unless_alphafold_installed()
     def test_pre_compose_compare(self):
         quat = np.random.rand(20, 4)
@@ -32,6 +32,7 @@ from openfold.utils.argparse import remove_arguments
 from openfold.utils.callbacks import (
     EarlyStoppingVerbose,
 )
+from openfold.utils.checkpointing import choose_checkpoint_policy
 from openfold.utils.exponential_moving_average import ExponentialMovingAverage
 from openfold.utils.loss import AlphaFoldLoss, lddt_ca
 from openfold.utils.lr_schedulers import AlphaFoldLRScheduler
@@ -239,6 +240,17 @@ def main(args):
         train=True, 
         low_prec=(args.precision == "16")
     ) 
+
+    if(args.ckpt_memory_budget is not None):
+        policy = choose_checkpoint_policy(
+            args.ckpt_memory_budget,
+            n_res=config.data.train.crop_size,
+            n_seq=config.data.train.max_msa_clusters,
+            itemsize=(2 if str(args.precision) in ["16", "bf16"] else 4),
+            **config.model.evoformer_stack,
+        )
+        config.model.evoformer_stack.update(policy)
+        logging.info(f"Evoformer checkpointing policy: {policy}")
     
     model_module = OpenFoldWrapper(config)
     if(args.resume_from_ckpt and args.resume_model_weights_only):
@@ -328,6 +340,9 @@ def main(args):
         strategy=strategy,
         callbacks=callbacks,
         logger=loggers,
+        replace_sampler_ddp=(
+            args.replace_sampler_ddp and data_module.replace_sampler_ddp
+        ),
     )
 
     if(args.resume_model_weights_only):
@@ -481,6 +496,12 @@ if __name__ == "__main__":
         "--script_modules", type=bool_type, default=False,
         help="Whether to TorchScript eligible components of them model"
     )
+    parser.add_argument(
+        "--ckpt_memory_budget", type=float, default=None,
+        help="""Activation memory budget (in GiB) of the Evoformer stack. If
+             provided, its activation checkpointing policy is chosen
+             automatically based on the crop size"""
+    )
     parser.add_argument(
         "--train_chain_data_cache_path", type=str, default=None,
     )
@@ -517,6 +538,41 @@ if __name__ == "__main__":
     parser.add_argument(
         "--_distillation_alignment_index_path", type=str, default=None,
     )
+    parser.add_argument(
+        "--_alignment_store_path", type=str, default=None,
+        help="""Index of an alignment store generated by 
+                scripts/generate_alignment_store.py. Replaces 
+                --_alignment_index_path"""
+    )
+    parser.add_argument(
+        "--_distillation_alignment_store_path", type=str, default=None,
+        help="See --_alignment_store_path"
+    )
+    parser.add_argument(
+        "--template_num_workers", type=int, default=1,
+        help="""Number of template hits featurized concurrently by each
+                data loader worker"""
+    )
+    parser.add_argument(
+        "--template_store_path", type=str, default=None,
+        help="""Index of a template store generated by
+                scripts/generate_template_store.py"""
+    )
+    parser.add_argument(
+        "--use_fast_mmcif_parser", type=bool_type, default=False,
+        help="""Whether to parse training mmCIF files with the fast NumPy
+                parser instead of Biopython"""
+    )
+    parser.add_argument(
+        "--feature_cache_dir", type=str, default=None,
+        help="""Directory in which to cache processed features across
+                epochs and runs. Disabled if not specified"""
+    )
+    parser.add_argument(
+        "--feature_cache_max_size_gb", type=float, default=None,
+        help="""Maximum size of the feature cache. Least recently used
+                entries are evicted when it is exceeded"""
+    )
     parser = pl.Trainer.add_argparse_args(parser)
    
     # Disable the initial validation pass